@@ -53,7 +53,7 @@ class ARIMA(tsm.TSM):
         self.z_no = self.ar + self.ma + 2
         self.max_lag = max(self.ar,self.ma)
         self._z_hide = 0 # Whether to cutoff latent variables from results table
-        self.supported_methods = ["MLE", "PML", "Laplace", "M-H", "BBVI"]
+        self.supported_methods = ["MLE", "PML", "Laplace", "M-H", "AM", "BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
 
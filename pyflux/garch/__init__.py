@@ -1,4 +1,5 @@
 from .garch import GARCH
+from .garch_panel import GARCHPanel
 
 from .egarch import EGARCH
 from .egarchm import EGARCHM
@@ -49,7 +49,7 @@ class EGARCH(tsm.TSM):
         self.leverage = False
         self.model_name = "EGARCH(" + str(self.p) + "," + str(self.q) + ")"
         self._z_hide = 0 # Whether to cutoff latent variables from the results table
-        self.supported_methods = ["MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["MLE","PML","Laplace","M-H","AM","BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
 
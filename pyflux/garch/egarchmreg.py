@@ -48,7 +48,7 @@ class EGARCHMReg(tsm.TSM):
         self.max_lag = max(self.p,self.q)  
         self.z_no = self.p + self.q + 2
         self._z_hide = 0 # Whether to cutoff variance latent variables from results
-        self.supported_methods = ["MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["MLE","PML","Laplace","M-H","AM","BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
         self.leverage = False
@@ -0,0 +1,358 @@
+import sys
+if sys.version_info < (3,):
+    range = xrange
+
+import numpy as np
+import pandas as pd
+from scipy import optimize
+
+from ..inference.priors import ilogit, logit
+from ..results import MLEResults
+
+from .garch import GARCH
+from .garch_recursions import garch_panel_recursion, garch_panel_score
+
+class GARCHPanel(object):
+    """ **** PANEL OF GARCH MODELS ****
+
+    Fits a GARCH(p,q) model to each of N series at once. The variance recursion, likelihood and
+    score are computed for every series in a single compiled pass over an (N x T) matrix, and the
+    latent variables are estimated jointly by BHHH iterations with a step length chosen separately
+    for each series.
+
+    Parameters
+    ----------
+    data : pd.DataFrame or np.array
+        Panel of series. Each column of a pd.DataFrame, or each row of an (N x T) np.array,
+        is treated as a separate series.
+
+    p : int
+        Field to specify how many GARCH terms the models will have.
+
+    q : int
+        Field to specify how many ARCH terms the models will have.
+
+    vol_targeting : boolean (default : False)
+        If True, the volatility constant is not estimated; it is set so that the unconditional
+        variance of each model equals the sample variance of its series.
+    """
+
+    def __init__(self, data, p, q, vol_targeting=False):
+
+        self.p = p
+        self.q = q
+        self.z_no = self.p + self.q + 2
+        self.max_lag = max(self.p,self.q)
+        self.vol_targeting = vol_targeting
+        self.model_name = "GARCH(" + str(self.p) + "," + str(self.q) + ") Panel"
+        self.supported_methods = ["MLE"]
+        self.default_method = "MLE"
+
+        if isinstance(data, pd.DataFrame):
+            self.data = np.ascontiguousarray(data.values.T, dtype=np.float64)
+            self.data_names = [str(name) for name in data.columns.values]
+            self.models = [GARCH(data=data, p=self.p, q=self.q, target=name) for name in data.columns.values]
+        elif isinstance(data, np.ndarray):
+            self.data = np.ascontiguousarray(np.atleast_2d(data), dtype=np.float64)
+            self.data_names = ["Series " + str(i) for i in range(self.data.shape[0])]
+            self.models = [GARCH(data=self.data[i], p=self.p, q=self.q) for i in range(self.data.shape[0])]
+        else:
+            raise Exception("The data input is not pandas or numpy compatible!")
+
+        self.series_no = self.data.shape[0]
+
+        if self.data.shape[1] <= self.max_lag:
+            raise ValueError("Not enough observations for the chosen number of lags!")
+
+        for model in self.models:
+            model.model_name = model.model_name + " (" + model.data_name + ")"
+
+    def _transform(self, beta, data, vol_targeting):
+        """ Maps untransformed latent variables onto the GARCH parameters
+
+        Parameters
+        ----------
+        beta : np.array
+            (N x k) matrix of untransformed latent variables; the volatility constant is
+            omitted if volatility targeting is used
+
+        data : np.array
+            (N x T) matrix of the series that beta refers to
+
+        vol_targeting : boolean
+            Whether the volatility constant is implied by the sample variance
+
+        Returns
+        ----------
+        parm : np.array
+            (N x z_no) matrix of transformed latent variables
+
+        jacobian : np.array
+            (N x z_no x k) derivatives of parm with respect to beta
+        """
+
+        N = beta.shape[0]
+        parm = np.zeros((N, self.z_no))
+        jacobian = np.zeros((N, self.z_no, beta.shape[1]))
+        offset = 1 if vol_targeting is True else 0
+        terms = np.arange(1, self.q+self.p+1)
+
+        parm[:,terms] = ilogit(beta[:,terms-offset])
+        jacobian[:,terms,terms-offset] = parm[:,terms]*(1.0-parm[:,terms])
+        parm[:,-1] = beta[:,-1]
+        jacobian[:,-1,-1] = 1.0
+
+        if vol_targeting is True:
+            persistence = 1.0 - np.sum(parm[:,terms], axis=1)
+            demeaned = data - parm[:,-1:]
+            sample_var = np.mean(np.power(demeaned,2), axis=1)
+            parm[:,0] = sample_var*persistence
+            jacobian[:,0,terms-offset] = -sample_var[:,np.newaxis]*jacobian[:,terms,terms-offset]
+            jacobian[:,0,-1] = -2.0*np.mean(demeaned, axis=1)*persistence
+        else:
+            parm[:,0] = np.exp(beta[:,0])
+            jacobian[:,0,0] = parm[:,0]
+
+        return parm, jacobian
+
+    def _starting_values(self):
+        """ Creates starting values for the latent variables of every series
+
+        Returns
+        ----------
+        (N x k) matrix of untransformed starting values
+        """
+
+        parm = np.zeros((self.series_no, self.z_no))
+        parm[:,1:self.q+1] = ilogit(-4.0)
+        parm[:,self.q+1:self.q+self.p+1] = ilogit(-4.0)
+        if self.q != 0:
+            parm[:,1] = 0.05
+        if self.p != 0:
+            parm[:,self.q+1] = 0.85
+        parm[:,-1] = np.mean(self.data, axis=1)
+        persistence = 1.0 - np.sum(parm[:,1:-1], axis=1)
+        parm[:,0] = np.var(self.data, axis=1)*persistence
+
+        beta = np.zeros((self.series_no, self.z_no))
+        beta[:,0] = np.log(parm[:,0])
+        beta[:,1:-1] = logit(parm[:,1:-1])
+        beta[:,-1] = parm[:,-1]
+
+        if self.vol_targeting is True:
+            beta = beta[:,1:]
+
+        return beta
+
+    def neg_loglik(self, beta, series=None):
+        """ Creates the negative log-likelihood of each model in the panel
+
+        Parameters
+        ----------
+        beta : np.array
+            (N x k) matrix of untransformed latent variables
+
+        series : np.array or None
+            Indices of the series that beta refers to (default: all series)
+
+        Returns
+        ----------
+        N-length vector of negative loglikelihoods
+        """
+
+        data = self.data if series is None else self.data[series]
+        parm, _ = self._transform(beta, data, self.vol_targeting)
+        return garch_panel_recursion(parm, data, self.q, self.p, self.max_lag)[1]
+
+    def _score(self, beta, series=None, vol_targeting=None):
+        """ Negative loglikelihood, score and BHHH matrix with respect to beta
+
+        Parameters
+        ----------
+        beta : np.array
+            (N x k) matrix of untransformed latent variables
+
+        series : np.array or None
+            Indices of the series that beta refers to (default: all series)
+
+        vol_targeting : boolean or None
+            Whether beta omits the volatility constant (default: as for the panel)
+
+        Returns
+        ----------
+        neg_loglik, grad, opg : np.array
+        """
+
+        if vol_targeting is None:
+            vol_targeting = self.vol_targeting
+        data = self.data if series is None else self.data[series]
+        parm, jacobian = self._transform(beta, data, vol_targeting)
+        neg_loglik, grad, opg = garch_panel_score(parm, data, self.q, self.p, self.max_lag)
+        jacobian_t = np.transpose(jacobian, (0,2,1))
+        grad = np.matmul(jacobian_t, grad[:,:,np.newaxis])[:,:,0]
+        opg = np.matmul(jacobian_t, np.matmul(opg, jacobian))
+        return neg_loglik, grad, opg
+
+    def _bhhh(self, beta, iterations, tol):
+        """ Minimizes the negative loglikelihood of every series by BHHH iterations
+
+        Each series takes its own backtracking line search; series drop out of the active set as
+        soon as the (predicted or achieved) relative decrease in their objective falls below tol.
+
+        Parameters
+        ----------
+        beta : np.array
+            (N x k) matrix of untransformed starting values
+
+        iterations : int
+            Maximum number of BHHH iterations
+
+        tol : float
+            Convergence tolerance on the relative decrease of each negative loglikelihood
+
+        Returns
+        ----------
+        beta : np.array
+            (N x k) matrix of estimates
+
+        converged : np.array
+            N-length boolean vector of convergence flags
+        """
+
+        beta = beta.copy()
+        active = np.arange(beta.shape[0])
+        converged = np.zeros(beta.shape[0], dtype=bool)
+        ridge = 1e-8*np.identity(beta.shape[1])
+
+        for it in range(iterations):
+            if active.shape[0] == 0:
+                break
+
+            obj, grad, opg = self._score(beta[active], active)
+            try:
+                direction = np.linalg.solve(opg + ridge, grad[:,:,np.newaxis])[:,:,0]
+            except np.linalg.LinAlgError:
+                direction = np.array([np.linalg.lstsq(opg[i] + ridge, grad[i], rcond=None)[0] for i in range(active.shape[0])])
+            decrement = np.sum(grad*direction, axis=1)
+
+            scale = np.maximum(np.abs(obj), 1.0)
+            done = np.abs(decrement) <= tol*scale
+            converged[active[done]] = True
+
+            # Backtracking line search, separately for each series
+            searching = ~done & np.isfinite(obj)
+            step = np.ones(active.shape[0])
+            for _ in range(30):
+                if not np.any(searching):
+                    break
+                idx = np.where(searching)[0]
+                candidate = beta[active[idx]] - step[idx,np.newaxis]*direction[idx]
+                new_obj = self.neg_loglik(candidate, active[idx])
+                accept = np.isfinite(new_obj) & (new_obj <= obj[idx] - 1e-4*step[idx]*decrement[idx])
+                beta[active[idx[accept]]] = candidate[accept]
+                done[idx[accept]] = (obj[idx[accept]] - new_obj[accept]) <= tol*scale[idx[accept]]
+                step[idx[~accept]] *= 0.5
+                searching[idx[accept]] = False
+
+            # Series where no step decreases the objective are at a (numerical) optimum
+            converged[active[done | searching]] = True
+            active = active[~(done | searching | ~np.isfinite(obj))]
+
+        return beta, converged
+
+    def _full_beta(self, beta):
+        """ Inserts the implied volatility constant when volatility targeting is used """
+
+        if self.vol_targeting is True:
+            parm, _ = self._transform(beta, self.data, True)
+            return np.column_stack((np.log(parm[:,0]), beta))
+        else:
+            return beta
+
+    def _ihessian(self, beta):
+        """ Inverse Hessian of each negative loglikelihood with respect to the (full) latent variables
+
+        The Hessian is obtained by central differences of the analytic score, which costs 2k
+        passes over the panel.
+
+        Parameters
+        ----------
+        beta : np.array
+            (N x z_no) matrix of untransformed latent variables
+
+        Returns
+        ----------
+        List of inverse Hessians (None where the Hessian is singular)
+        """
+
+        hessian = np.zeros((beta.shape[0], self.z_no, self.z_no))
+        for j in range(self.z_no):
+            h = 1e-5*np.maximum(1.0, np.abs(beta[:,j]))
+            up, down = beta.copy(), beta.copy()
+            up[:,j] += h
+            down[:,j] -= h
+            hessian[:,:,j] = (self._score(up, vol_targeting=False)[1] - self._score(down, vol_targeting=False)[1])/(2.0*h[:,np.newaxis])
+
+        hessian = 0.5*(hessian + np.transpose(hessian, (0,2,1)))
+
+        ihessian = []
+        for i in range(hessian.shape[0]):
+            try:
+                if not np.all(np.isfinite(hessian[i])):
+                    raise np.linalg.LinAlgError
+                ihessian.append(np.linalg.inv(hessian[i]))
+            except np.linalg.LinAlgError:
+                ihessian.append(None)
+        return ihessian
+
+    def fit(self, method=None, **kwargs):
+        """ Fits a GARCH model to every series in the panel
+
+        Parameters
+        ----------
+        method : str
+            A fitting method (only 'MLE' is supported)
+
+        iterations : int (default : 200)
+            Maximum number of BHHH iterations
+
+        tol : float (default : 1e-9)
+            Convergence tolerance on the relative decrease of each negative loglikelihood
+
+        Returns
+        ----------
+        List of MLEResults objects, one per series
+        """
+
+        iterations = kwargs.get('iterations', 200)
+        tol = kwargs.get('tol', 1e-9)
+
+        if method is None:
+            method = self.default_method
+        elif method not in self.supported_methods:
+            raise ValueError("Method not supported!")
+
+        start = kwargs.get('start', self._starting_values())
+        beta, self.converged = self._bhhh(start, iterations, tol)
+        z = self._full_beta(beta)
+        ihessian = self._ihessian(z)
+        sigma2, neg_loglik = garch_panel_recursion(self._transform(beta, self.data, self.vol_targeting)[0], self.data, self.q, self.p, self.max_lag)
+
+        results = []
+        for i, model in enumerate(self.models):
+            Y = np.array(model.data[model.max_lag:])
+
+            if ihessian[i] is not None:
+                ses = np.power(np.abs(np.diag(ihessian[i])),0.5)
+            else:
+                ses = None
+            model.latent_variables.set_z_values(z[i],method,ses,None)
+            p = optimize.OptimizeResult(x=z[i], fun=neg_loglik[i], success=self.converged[i])
+
+            results.append(MLEResults(data_name=model.data_name,X_names=None,model_name=model.model_name,
+                model_type=model.model_type,latent_variables=model.latent_variables,results=p,data=Y,
+                index=model.index,multivariate_model=model.multivariate_model,objective_object=model.neg_loglik,
+                method=method,ihessian=ihessian[i],signal=sigma2[i],scores=np.power(Y-z[i,-1],2),
+                z_hide=model._z_hide,max_lag=model.max_lag,states=None,states_var=None))
+
+        return results
@@ -2,7 +2,7 @@ import numpy as np
 cimport numpy as np
 cimport cython
 
-from libc.math cimport exp, abs, M_PI
+from libc.math cimport exp, log, abs, M_PI, INFINITY
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
@@ -19,4 +19,180 @@ def garch_recursion(double[:] parameters, double[:] sigma2, int q_terms, int p_t
                 for k in range(0,p_terms):
                     sigma2[t] += parameters[1+q_terms+k]*(sigma2[t-1-k])
 
-    return sigma2
\ No newline at end of file
+    return sigma2
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def garch_panel_recursion(const double[:,:] parameters, const double[:,:] data, int q_terms, int p_terms, int max_lag):
+    """ GARCH variance recursion and negative loglikelihood for a panel of series
+
+    Parameters
+    ----------
+    parameters : np.array
+        (N x k) matrix of transformed latent variables, one row per series, ordered as
+        in GARCH: constant, q ARCH terms, p GARCH terms, returns constant
+
+    data : np.array
+        (N x T) matrix of series (one row per series)
+
+    q_terms, p_terms : int
+        Number of ARCH and GARCH terms
+
+    max_lag : int
+        Largest lag in the model
+
+    Returns
+    ----------
+    sigma2 : np.array
+        (N x T-max_lag) matrix of conditional variances
+
+    neg_loglik : np.array
+        N-length vector of negative loglikelihoods
+    """
+
+    cdef Py_ssize_t i, t, k
+    cdef Py_ssize_t N = data.shape[0]
+    cdef Py_ssize_t Y_len = data.shape[1] - max_lag
+    cdef double mu, beta_sum, resid, ll
+    cdef double log2pi = log(2.0*M_PI)
+
+    cdef double[:,::1] sigma2 = np.zeros((N, Y_len))
+    cdef double[::1] neg_loglik = np.zeros(N)
+
+    for i in range(N):
+        mu = parameters[i, q_terms+p_terms+1]
+        beta_sum = 0.0
+        for k in range(p_terms):
+            beta_sum += parameters[i, 1+q_terms+k]
+
+        ll = 0.0
+        for t in range(Y_len):
+            if p_terms != 0 and t < max_lag:
+                sigma2[i, t] = parameters[i, 0]/(1.0-beta_sum)
+            else:
+                sigma2[i, t] = parameters[i, 0]
+                for k in range(q_terms):
+                    resid = data[i, t+max_lag-k-1] - mu
+                    sigma2[i, t] += parameters[i, 1+k]*resid*resid
+                if p_terms != 0:
+                    for k in range(p_terms):
+                        sigma2[i, t] += parameters[i, 1+q_terms+k]*sigma2[i, t-1-k]
+
+            if not sigma2[i, t] > 0.0:
+                ll = INFINITY
+                break
+
+            resid = data[i, t+max_lag] - mu
+            ll += 0.5*(log2pi + log(sigma2[i, t]) + resid*resid/sigma2[i, t])
+
+        neg_loglik[i] = ll
+
+    return np.asarray(sigma2), np.asarray(neg_loglik)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def garch_panel_score(const double[:,:] parameters, const double[:,:] data, int q_terms, int p_terms, int max_lag):
+    """ Negative loglikelihood, score and outer product of the gradients for a panel of GARCH models
+
+    Derivatives of the conditional variance are carried through the GARCH recursion alongside
+    the variance itself, so one pass over the data gives the exact gradient with respect to the
+    transformed latent variables.
+
+    Parameters
+    ----------
+    parameters : np.array
+        (N x k) matrix of transformed latent variables, one row per series
+
+    data : np.array
+        (N x T) matrix of series (one row per series)
+
+    q_terms, p_terms : int
+        Number of ARCH and GARCH terms
+
+    max_lag : int
+        Largest lag in the model
+
+    Returns
+    ----------
+    neg_loglik : np.array
+        N-length vector of negative loglikelihoods
+
+    grad : np.array
+        (N x k) gradient of the negative loglikelihoods
+
+    opg : np.array
+        (N x k x k) outer product of the per-observation gradients (BHHH matrix)
+    """
+
+    cdef Py_ssize_t i, t, j, k, l
+    cdef Py_ssize_t N = data.shape[0]
+    cdef Py_ssize_t Y_len = data.shape[1] - max_lag
+    cdef Py_ssize_t z_no = q_terms + p_terms + 2
+    cdef Py_ssize_t mu_idx = q_terms + p_terms + 1
+    cdef double mu, beta_sum, resid, ll, weight
+    cdef double log2pi = log(2.0*M_PI)
+
+    cdef double[::1] sigma2 = np.zeros(Y_len)
+    cdef double[:,::1] dsigma2 = np.zeros((Y_len, z_no))
+    cdef double[::1] g = np.zeros(z_no)
+    cdef double[::1] neg_loglik = np.zeros(N)
+    cdef double[:,::1] grad = np.zeros((N, z_no))
+    cdef double[:,:,::1] opg = np.zeros((N, z_no, z_no))
+
+    for i in range(N):
+        mu = parameters[i, mu_idx]
+        beta_sum = 0.0
+        for k in range(p_terms):
+            beta_sum += parameters[i, 1+q_terms+k]
+
+        ll = 0.0
+        for t in range(Y_len):
+            for j in range(z_no):
+                dsigma2[t, j] = 0.0
+
+            if p_terms != 0 and t < max_lag:
+                sigma2[t] = parameters[i, 0]/(1.0-beta_sum)
+                dsigma2[t, 0] = 1.0/(1.0-beta_sum)
+                for k in range(p_terms):
+                    dsigma2[t, 1+q_terms+k] = parameters[i, 0]/((1.0-beta_sum)*(1.0-beta_sum))
+            else:
+                sigma2[t] = parameters[i, 0]
+                dsigma2[t, 0] = 1.0
+                for k in range(q_terms):
+                    resid = data[i, t+max_lag-k-1] - mu
+                    sigma2[t] += parameters[i, 1+k]*resid*resid
+                    dsigma2[t, 1+k] = resid*resid
+                    dsigma2[t, mu_idx] += -2.0*parameters[i, 1+k]*resid
+                for k in range(p_terms):
+                    sigma2[t] += parameters[i, 1+q_terms+k]*sigma2[t-1-k]
+                    dsigma2[t, 1+q_terms+k] += sigma2[t-1-k]
+                    for j in range(z_no):
+                        dsigma2[t, j] += parameters[i, 1+q_terms+k]*dsigma2[t-1-k, j]
+
+            if not sigma2[t] > 0.0:
+                ll = INFINITY
+                break
+
+            resid = data[i, t+max_lag] - mu
+            ll += 0.5*(log2pi + log(sigma2[t]) + resid*resid/sigma2[t])
+
+            # Per-observation score of the negative loglikelihood
+            weight = 0.5*(1.0/sigma2[t] - resid*resid/(sigma2[t]*sigma2[t]))
+            for j in range(z_no):
+                g[j] = weight*dsigma2[t, j]
+            g[mu_idx] += -resid/sigma2[t]
+
+            for j in range(z_no):
+                grad[i, j] += g[j]
+                for l in range(j+1):
+                    opg[i, j, l] += g[j]*g[l]
+
+        neg_loglik[i] = ll
+
+        for j in range(z_no):
+            for l in range(j):
+                opg[i, l, j] = opg[i, j, l]
+
+    return np.asarray(neg_loglik), np.asarray(grad), np.asarray(opg)
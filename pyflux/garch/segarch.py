@@ -59,7 +59,7 @@ class SEGARCH(tsm.TSM):
         self.leverage = False
         self.model_name = "SEGARCH(" + str(self.p) + "," + str(self.q) + ")"
         self._z_hide = 0 # Whether to cutoff variance latent variables from results
-        self.supported_methods = ["MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["MLE","PML","Laplace","M-H","AM","BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
 
@@ -80,7 +80,7 @@ class SEGARCHM(tsm.TSM):
         self.leverage = False
         self.model_name = "SEGARCHM(" + str(self.p) + "," + str(self.q) + ")"
         self._z_hide = 0 # Whether to cutoff variance latent variables from results
-        self.supported_methods = ["MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["MLE","PML","Laplace","M-H","AM","BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
 
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pyflux as pf
+
+noise = np.random.normal(0,0.00001,100)
+vol = np.ones(100)*0.01
+
+for i in range(1,len(vol)):
+	vol[i] = 0.999*vol[i-1] + noise[i]
+
+data = np.array([np.random.normal(0,vol,100) for i in range(3)])
+
+def test_couple_terms():
+	model = pf.GARCHPanel(data=data, p=1, q=1)
+	x = model.fit()
+	assert(len(x) == 3)
+	for series in model.models:
+		assert(len(series.latent_variables.z_list) == 4)
+		lvs = np.array([i.value for i in series.latent_variables.z_list])
+		assert(len(lvs[np.isnan(lvs)]) == 0)
+
+def test_no_arch_terms():
+	model = pf.GARCHPanel(data=data, p=1, q=0)
+	x = model.fit()
+	for series in model.models:
+		assert(len(series.latent_variables.z_list) == 3)
+		lvs = np.array([i.value for i in series.latent_variables.z_list])
+		assert(len(lvs[np.isnan(lvs)]) == 0)
+
+def test_vol_targeting():
+	model = pf.GARCHPanel(data=data, p=1, q=1, vol_targeting=True)
+	x = model.fit()
+	for series in model.models:
+		assert(len(series.latent_variables.z_list) == 4)
+		lvs = np.array([i.value for i in series.latent_variables.z_list])
+		assert(len(lvs[np.isnan(lvs)]) == 0)
+
+def test_matches_garch():
+	garch_data = np.zeros((2,500))
+	for j in range(garch_data.shape[0]):
+		sigma2 = 1.0
+		for t in range(1,garch_data.shape[1]):
+			sigma2 = 0.05 + 0.1*garch_data[j,t-1]**2 + 0.85*sigma2
+			garch_data[j,t] = np.random.normal(0,np.sqrt(sigma2))
+	model = pf.GARCHPanel(data=garch_data, p=1, q=1)
+	x = model.fit()
+	single = pf.GARCH(data=garch_data[1], p=1, q=1)
+	y = single.fit()
+	assert(abs(x[1].loglik - y.loglik) < 1e-2)
+
+def test_pandas():
+	panel = pd.DataFrame(data.T, columns=['a','b','c'])
+	model = pf.GARCHPanel(data=panel, p=1, q=1)
+	x = model.fit()
+	assert(x[1].data_name == 'b')
+
+def test_predict_length():
+	model = pf.GARCHPanel(data=data, p=2, q=2)
+	x = model.fit()
+	x[0].summary()
+	assert(model.models[0].predict(h=5).shape[0] == 5)
+
+def test_read_only_data():
+	"""
+	Tests that the panel recursions accept read-only data, as DataFrame.values can be
+	"""
+	frozen = data.copy()
+	frozen.setflags(write=False)
+	model = pf.GARCHPanel(data=frozen, p=1, q=1)
+	x = model.fit()
+	for series in model.models:
+		lvs = np.array([i.value for i in series.latent_variables.z_list])
+		assert(len(lvs[np.isnan(lvs)]) == 0)
@@ -37,6 +37,14 @@ def test_mh():
 	lvs = np.array([i.value for i in model.latent_variables.z_list])
 	assert(len(lvs[np.isnan(lvs)]) == 0)
 
+def test_am():
+	model = pf.GARCH(data=data, p=1, q=1)
+	x = model.fit('AM', nsims=300)
+	assert(len(model.latent_variables.z_list) == 4)
+	lvs = np.array([i.value for i in model.latent_variables.z_list])
+	assert(len(lvs[np.isnan(lvs)]) == 0)
+	assert(x.samples.shape == (4, 300))
+
 def test_laplace():
 	model = pf.GARCH(data=data, p=1, q=1)
 	x = model.fit('Laplace')
@@ -43,7 +43,7 @@ class GASReg(tsm.TSM):
         # Latent Variables
         self.max_lag = 0
         self._z_hide = 0 # Whether to cutoff variance latent variables from results
-        self.supported_methods = ["MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["MLE","PML","Laplace","M-H","AM","BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
         self.skewness = False
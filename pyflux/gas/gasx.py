@@ -55,7 +55,7 @@ class GASX(tsm.TSM):
         self.z_no = self.ar + self.sc
         self.max_lag = max(self.ar,self.sc)
         self._z_hide = 0 # Whether to cutoff variance latent variables from results
-        self.supported_methods = ["MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["MLE","PML","Laplace","M-H","AM","BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
 
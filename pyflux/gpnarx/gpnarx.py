@@ -1,4 +1,6 @@
+import copy
 import sys
+import tempfile
 if sys.version_info < (3,):
     range = xrange
 
@@ -7,6 +9,7 @@ import pandas as pd
 import scipy.linalg as la
 import scipy.sparse as sp
 import scipy.stats as ss
+from scipy.cluster.vq import kmeans2
 from scipy.stats import multivariate_normal
 import seaborn as sns
 
@@ -42,9 +45,27 @@ class GPNARX(tsm.TSM):
     target : str (pd.DataFrame) or int (np.array)
         Specifies which column name or array index to use. By default, first
         column/array will be selected as the dependent variable.
+
+    approximation : str (default : None)
+        Sparse approximation to use: 'fitc' or 'vfe' (inducing point approximations
+        costing O(nM^2)); None for the exact GP
+
+    inducing : int or np.ndarray (default : 100)
+        Number of inducing inputs M for a sparse approximation, placed by k-means on the
+        lag vectors, or the inducing inputs themselves (one row per input)
+
+    blocksize : int (default : None)
+        If given, the exact GP assembles its Gram matrix in tiles of this size into a single
+        preallocated buffer and factorises it in place, so that only one n x n matrix is held
+        in memory; None keeps the Gram matrix alongside its Cholesky factor
+
+    memmap : boolean or str (default : False)
+        Whether to back the buffer of the blocked assembly with a temporary file (created in
+        this directory if a str is given) rather than memory
     """
 
-    def __init__(self, data, ar, kernel, integ=0, target=None):
+    def __init__(self, data, ar, kernel, integ=0, target=None, approximation=None, inducing=100,
+        blocksize=None, memmap=False):
 
         # Initialize TSM object
         super(GPNARX,self).__init__('GPNARX')
@@ -57,10 +78,18 @@ class GPNARX(tsm.TSM):
 
         self.integ = integ
 
+        if approximation not in [None, 'fitc', 'vfe']:
+            raise ValueError("approximation must be one of None, 'fitc' or 'vfe'")
+
+        self.approximation = approximation
+        self.inducing = inducing
+        self.memmap = memmap
+        self.blocksize = 1024 if memmap is not False and blocksize is None else blocksize
+
         self.max_lag = self.ar
         self.model_name = 'GPNARX(' + str(self.ar) + ')'
         self._z_hide = 0 # Whether to cutoff variance latent variables from results
-        self.supported_methods = ["MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["MLE","PML","Laplace","M-H","AM","BBVI"]
         self.default_method = "MLE"     
 
         self.multivariate_model = False
@@ -83,9 +112,17 @@ class GPNARX(tsm.TSM):
         self.data = (self.data - self._norm_mean) / self._norm_std
         self.data_full = (self.data_full - self._norm_mean) / self._norm_std
 
+        self._X = None
+        self._cached_parm = None
+        self._cached_terms = None
+        self._buffer = None
+
         self.kernel = kernel
         self.kernel.X = self.X().T
 
+        if self.approximation is not None:
+            self.inducing_inputs = self._inducing_inputs(inducing)
+
         # Define latent variables
         self._create_latent_variables()
         
@@ -103,10 +140,261 @@ class GPNARX(tsm.TSM):
         ----------
         np.ndarray (alpha)
         """     
-        return la.cho_solve((L.T, True), la.cho_solve((L, True), np.transpose(self.data)))
+        return la.cho_solve((L.T, False), np.transpose(self.data), check_finite=False)
+
+    def _solve_L(self, L, B):
+        """ Solves LX = B for the Cholesky factor L
+
+        Notes
+        ----------
+        L is C-ordered, so LAPACK is given its transpose, which is Fortran-ordered; this avoids
+        copying the n x n factor on every solve
+
+        Parameters
+        ----------
+        L : np.ndarray
+            Cholesky triangular
+
+        B : np.ndarray
+            Right hand side
+
+        Returns
+        ----------
+        np.ndarray (X)
+        """
+        return la.solve_triangular(L.T, B, trans='T', check_finite=False)
+
+    def _covariance_terms(self, parm):
+        """ Gram matrix, its Cholesky factor and alpha for the hyperparameters; these are kept
+        for the latest hyperparameters so that repeated calls reuse the O(n^3) factorisation
+
+        Parameters
+        ----------
+        parm : np.array
+            Contains transformed latent variables
+
+        Returns
+        ----------
+        K, L, alpha : np.ndarray
+            (K is None for the blocked assembly, which overwrites it with L)
+        """
+        if self._cached_parm is None or not np.array_equal(parm, self._cached_parm):
+            self._cached_parm = None
+            if self.blocksize is None:
+                K = self.kernel.K(parm)
+                L = np.linalg.cholesky(K + np.identity(K.shape[0])*parm[0])
+            else:
+                K, L = None, self._blocked_cholesky(parm)
+            self._cached_terms = (K, L, self._alpha(L))
+            self._cached_parm = np.array(parm, copy=True)
+        return self._cached_terms
+
+    def _blocks(self):
+        """ Row ranges of the tiles of the blocked assembly
+
+        Returns
+        ----------
+        - list of (start, end) tuples
+        """
+        n = self.data.shape[0]
+        return [(i, min(i + self.blocksize, n)) for i in range(0, n, self.blocksize)]
+
+    def _blocked_cholesky(self, parm):
+        """ Assembles the lower triangle of K + noise*I tile by tile into the preallocated
+        buffer and factorises it in place
+
+        Notes
+        ----------
+        The buffer is C-ordered, so its transpose is a Fortran-ordered array holding the
+        assembled triangle as its upper triangle; LAPACK factorises that in place into U = L',
+        which leaves L in the buffer. No other n x n array is formed, so the exact GP can use
+        close to all of the available memory (or a memory-mapped file) for one matrix.
+
+        Parameters
+        ----------
+        parm : np.array
+            Contains transformed latent variables
+
+        Returns
+        ----------
+        The cholesky decomposition (L) of K, held in the buffer
+        """
+        n = self.data.shape[0]
+        if self._buffer is None:
+            if self.memmap is False:
+                self._buffer = np.empty((n, n))
+            else:
+                temp = tempfile.TemporaryFile(dir=self.memmap if self.memmap is not True else None)
+                self._buffer = np.memmap(temp, dtype=np.float64, mode='w+', shape=(n, n))
+
+        X = self.kernel.X
+        for i0, i1 in self._blocks():
+            for j0, j1 in self._blocks():
+                if j0 > i0:
+                    break
+                self._buffer[i0:i1, j0:j1] = self.kernel.K_arbitrary_X(parm, X[i0:i1], X[j0:j1])
+        self._buffer[np.diag_indices(n)] += parm[0] + 10**-10
+
+        U = la.cholesky(self._buffer.T, lower=False, overwrite_a=True, check_finite=False)
+        return U.T
+
+    def _K_dot(self, parm, v):
+        """ Product of the Gram matrix with a vector, assembled tile by tile - see
+        _blocked_cholesky
+
+        Parameters
+        ----------
+        parm : np.array
+            Contains transformed latent variables
+
+        v : np.ndarray
+            The vector
+
+        Returns
+        ----------
+        np.ndarray (Kv)
+        """
+        X = self.kernel.X
+        Kv = np.zeros(X.shape[0])
+        for i0, i1 in self._blocks():
+            for j0, j1 in self._blocks():
+                Kv[i0:i1] += np.dot(self.kernel.K_arbitrary_X(parm, X[i0:i1], X[j0:j1]), v[j0:j1])
+        return Kv
+
+    def _inducing_inputs(self, inducing):
+        """ Chooses the inducing inputs for a sparse approximation
+
+        Parameters
+        ----------
+        inducing : int or np.ndarray
+            Number of inducing inputs, placed at k-means centres of the lag vectors (starting
+            from a random subset of them), or the inducing inputs themselves
+
+        Returns
+        ----------
+        np.ndarray of inducing inputs (M x ar)
+        """
+        if np.ndim(inducing) == 2:
+            return np.array(inducing, dtype=np.float64)
+
+        X = self.kernel.X
+        if inducing >= X.shape[0]:
+            return X.copy()
+
+        centres, labels = kmeans2(X, X[np.random.choice(X.shape[0], inducing, replace=False)], minit='matrix')
+        return centres[np.unique(labels)]
+
+    def _sparse_terms(self, parm):
+        """ Terms of the FITC or VFE approximation, kept for the latest hyperparameters - see
+        _covariance_terms
+
+        Notes
+        ----------
+        With Kuu = LuuLuu' and V = Luu^-1 Kuf, the data covariance is approximated by
+        V'V + diag(lambda): FITC sets lambda to the noise variance plus the diagonal of Kff - V'V,
+        VFE to the noise variance alone (see Quinonero-Candela & Rasmussen, 2005, and Titsias,
+        2009). By the Woodbury identity every solve then involves B = I + V diag(lambda)^-1 V',
+        which is M x M, so the cost is O(nM^2) and no n x n matrix is formed.
+
+        Parameters
+        ----------
+        parm : np.array
+            Contains transformed latent variables
+
+        Returns
+        ----------
+        Luu, LB : np.ndarray
+            Cholesky factors of Kuu and B
+
+        lam : np.ndarray
+            The diagonal term lambda
+
+        c : np.ndarray
+            LB^-1 V diag(lambda)^-1 y
+
+        trace : float
+            Trace of Kff - V'V
+
+        V : np.ndarray
+            V diag(lambda)^-1/2
+        """
+        if self._cached_parm is None or not np.array_equal(parm, self._cached_parm):
+            Kuu = self.kernel.Kstarstar(parm, self.inducing_inputs)
+            Kuu[np.diag_indices_from(Kuu)] += np.mean(np.diag(Kuu))*10**-8
+            Luu = np.linalg.cholesky(Kuu)
+            V = la.solve_triangular(Luu, self.kernel.Kstar(parm, self.inducing_inputs).T, lower=True)
+
+            # The kernels are stationary, so the diagonal of Kff is the kernel at zero distance
+            kff = self.kernel.Kstarstar(parm, self.inducing_inputs[:1])[0,0]
+            residual = np.maximum(kff - np.sum(np.power(V,2),axis=0), 0.0)
+            if self.approximation == 'fitc':
+                lam = parm[0] + residual
+            else:
+                lam = np.ones(V.shape[1])*parm[0]
+
+            V = V/np.sqrt(lam)
+            LB = np.linalg.cholesky(np.identity(V.shape[0]) + np.dot(V, V.T))
+            c = la.solve_triangular(LB, np.dot(V, self.data/np.sqrt(lam)), lower=True)
+            self._cached_terms = (Luu, LB, lam, c, np.sum(residual), V)
+            self._cached_parm = np.array(parm, copy=True)
+        return self._cached_terms
+
+    def _sparse_predict(self, parm, Xstar):
+        """ Predictive means and variances of the function under the sparse approximation
+
+        Parameters
+        ----------
+        parm : np.array
+            Contains transformed latent variables
+
+        Xstar : np.ndarray
+            Inputs to predict at (one row per input)
+
+        Returns
+        ----------
+        - predictive means
+        - predictive variances
+        """
+        Luu, LB, _, c, _, _ = self._sparse_terms(parm)
+        w = la.solve_triangular(Luu, self.kernel.K_arbitrary_X(parm, self.inducing_inputs, Xstar), lower=True)
+        u = la.solve_triangular(LB, w, lower=True)
+        kss = self.kernel.Kstarstar(parm, Xstar[:1])[0,0]
+        return np.dot(u.T, c), kss - np.sum(np.power(w,2),axis=0) + np.sum(np.power(u,2),axis=0)
+
+    def _predictive(self, parm, Xstar):
+        """ Predictive means and variances of the function for a block of inputs, reusing the
+        factorisation of the training data
+
+        Parameters
+        ----------
+        parm : np.array
+            Contains transformed latent variables
+
+        Xstar : np.ndarray
+            Inputs to predict at (one row per input)
+
+        Returns
+        ----------
+        - predictive means
+        - predictive variances
+        """
+        if self.approximation is not None:
+            return self._sparse_predict(parm, Xstar)
+        _, L, alpha = self._covariance_terms(parm)
+        Kstar = self.kernel.Kstar(parm, Xstar)
+        v = self._solve_L(L, Kstar)
+        # The kernels are stationary, so the prior variance is the kernel at zero distance
+        kss = self.kernel.Kstarstar(parm, Xstar[:1])[0,0]
+        return np.dot(Kstar.T, alpha), kss - np.sum(np.power(v,2),axis=0)
 
     def _construct_predict(self, beta, h):    
         """ Creates h-step ahead forecasts for the Gaussian process
+
+        Notes
+        ----------
+        Each forecast is fed back as the first lag of the next input; the variances are those
+        of the function at each of these inputs, so they do not account for the uncertainty in
+        the fed back forecasts - see _sim_prediction
         
         Parameters
         ----------
@@ -122,38 +410,56 @@ class GPNARX(tsm.TSM):
         - variance of predictions
         """             
 
-        # Refactor this entire code in future
         parm = np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
-        Xstart = self.X().copy()
-        Xstart = [i for i in Xstart]
+        Xstar = self.data_full[-self.ar:][::-1].reshape(1, self.ar)
         predictions = np.zeros(h)
         variances = np.zeros(h)
 
         for step in range(0,h):
-            Xstar = []
+            mean, variance = self._predictive(parm, Xstar)
+            predictions[step], variances[step] = mean[0], variance[0]
+            Xstar = np.roll(Xstar, 1, axis=1)
+            Xstar[0,0] = predictions[step]
+
+        return predictions, variances, predictions - 1.98*np.power(variances,0.5), predictions + 1.98*np.power(variances,0.5)
+
+    def _sim_prediction(self, beta, h, simulations):
+        """ Simulates h-step ahead paths of the series
+
+        Notes
+        ----------
+        Each step draws the next value of every path from the predictive distribution of the
+        function plus noise at that path's own lags, so the spread of the paths reflects the
+        uncertainty of the fed back values. All paths are predicted as one block of inputs
+        against the single factorisation of the training data.
 
-            for lag in range(0,self.max_lag):
-                if lag == 0:
-                    if step == 0:
-                        Xstar.append([self.data[-1]])
-                        Xstart[0] = np.append(Xstart[0],self.data[-1])
-                    else:
-                        Xstar.append([predictions[step-1]])
-                        Xstart[0] = np.append(Xstart[0],predictions[step-1])
-                else:
-                    Xstar.append([Xstart[lag-1][-2]])
-                    Xstart[lag] = np.append(Xstart[lag],Xstart[lag-1][-2])
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for the latent variables
 
-            Kstar = self.kernel.Kstar(parm, np.transpose(np.array(Xstar)))
+        h : int
+            How many steps ahead to simulate
 
-            L = self._L(parm)
-            alpha = self._alpha(L)   
+        simulations : int
+            How many paths to simulate
 
-            predictions[step] = np.dot(np.transpose(Kstar), alpha)
-            v = la.cho_solve((L, True), Kstar)
-            variances[step] = self.kernel.Kstarstar(parm, np.transpose(np.array(Xstar))) - np.dot(v.T, v)
+        Returns
+        ----------
+        - np.ndarray (h x simulations) of simulated paths
+        """
 
-        return predictions, variances, predictions - 1.98*np.power(variances,0.5), predictions + 1.98*np.power(variances,0.5)
+        parm = np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
+        Xstar = np.tile(self.data_full[-self.ar:][::-1], (simulations, 1))
+        sim_vector = np.zeros([h, simulations])
+
+        for step in range(0,h):
+            mean, variance = self._predictive(parm, Xstar)
+            sim_vector[step] = mean + np.sqrt(np.maximum(variance, 0.0) + parm[0])*np.random.randn(simulations)
+            Xstar = np.roll(Xstar, 1, axis=1)
+            Xstar[:,0] = sim_vector[step]
+
+        return sim_vector
 
     def _create_latent_variables(self):
         """ Creates model latent variables
@@ -189,7 +495,7 @@ class GPNARX(tsm.TSM):
         The cholesky decomposition (L) of K
         """ 
 
-        return np.linalg.cholesky(self.kernel.K(parm) + np.identity(self.X().shape[1])*parm[0])
+        return self._covariance_terms(parm)[1]
 
     def X(self):
         """ Creates design matrix of variables to use in GP regression
@@ -198,16 +504,9 @@ class GPNARX(tsm.TSM):
         ----------
         The design matrix
         """     
-        if self.ar == 1:
-            return np.array([self.data_full[(self.max_lag-1):-1]])
-        else:
-            for i in range(0,self.ar):
-                datapoint = self.data_full[(self.max_lag-i-1):-i-1]         
-                if i == 0:
-                    X = datapoint
-                else:
-                    X = np.vstack((X,datapoint))
-        return X
+        if self._X is None:
+            self._X = np.array([self.data_full[(self.max_lag-i-1):-i-1] for i in range(0,self.ar)])
+        return self._X
 
     def expected_values(self, beta):
         """ Expected values of the function given the covariance matrix and hyperparameters
@@ -223,9 +522,12 @@ class GPNARX(tsm.TSM):
         """     
 
         parm = np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
-        L = self._L(parm)
-        alpha = self._alpha(L)
-        return np.dot(np.transpose(self.kernel.K(parm)), alpha)
+        if self.approximation is not None:
+            return self._sparse_predict(parm, self.kernel.X)[0]
+        K, _, alpha = self._covariance_terms(parm)
+        if K is None:
+            return self._K_dot(parm, alpha)
+        return np.dot(np.transpose(K), alpha)
 
     def variance_values(self, beta):
         """ Covariance matrix for the estimated function
@@ -237,12 +539,23 @@ class GPNARX(tsm.TSM):
         
         Returns
         ----------
-        Covariance matrix for the estimated function 
+        Covariance matrix for the estimated function (for sparse approximations and the
+        blocked assembly, the vector of its diagonal)
         """     
         parm = np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
-        L = self._L(parm)
-        v = la.cho_solve((L, True), self.kernel.K(parm))
-        return self.kernel.K(parm) - np.dot(v.T, v)
+        if self.approximation is not None:
+            return self._sparse_predict(parm, self.kernel.X)[1]
+        K, L, _ = self._covariance_terms(parm)
+        if K is None:
+            X = self.kernel.X
+            kss = self.kernel.Kstarstar(parm, X[:1])[0,0]
+            variances = np.zeros(X.shape[0])
+            for j0, j1 in self._blocks():
+                v = self._solve_L(L, self.kernel.K_arbitrary_X(parm, X, X[j0:j1]))
+                variances[j0:j1] = kss - np.sum(np.power(v,2),axis=0)
+            return variances
+        v = self._solve_L(L, K)
+        return K - np.dot(v.T, v)
 
     def full_neg_loglik(self, beta):
         """ Creates the negative log marginal likelihood of the model
@@ -257,8 +570,132 @@ class GPNARX(tsm.TSM):
         The negative log marginal logliklihood of the model
         """             
         parm = np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
-        L = self._L(parm)
-        return -(-0.5*(np.dot(np.transpose(self.data),self._alpha(L))) - np.log(np.diag(L)).sum() - (self.data.shape[0]/2.0)*np.log(2.0*np.pi))
+        if self.approximation is not None:
+            return self._sparse_neg_loglik(parm)
+        _, L, alpha = self._covariance_terms(parm)
+        return -(-0.5*(np.dot(np.transpose(self.data),alpha)) - np.log(np.diag(L)).sum() - (self.data.shape[0]/2.0)*np.log(2.0*np.pi))
+
+    def neg_loglik_and_grad(self, beta):
+        """ Creates the negative log marginal likelihood of the model and its gradient
+
+        Notes
+        ----------
+        For the exact GP the derivative of the log marginal likelihood with respect to a
+        hyperparameter theta is 0.5*tr((alpha alpha' - K^-1) dK/dtheta) (Rasmussen & Williams,
+        2006, section 5.4.1). The matrix alpha alpha' - K^-1 is formed once from the cached
+        Cholesky factor, and the kernel accumulates its inner product with each derivative from
+        the cached Gram matrix, so no derivative matrix is formed. The sparse approximations
+        have their own gradient (see _sparse_neg_loglik_and_grad); the blocked assembly, which
+        has no room for an n x n matrix besides the factor, uses central differences.
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for latent variables
+
+        Returns
+        ----------
+        The negative log likelihood of the model and its gradient with respect to beta
+        """
+        if self.blocksize is not None and self.approximation is None:
+            grad = np.zeros(beta.shape[0])
+            for k in range(beta.shape[0]):
+                step = np.zeros(beta.shape[0])
+                step[k] = 1e-6
+                grad[k] = (self.full_neg_loglik(beta+step) - self.full_neg_loglik(beta-step))/(2e-6)
+            return self.full_neg_loglik(beta), grad
+
+        parm = np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
+        if self.approximation is not None:
+            neg_loglik, grad = self._sparse_neg_loglik_and_grad(parm)
+            return neg_loglik, grad*self.latent_variables.get_z_transform_gradients(beta)
+
+        K, L, alpha = self._covariance_terms(parm)
+        neg_loglik = self.full_neg_loglik(beta)
+
+        # W = alpha alpha' - K^-1 in one buffer: dpotri gives the lower triangle of K^-1, which is
+        # mirrored, negated and updated in place; W is symmetric, so its transpose is C-ordered
+        W, _ = la.lapack.dpotri(L, lower=1)
+        W += np.tril(W,-1).T
+        W *= -1.0
+        W = la.blas.dger(1.0, alpha, alpha, a=W, overwrite_a=True).T
+
+        score = np.append(0.5*np.trace(W), 0.5*self.kernel.dK(parm, W, K))
+        return neg_loglik, -score*self.latent_variables.get_z_transform_gradients(beta)
+
+    def _sparse_neg_loglik_and_grad(self, parm):
+        """ Negative log marginal likelihood of the sparse approximations (see _sparse_neg_loglik)
+        and its gradient with respect to the transformed latent variables
+
+        Notes
+        ----------
+        Write Sigma = Q + diag(lambda) for the approximate covariance, with Q = Kfu Kuu^-1 Kuf,
+        A = Kuu^-1 Kuf, b = Sigma^-1 y and W = Sigma^-1 - bb'. The derivative of the objective
+        with respect to a kernel parameter theta is then
+
+        sum(dKuf*P) - 0.5*sum(dKuu*Pu) + 0.5*sum(d)*dkff
+
+        with P = AW - A diag(d) and Pu = AWA' - A diag(d) A', where d is the diagonal of W for
+        FITC and 1/sigma^2 for VFE (whose bound adds tr(Kff - Q)/(2 sigma^2)), and dkff is the
+        derivative of the prior variance k(x, x). By the Woodbury identity AW, AWA' and the
+        diagonal of W only need the M x n and M x M terms of _sparse_terms, so the gradient
+        costs O(nM^2), like the objective.
+
+        Parameters
+        ----------
+        parm : np.array
+            Contains transformed latent variables
+
+        Returns
+        ----------
+        The negative log marginal likelihood (or bound) and its gradient with respect to parm
+        """
+        Luu, LB, lam, c, trace, Vs = self._sparse_terms(parm)
+        neg_loglik = self._sparse_neg_loglik(parm)
+        root = np.sqrt(lam)
+        V = Vs*root
+
+        U = la.solve_triangular(LB, Vs, lower=True)
+        b = (self.data/root - np.dot(Vs.T, la.solve_triangular(LB, c, lower=True, trans='T')))/root
+        Ab = la.solve_triangular(Luu, np.dot(V, b), lower=True, trans='T')
+        w = (1.0 - np.sum(np.power(U,2),axis=0))/lam - np.power(b,2)
+        d = w if self.approximation == 'fitc' else np.ones(w.shape[0])/parm[0]
+
+        # A Sigma^-1 = Luu^-T B^-1 V diag(lambda)^-1 and A Sigma^-1 A' = Luu^-T (I - B^-1) Luu^-1
+        U = la.solve_triangular(LB, U, lower=True, trans='T')
+        P = la.solve_triangular(Luu, U/root - V*d, lower=True, trans='T') - np.outer(Ab, b)
+        Pu = np.identity(Luu.shape[0]) - la.cho_solve((LB, True), np.identity(Luu.shape[0])) - np.dot(V*d, V.T)
+        Pu = la.solve_triangular(Luu, la.solve_triangular(Luu, Pu, lower=True, trans='T').T, lower=True, trans='T')
+        Pu -= np.outer(Ab, Ab)
+
+        Z = self.inducing_inputs
+        grad = np.zeros(parm.shape[0])
+        grad[0] = 0.5*np.sum(w)
+        if self.approximation == 'vfe':
+            grad[0] -= 0.5*trace/np.power(parm[0],2)
+        grad[1:] = (self.kernel.dK(parm, P, Xstar1=Z, Xstar2=self.kernel.X) - 0.5*self.kernel.dK(parm, Pu, Xstar1=Z)
+            + 0.5*np.sum(d)*self.kernel.dK(parm, np.ones((1,1)), Xstar1=Z[:1]))
+        return neg_loglik, grad
+
+    def _sparse_neg_loglik(self, parm):
+        """ Negative log marginal likelihood under the FITC approximation, or the negative of
+        the VFE lower bound on it - see _sparse_terms
+
+        Parameters
+        ----------
+        parm : np.array
+            Contains transformed latent variables
+
+        Returns
+        ----------
+        The negative log marginal likelihood (or bound)
+        """
+        _, LB, lam, c, trace, _ = self._sparse_terms(parm)
+        neg_loglik = (0.5*(np.sum(np.power(self.data,2)/lam) - np.dot(c,c)) + np.log(np.diag(LB)).sum()
+            + 0.5*np.log(lam).sum() + (self.data.shape[0]/2.0)*np.log(2.0*np.pi))
+        if self.approximation == 'vfe':
+            neg_loglik += 0.5*trace/parm[0]
+        return neg_loglik
 
     def plot_fit(self, intervals=True, **kwargs):
         """ Plots the fit of the Gaussian process model to the data
@@ -282,8 +719,10 @@ class GPNARX(tsm.TSM):
         date_index = self.index[self.max_lag:]
         expectation = self.expected_values(self.latent_variables.get_z_values())
         variance = self.variance_values(self.latent_variables.get_z_values())
-        upper = expectation + 1.98*np.power(np.diag(variance),0.5)
-        lower = expectation - 1.98*np.power(np.diag(variance),0.5)
+        if variance.ndim == 2:
+            variance = np.diag(variance)
+        upper = expectation + 1.98*np.power(variance,0.5)
+        lower = expectation - 1.98*np.power(variance,0.5)
 
         plt.figure(figsize=figsize) 
 
@@ -294,7 +733,7 @@ class GPNARX(tsm.TSM):
         plt.subplot(2, 2, 2)
         plt.title(self.data_name + " Raw and Expected") 
         plt.plot(date_index,self.data*self._norm_std + self._norm_mean,'k',alpha=0.2)
-        plt.plot(date_index,self.expected_values(self.latent_variables.get_z_values())*self._norm_std + self._norm_mean,'b')
+        plt.plot(date_index,expectation*self._norm_std + self._norm_mean,'b')
 
         plt.subplot(2, 2, 3)
         plt.title(self.data_name + " Raw and Expected (with intervals)")    
@@ -303,7 +742,7 @@ class GPNARX(tsm.TSM):
             plt.fill_between(date_index, lower*self._norm_std + self._norm_mean, upper*self._norm_std + self._norm_mean, alpha=0.2)          
             
         plt.plot(date_index,self.data*self._norm_std + self._norm_mean,'k',alpha=0.2)
-        plt.plot(date_index,self.expected_values(self.latent_variables.get_z_values())*self._norm_std + self._norm_mean,'b')
+        plt.plot(date_index,expectation*self._norm_std + self._norm_mean,'b')
 
         plt.subplot(2, 2, 4)
 
@@ -312,11 +751,11 @@ class GPNARX(tsm.TSM):
         if intervals == True:
             plt.fill_between(date_index, lower*self._norm_std + self._norm_mean, upper*self._norm_std + self._norm_mean, alpha=0.2)          
             
-        plt.plot(date_index,self.expected_values(self.latent_variables.get_z_values())*self._norm_std + self._norm_mean,'b')
+        plt.plot(date_index,expectation*self._norm_std + self._norm_mean,'b')
 
         plt.show()
 
-    def plot_predict(self, h=5, past_values=20, intervals=True,**kwargs):
+    def plot_predict(self, h=5, past_values=20, intervals=True, simulations=None, **kwargs):
         """ Plots forecast with the estimated model
         
         Parameters
@@ -329,6 +768,10 @@ class GPNARX(tsm.TSM):
         
         intervals : Boolean
             Would you like to show 95% prediction intervals for the forecast?
+
+        simulations : None or int (default : None)
+            If given, the intervals are taken from this many simulated paths (see
+            _sim_prediction), rather than from the variance of the function at each step
         
         Returns
         ----------
@@ -344,6 +787,9 @@ class GPNARX(tsm.TSM):
         else:
 
             predictions, variance, lower, upper = self._construct_predict(self.latent_variables.get_z_values(),h) 
+            if simulations is not None:
+                sim_vector = self._sim_prediction(self.latent_variables.get_z_values(),h,simulations)
+                lower, upper = np.percentile(sim_vector,2.5,axis=1), np.percentile(sim_vector,97.5,axis=1)
             full_predictions = np.append(self.data,predictions)
             full_lower = np.append(self.data,lower)
             full_upper = np.append(self.data,upper)
@@ -389,8 +835,9 @@ class GPNARX(tsm.TSM):
         predictions = []
 
         for t in range(0,h):
-            x = GPNARX(ar=self.ar,kernel=self.kernel,integ=self.integ,
-                data=self.data_original[:-h+t])
+            x = GPNARX(ar=self.ar,kernel=copy.copy(self.kernel),integ=self.integ,
+                data=self.data_original[:-h+t],approximation=self.approximation,inducing=self.inducing,
+                blocksize=self.blocksize,memmap=self.memmap)
             if fit_once is False:
                 x.fit(printer=False)
             if t == 0:
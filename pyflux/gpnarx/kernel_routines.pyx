@@ -1,334 +1,165 @@
 import numpy as np
 cimport numpy as np
 cimport cython
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def SE_K_matrix(np.ndarray[double,ndim=2] X, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],X.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,X.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-0.5*np.sum(np.power(X[i] - X[j],2))/np.power(parm[1],2))
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def SE_Kstar_matrix(np.ndarray[double,ndim=2] X, np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,Xstar.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-0.5*np.sum(np.power(X[i] - Xstar[j],2))/np.power(parm[1],2))
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def SE_Kstarstar_matrix(np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,Xstar.shape[0]):
-        for j in range(0,Xstar.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-0.5*np.sum(np.power(Xstar[i] - Xstar[j],2))/np.power(parm[1],2))
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def SE_K_arbitrary_X_matrix(np.ndarray[double,ndim=2] Xstar1, np.ndarray[double,ndim=2] Xstar2, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar1.shape[0],Xstar2.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,Xstar1.shape[0]):
-        for j in range(0,Xstar2.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-0.5*np.sum(np.power(Xstar1[i] - Xstar2[j],2))/np.power(parm[1],2))
-    
-    return K
-
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def OU_K_matrix(np.ndarray[double,ndim=2] X, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],X.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,X.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-np.sum(np.abs(X[i] - X[j]))/parm[1])
-
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def OU_Kstar_matrix(np.ndarray[double,ndim=2] X, np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,Xstar.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-np.sum(np.abs(X[i] - Xstar[j]))/parm[1])
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def OU_Kstarstar_matrix(np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,Xstar.shape[0]):
-        for j in range(0,Xstar.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-np.sum(np.abs(Xstar[i] - Xstar[j]))/parm[1])
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def OU_K_arbitrary_X_matrix(np.ndarray[double,ndim=2] Xstar1, np.ndarray[double,ndim=2] Xstar2, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar1.shape[0],Xstar2.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,Xstar1.shape[0]):
-        for j in range(0,Xstar2.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-np.sum(np.abs(Xstar1[i] - Xstar2[j]))/parm[1])
-    
-    return K
-
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def ARD_K_matrix(np.ndarray[double,ndim=2] X, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],X.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,X.shape[0]):
-            if i == j:
-                K[i,j] = parm[-1]
-            else:
-                K[i,j] = parm[-1]*np.exp(-0.5*np.sum(np.power(X[i] - X[j],2)/np.power(parm[1:-1],2)))
-    
-    return K
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def ARD_Kstar_matrix(np.ndarray[double,ndim=2] X, np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0, X.shape[0]):
-        for j in range(0, Xstar.shape[0]):
-            if i == j:
-                K[i,j] = parm[-1]
-            else:
-                K[i,j] = parm[-1]*np.exp(-0.5*np.sum(np.power(X[i] - Xstar[j],2)/np.power(parm[1:-1],2)))
-    
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def ARD_Kstarstar_matrix(np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0, Xstar.shape[0]):
-        for j in range(0, Xstar.shape[0]):
-            if i == j:
-                K[i,j] = parm[-1]
-            else:
-                K[i,j] = parm[-1]*np.exp(-0.5*np.sum(np.power(Xstar[i] - Xstar[j],2)/np.power(parm[1:-1],2)))
-    
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def ARD_K_arbitrary_X_matrix(np.ndarray[double,ndim=2] Xstar1, np.ndarray[double,ndim=2] Xstar2, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar1.shape[0],Xstar2.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0, Xstar1.shape[0]):
-        for j in range(0, Xstar2.shape[0]):
-            if i == j:
-                K[i,j] = parm[-1]
-            else:
-                K[i,j] = parm[-1]*np.exp(-0.5*np.sum(np.power(Xstar1[i] - Xstar2[j],2)/np.power(parm[1:-1],2)))
-    
-    return K
-
-
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def RQ_K_matrix(np.ndarray[double,ndim=2] X, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],X.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,X.shape[0]):
-            K[i,j] = parm[1]*(1.0 + 0.5*np.sum(np.power(X[i] - X[j],2))/((parm[2]**2)*parm[1]))**-parm[1]
-
-    return K
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def RQ_Kstar_matrix(np.ndarray[double,ndim=2] X, np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,Xstar.shape[0]):
-            K[i,j] = parm[3]*(1.0 + 0.5*np.sum(np.power(X[i] - Xstar[j],2))/((parm[2]**2)*parm[1]))**-parm[1]
-
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def RQ_Kstarstar_matrix(np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,Xstar.shape[0]):
-        for j in range(0,Xstar.shape[0]):
-            K[i,j] = parm[3]*(1.0 + 0.5*np.sum(np.power(Xstar[i] - Xstar[j],2))/((parm[2]**2)*parm[1]))**-parm[1]
-
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def RQ_K_arbitrary_X_matrix(np.ndarray[double,ndim=2] Xstar1, np.ndarray[double,ndim=2] Xstar2, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar1.shape[0],Xstar2.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,Xstar1.shape[0]):
-        for j in range(0,Xstar2.shape[0]):
-            K[i,j] = parm[3]*(1.0 + 0.5*np.sum(np.power(Xstar1[i] - Xstar2[j],2))/((parm[2]**2)*parm[1]))**-parm[1]
-
-    return K
-
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def Periodic_K_matrix(np.ndarray[double,ndim=2] X, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],X.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,X.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-np.sum(np.power(-2.0*np.sin(X[i] - X[j]),2))/parm[1])
-    return K
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def Periodic_Kstar_matrix(np.ndarray[double,ndim=2] X, np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((X.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,X.shape[0]):
-        for j in range(0,Xstar.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-np.sum(np.power(-2.0*np.sin(X[i] - Xstar[j]),2))/parm[1])
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def Periodic_Kstarstar_matrix(np.ndarray[double,ndim=2] Xstar, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar.shape[0],Xstar.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,Xstar.shape[0]):
-        for j in range(0,Xstar.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-np.sum(np.power(-2.0*np.sin(Xstar[i] - Xstar[j]),2))/parm[1])
-    return K
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def Periodic_K_arbitrary_X_matrix(np.ndarray[double,ndim=2] Xstar1, np.ndarray[double,ndim=2] Xstar2, double[:] parm):
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((Xstar1.shape[0],Xstar2.shape[0]))
-    cdef Py_ssize_t i, j
-
-    for i in range(0,Xstar1.shape[0]):
-        for j in range(0,Xstar2.shape[0]):
-            if i == j:
-                K[i,j] = parm[2]
-            else:
-                K[i,j] = parm[2]*np.exp(-np.sum(np.power(-2.0*np.sin(Xstar1[i] - Xstar2[j]),2))/parm[1])
-    return K
\ No newline at end of file
+from libc.math cimport exp, log, log1p
+from scipy.spatial.distance import cdist, pdist, squareform
+
+# Every kernel is an elementwise function of one pairwise statistic of the design matrix
+# (squared distance, absolute distance, per-lag squared distance or summed squared sine of the
+# differences). The statistics only depend on the data, so the kernel classes compute them once
+# per design matrix; each hyperparameter evaluation is then a single pass over the cached
+# statistic. For the Gram matrix only the upper triangle is evaluated and mirrored.
+
+cdef int SE = 0
+cdef int OU = 1
+cdef int RQ = 2
+cdef int PERIODIC = 3
+
+def _pair(X1, X2):
+    X1 = np.ascontiguousarray(X1, dtype=np.float64)
+    if X2 is None:
+        return X1, X1, True
+    return X1, np.ascontiguousarray(X2, dtype=np.float64), False
+
+def squared_distances(X1, X2=None):
+    """ Pairwise squared Euclidean distances between the rows of X1 and X2
+
+    Parameters
+    ----------
+    X1, X2 : np.ndarray
+        Data with one row per point; if X2 is None the distances within X1 are returned
+
+    Returns
+    ----------
+    - np.ndarray of squared distances, computed from the inner products X1X2' so that
+    the O(n^2 p) work is a single matrix product
+    """
+    X1, X2, symmetric = _pair(X1, X2)
+    D = np.dot(X1, X2.T)
+    D *= -2.0
+    D += np.sum(np.power(X1,2),axis=1)[:,np.newaxis]
+    D += np.sum(np.power(X2,2),axis=1)[np.newaxis,:]
+    np.maximum(D, 0.0, out=D)
+    if symmetric:
+        np.fill_diagonal(D, 0.0)
+    return D
+
+def absolute_distances(X1, X2=None):
+    """ Pairwise L1 distances between the rows of X1 and X2 - see squared_distances """
+    X1, X2, symmetric = _pair(X1, X2)
+    if symmetric:
+        return squareform(pdist(X1, 'cityblock'))
+    return cdist(X1, X2, 'cityblock')
+
+def lag_squared_distances(X1, X2=None):
+    """ Pairwise squared differences between the rows of X1 and X2 for each column
+
+    Returns
+    ----------
+    - np.ndarray of shape (p, n1, n2)
+    """
+    X1, X2, symmetric = _pair(X1, X2)
+    D = np.empty((X1.shape[1],X1.shape[0],X2.shape[0]))
+    for lag in range(X1.shape[1]):
+        np.subtract.outer(X1[:,lag], X2[:,lag], out=D[lag])
+    np.power(D, 2, out=D)
+    return D
+
+def periodic_distances(X1, X2=None):
+    """ Pairwise sums of sin(x1 - x2)^2 over the columns of X1 and X2
+
+    Notes
+    ----------
+    Uses sin(a - b) = sin(a)cos(b) - cos(a)sin(b), so the statistic is formed from three
+    matrix products of the sines and cosines of the data - see squared_distances
+    """
+    X1, X2, symmetric = _pair(X1, X2)
+    S1, C1 = np.sin(X1), np.cos(X1)
+    S2, C2 = (S1, C1) if symmetric else (np.sin(X2), np.cos(X2))
+    D = np.dot(np.power(S1,2), np.power(C2,2).T) + np.dot(np.power(C1,2), np.power(S2,2).T)
+    D -= 2.0*np.dot(S1*C1, (S2*C2).T)
+    np.maximum(D, 0.0, out=D)
+    if symmetric:
+        np.fill_diagonal(D, 0.0)
+    return D
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _transform(double[:,::1] D, double[:,::1] K, int kind, double scale, double shape,
+    double tau, bint symmetric) nogil:
+    """ Evaluates a kernel elementwise on a pairwise statistic - see the kernel functions below """
+    cdef Py_ssize_t i, j, start
+    cdef Py_ssize_t n1 = D.shape[0], n2 = D.shape[1]
+    cdef double k, x
+
+    for i in range(n1):
+        start = i if symmetric else 0
+        for j in range(start, n2):
+            if kind == SE:
+                k = tau*exp(-0.5*D[i,j]/scale)
+            elif kind == OU:
+                k = tau*exp(-D[i,j]/scale)
+            elif kind == RQ:
+                # (1 + x/a)^-a via log1p, which stays accurate as a grows towards the SE limit;
+                # as a shrinks towards the constant kernel x/a can overflow, so use logs instead
+                x = 0.5*D[i,j]/scale
+                if x/shape > 1e300:
+                    k = tau*exp(-shape*(log(x) - log(shape)))
+                else:
+                    k = tau*exp(-shape*log1p(x/shape))
+            else:
+                k = tau*exp(-4.0*D[i,j]/scale)
+            K[i,j] = k
+            if symmetric:
+                K[j,i] = k
+
+def _kernel(D, int kind, double scale, double shape, double tau, symmetric):
+    D = np.ascontiguousarray(D, dtype=np.float64)
+    K = np.empty((D.shape[0],D.shape[1]))
+    _transform(D, K, kind, scale, shape, tau, symmetric and D.shape[0] == D.shape[1])
+    return K
+
+def SE_kernel(D, double[:] parm, symmetric=False):
+    """ Squared exponential kernel tau*exp(-0.5*d/l^2)
+
+    Parameters
+    ----------
+    D : np.ndarray
+        Pairwise squared distances (see squared_distances)
+
+    parm : np.ndarray
+        Transformed latent variables: noise variance, l and tau
+
+    symmetric : boolean (default : False)
+        Whether D is symmetric, in which case only its upper triangle is evaluated
+
+    Returns
+    ----------
+    - The kernel matrix
+    """
+    return _kernel(D, SE, parm[1]*parm[1], 0.0, parm[2], symmetric)
+
+def OU_kernel(D, double[:] parm, symmetric=False):
+    """ Ornstein-Uhlenbeck kernel tau*exp(-d/l) of pairwise absolute distances - see SE_kernel """
+    return _kernel(D, OU, parm[1], 0.0, parm[2], symmetric)
+
+def RQ_kernel(D, double[:] parm, symmetric=False):
+    """ Rational quadratic kernel tau*(1 + 0.5*d/(a*l^2))^-a of pairwise squared distances;
+    parm holds the noise variance, a, l and tau - see SE_kernel """
+    if np.isinf(parm[1]):
+        return _kernel(D, SE, parm[2]*parm[2], 0.0, parm[3], symmetric)
+    elif parm[1] == 0.0:
+        return np.ones(np.shape(D))*parm[3]
+    return _kernel(D, RQ, parm[2]*parm[2], parm[1], parm[3], symmetric)
+
+def ARD_kernel(D, double[:] parm, symmetric=False):
+    """ ARD kernel tau*exp(-0.5*sum(d_p/l_p^2)) of per-lag squared distances (see
+    lag_squared_distances); parm holds the noise variance, one l per lag and tau - see SE_kernel """
+    weights = 1.0/np.power(np.asarray(parm[1:-1]),2)
+    return _kernel(np.tensordot(weights, D, axes=1), SE, 1.0, 0.0, parm[-1], symmetric)
+
+def Periodic_kernel(D, double[:] parm, symmetric=False):
+    """ Periodic kernel tau*exp(-4*d/l) of pairwise sums of sin(x1 - x2)^2 (see
+    periodic_distances) - see SE_kernel """
+    return _kernel(D, PERIODIC, parm[1], 0.0, parm[2], symmetric)
@@ -4,11 +4,8 @@ import numpy as np
 from .. import distributions as dst
 from .. import inference as ifr
 
-from .kernel_routines import SE_K_matrix, SE_Kstar_matrix, SE_Kstarstar_matrix, SE_K_arbitrary_X_matrix
-from .kernel_routines import OU_K_matrix, OU_Kstar_matrix, OU_Kstarstar_matrix, OU_K_arbitrary_X_matrix
-from .kernel_routines import RQ_K_matrix, RQ_Kstar_matrix, RQ_Kstarstar_matrix, RQ_K_arbitrary_X_matrix
-from .kernel_routines import ARD_K_matrix, ARD_Kstar_matrix, ARD_Kstarstar_matrix, ARD_K_arbitrary_X_matrix
-from .kernel_routines import Periodic_K_matrix, Periodic_Kstar_matrix, Periodic_Kstarstar_matrix, Periodic_K_arbitrary_X_matrix
+from .kernel_routines import squared_distances, absolute_distances, lag_squared_distances, periodic_distances
+from .kernel_routines import SE_kernel, OU_kernel, RQ_kernel, ARD_kernel, Periodic_kernel
 
 
 class SquaredExponential(object):
@@ -22,6 +19,8 @@ class SquaredExponential(object):
 
     def __init__(self, X=np.array([1])):
         self.X = X.transpose()
+        self._D = None
+        self._D_X = None
 
     @staticmethod
     def build_latent_variables():
@@ -37,17 +36,65 @@ class SquaredExponential(object):
         lvs_to_build.append(['tau', ifr.Uniform(transform='exp'), dst.q_Normal(0,3), -1.0])
         return lvs_to_build
 
+    def _distances(self):
+        """ Pairwise squared distances of the design matrix, computed once per X
+
+        Returns
+        ----------
+        - np.ndarray (see squared_distances)
+        """
+        if self._D_X is not self.X:
+            self._D = squared_distances(self.X)
+            self._D_X = self.X
+        return self._D
+
     def K(self, parm):
-        return SE_K_matrix(self.X, parm) + np.identity(self.X.shape[0])*(10**-10)
+        K = SE_kernel(self._distances(), parm, True)
+        K[np.diag_indices_from(K)] += 10**-10
+        return K
+
+    def dK(self, parm, W, K=None, Xstar1=None, Xstar2=None):
+        """ Returns the inner products of W with the derivatives of K(x1, x2) with respect to the
+        kernel parameters
+
+        Notes
+        ----------
+        The derivatives are elementwise functions of the pairwise statistic and the kernel matrix,
+        so each inner product is accumulated from these without forming the derivative matrix
+
+        Parameters
+        ----------
+        parm : np.ndarray
+            Parameters for the kernel
+
+        W : np.ndarray
+            Weights, with the shape of K(x1, x2)
+
+        K : np.ndarray
+            (optional) K(x1, x2) if already computed
+
+        Xstar1, Xstar2 : np.ndarray
+            (optional) Inputs; by default the design matrix with itself, and if only Xstar1 is
+            given, Xstar1 with itself
+
+        Returns
+        ----------
+        - np.ndarray of sum(W*dK/dtheta) for l and tau
+        """
+        D = self._distances() if Xstar1 is None else squared_distances(Xstar1, Xstar2)
+        if K is None:
+            K = SE_kernel(D, parm, Xstar2 is None)
+        WK = W*K
+        return np.array([np.vdot(WK, D)/np.power(parm[1],3), np.sum(WK)/parm[2]])
 
     def K_arbitrary_X(self, parm, Xstar1, Xstar2):
-        return SE_K_arbitrary_X_matrix(Xstar1, Xstar2, parm)
+        return SE_kernel(squared_distances(Xstar1, Xstar2), parm)
 
     def Kstar(self, parm, Xstar):
-        return SE_Kstar_matrix(self.X, Xstar, parm)
+        return SE_kernel(squared_distances(self.X, Xstar), parm)
 
     def Kstarstar(self, parm, Xstar):
-        return SE_Kstarstar_matrix(Xstar, parm)
+        return SE_kernel(squared_distances(Xstar), parm, True)
 
 
 class OrnsteinUhlenbeck(object):
@@ -62,6 +109,8 @@ class OrnsteinUhlenbeck(object):
     def __init__(self, X=np.array([1])):
 
         self.X = X.transpose()
+        self._D = None
+        self._D_X = None
 
     @staticmethod
     def build_latent_variables():
@@ -77,6 +126,18 @@ class OrnsteinUhlenbeck(object):
         lvs_to_build.append(['tau', ifr.Uniform(transform='exp'), dst.q_Normal(0,3), -1.0])
         return lvs_to_build
 
+    def _distances(self):
+        """ Pairwise absolute distances of the design matrix, computed once per X
+
+        Returns
+        ----------
+        - np.ndarray (see absolute_distances)
+        """
+        if self._D_X is not self.X:
+            self._D = absolute_distances(self.X)
+            self._D_X = self.X
+        return self._D
+
     def K(self, parm):
         """ Returns the Gram Matrix
 
@@ -89,7 +150,43 @@ class OrnsteinUhlenbeck(object):
         ----------
         - Gram Matrix (np.ndarray)
         """
-        return OU_K_matrix(self.X, parm) + np.identity(self.X.shape[0])*(10**-10)
+        K = OU_kernel(self._distances(), parm, True)
+        K[np.diag_indices_from(K)] += 10**-10
+        return K
+
+    def dK(self, parm, W, K=None, Xstar1=None, Xstar2=None):
+        """ Returns the inner products of W with the derivatives of K(x1, x2) with respect to the
+        kernel parameters
+
+        Notes
+        ----------
+        The derivatives are elementwise functions of the pairwise statistic and the kernel matrix,
+        so each inner product is accumulated from these without forming the derivative matrix
+
+        Parameters
+        ----------
+        parm : np.ndarray
+            Parameters for the kernel
+
+        W : np.ndarray
+            Weights, with the shape of K(x1, x2)
+
+        K : np.ndarray
+            (optional) K(x1, x2) if already computed
+
+        Xstar1, Xstar2 : np.ndarray
+            (optional) Inputs; by default the design matrix with itself, and if only Xstar1 is
+            given, Xstar1 with itself
+
+        Returns
+        ----------
+        - np.ndarray of sum(W*dK/dtheta) for l and tau
+        """
+        D = self._distances() if Xstar1 is None else absolute_distances(Xstar1, Xstar2)
+        if K is None:
+            K = OU_kernel(D, parm, Xstar2 is None)
+        WK = W*K
+        return np.array([np.vdot(WK, D)/np.power(parm[1],2), np.sum(WK)/parm[2]])
 
     def K_arbitrary_X(self, parm, Xstar1, Xstar2):
         """ Returns K(x1,x2)
@@ -109,7 +206,7 @@ class OrnsteinUhlenbeck(object):
         ----------
         - K(x1, x2)
         """
-        return OU_K_arbitrary_X_matrix(Xstar1, Xstar2, parm)
+        return OU_kernel(absolute_distances(Xstar1, Xstar2), parm)
 
     def Kstar(self, parm, Xstar):
         """ Returns K(x, x*)
@@ -126,7 +223,7 @@ class OrnsteinUhlenbeck(object):
         ----------
         - K(x, x*)
         """
-        return OU_Kstar_matrix(self.X, Xstar, parm)
+        return OU_kernel(absolute_distances(self.X, Xstar), parm)
 
     def Kstarstar(self, parm, Xstar):
         """ Returns K(x*, x*)
@@ -143,7 +240,7 @@ class OrnsteinUhlenbeck(object):
         ----------
         - K(x*, x*)
         """
-        return OU_Kstarstar_matrix(Xstar, parm)
+        return OU_kernel(absolute_distances(Xstar), parm, True)
 
 
 class ARD(object):
@@ -157,6 +254,8 @@ class ARD(object):
 
     def __init__(self, X=np.array([1])):
         self.X = X.transpose()
+        self._D = None
+        self._D_X = None
 
     def build_latent_variables(self):
         """ Builds latent variables for this kernel
@@ -172,6 +271,18 @@ class ARD(object):
         lvs_to_build.append(['tau', ifr.Uniform(transform='exp'), dst.q_Normal(0,3), -1.0])
         return lvs_to_build
 
+    def _distances(self):
+        """ Per-lag pairwise squared distances of the design matrix, computed once per X
+
+        Returns
+        ----------
+        - np.ndarray (see lag_squared_distances)
+        """
+        if self._D_X is not self.X:
+            self._D = lag_squared_distances(self.X)
+            self._D_X = self.X
+        return self._D
+
     def K(self, parm):
         """ Returns the Gram Matrix
 
@@ -184,7 +295,43 @@ class ARD(object):
         ----------
         - Gram Matrix (np.ndarray)
         """
-        return ARD_K_matrix(self.X, parm) + np.identity(self.X.shape[0])*(10**-10)
+        K = ARD_kernel(self._distances(), parm, True)
+        K[np.diag_indices_from(K)] += 10**-10
+        return K
+
+    def dK(self, parm, W, K=None, Xstar1=None, Xstar2=None):
+        """ Returns the inner products of W with the derivatives of K(x1, x2) with respect to the
+        kernel parameters
+
+        Notes
+        ----------
+        The derivatives are elementwise functions of the pairwise statistic and the kernel matrix,
+        so each inner product is accumulated from these without forming the derivative matrix
+
+        Parameters
+        ----------
+        parm : np.ndarray
+            Parameters for the kernel
+
+        W : np.ndarray
+            Weights, with the shape of K(x1, x2)
+
+        K : np.ndarray
+            (optional) K(x1, x2) if already computed
+
+        Xstar1, Xstar2 : np.ndarray
+            (optional) Inputs; by default the design matrix with itself, and if only Xstar1 is
+            given, Xstar1 with itself
+
+        Returns
+        ----------
+        - np.ndarray of sum(W*dK/dtheta) for each l and tau
+        """
+        D = self._distances() if Xstar1 is None else lag_squared_distances(Xstar1, Xstar2)
+        if K is None:
+            K = ARD_kernel(D, parm, Xstar2 is None)
+        WK = W*K
+        return np.array([np.vdot(WK, D[lag])/np.power(parm[lag+1],3) for lag in range(D.shape[0])] + [np.sum(WK)/parm[-1]])
 
     def K_arbitrary_X(self, parm, Xstar1, Xstar2):
         """ Returns K(x1,x2)
@@ -204,7 +351,7 @@ class ARD(object):
         ----------
         - K(x1, x2)
         """
-        return ARD_K_arbitrary_X_matrix(Xstar1, Xstar2, parm)
+        return ARD_kernel(lag_squared_distances(Xstar1, Xstar2), parm)
 
     def Kstar(self, parm, Xstar):
         """ Returns K(x, x*)
@@ -221,7 +368,7 @@ class ARD(object):
         ----------
         - K(x, x*)
         """
-        return ARD_Kstar_matrix(self.X, Xstar, parm)
+        return ARD_kernel(lag_squared_distances(self.X, Xstar), parm)
 
     def Kstarstar(self, parm, Xstar):
         """ Returns K(x*, x*)
@@ -238,7 +385,7 @@ class ARD(object):
         ----------
         - K(x*, x*)
         """
-        return ARD_Kstarstar_matrix(Xstar, parm)
+        return ARD_kernel(lag_squared_distances(Xstar), parm, True)
 
 
 class RationalQuadratic(object):
@@ -253,6 +400,8 @@ class RationalQuadratic(object):
     def __init__(self, X=np.array([1])):
 
         self.X = X.transpose()
+        self._D = None
+        self._D_X = None
 
     def build_latent_variables(self):
         lvs_to_build = []
@@ -262,6 +411,18 @@ class RationalQuadratic(object):
         lvs_to_build.append(['tau', ifr.Uniform(transform='exp'), dst.q_Normal(0,3), -1.0])
         return lvs_to_build
 
+    def _distances(self):
+        """ Pairwise squared distances of the design matrix, computed once per X
+
+        Returns
+        ----------
+        - np.ndarray (see squared_distances)
+        """
+        if self._D_X is not self.X:
+            self._D = squared_distances(self.X)
+            self._D_X = self.X
+        return self._D
+
     def K(self, parm):
         """ Returns the Gram Matrix
 
@@ -274,7 +435,45 @@ class RationalQuadratic(object):
         ----------
         - Gram Matrix (np.ndarray)
         """
-        return RQ_K_matrix(self.X, parm) + np.identity(self.X.shape[0])*(10**-10)
+        K = RQ_kernel(self._distances(), parm, True)
+        K[np.diag_indices_from(K)] += 10**-10
+        return K
+
+    def dK(self, parm, W, K=None, Xstar1=None, Xstar2=None):
+        """ Returns the inner products of W with the derivatives of K(x1, x2) with respect to the
+        kernel parameters
+
+        Notes
+        ----------
+        The derivatives are elementwise functions of the pairwise statistic and the kernel matrix,
+        so each inner product is accumulated from these without forming the derivative matrix
+
+        Parameters
+        ----------
+        parm : np.ndarray
+            Parameters for the kernel
+
+        W : np.ndarray
+            Weights, with the shape of K(x1, x2)
+
+        K : np.ndarray
+            (optional) K(x1, x2) if already computed
+
+        Xstar1, Xstar2 : np.ndarray
+            (optional) Inputs; by default the design matrix with itself, and if only Xstar1 is
+            given, Xstar1 with itself
+
+        Returns
+        ----------
+        - np.ndarray of sum(W*dK/dtheta) for a, l and tau
+        """
+        D = self._distances() if Xstar1 is None else squared_distances(Xstar1, Xstar2)
+        if K is None:
+            K = RQ_kernel(D, parm, Xstar2 is None)
+        WK = W*K
+        u = 0.5*D/(parm[1]*np.power(parm[2],2))
+        ratio = np.vdot(WK, u/(1.0 + u))
+        return np.array([ratio - np.vdot(WK, np.log1p(u)), 2.0*parm[1]*ratio/parm[2], np.sum(WK)/parm[3]])
 
     def K_arbitrary_X(self, parm, Xstar1, Xstar2):
         """ Returns K(x1,x2)
@@ -294,7 +493,7 @@ class RationalQuadratic(object):
         ----------
         - K(x1, x2)
         """
-        return RQ_K_arbitrary_X_matrix(Xstar1, Xstar2, parm)
+        return RQ_kernel(squared_distances(Xstar1, Xstar2), parm)
 
     def Kstar(self, parm, Xstar):
         """ Returns K(x, x*)
@@ -311,7 +510,7 @@ class RationalQuadratic(object):
         ----------
         - K(x, x*)
         """
-        return RQ_Kstar_matrix(self.X, Xstar, parm)
+        return RQ_kernel(squared_distances(self.X, Xstar), parm)
 
     def Kstarstar(self, parm, Xstar):
         """ Returns K(x*, x*)
@@ -328,7 +527,7 @@ class RationalQuadratic(object):
         ----------
         - K(x*, x*)
         """
-        return RQ_Kstarstar_matrix(Xstar, parm)
+        return RQ_kernel(squared_distances(Xstar), parm, True)
 
 
 class Periodic(object):
@@ -343,6 +542,8 @@ class Periodic(object):
     def __init__(self, X=np.array([1])):
 
         self.X = X.transpose()
+        self._D = None
+        self._D_X = None
 
     def build_latent_variables(self):
         """ Builds latent variables for this kernel
@@ -357,6 +558,18 @@ class Periodic(object):
         lvs_to_build.append(['tau', ifr.Uniform(transform='exp'), dst.q_Normal(0,3), -1.0])
         return lvs_to_build
 
+    def _distances(self):
+        """ Pairwise sums of squared sines of the differences of the design matrix, computed once per X
+
+        Returns
+        ----------
+        - np.ndarray (see periodic_distances)
+        """
+        if self._D_X is not self.X:
+            self._D = periodic_distances(self.X)
+            self._D_X = self.X
+        return self._D
+
     def K(self, parm):
         """ Returns the Gram Matrix
 
@@ -369,7 +582,43 @@ class Periodic(object):
         ----------
         - Gram Matrix (np.ndarray)
         """
-        return Periodic_K_matrix(self.X, parm) + np.identity(self.X.shape[0])*(10**-10)
+        K = Periodic_kernel(self._distances(), parm, True)
+        K[np.diag_indices_from(K)] += 10**-10
+        return K
+
+    def dK(self, parm, W, K=None, Xstar1=None, Xstar2=None):
+        """ Returns the inner products of W with the derivatives of K(x1, x2) with respect to the
+        kernel parameters
+
+        Notes
+        ----------
+        The derivatives are elementwise functions of the pairwise statistic and the kernel matrix,
+        so each inner product is accumulated from these without forming the derivative matrix
+
+        Parameters
+        ----------
+        parm : np.ndarray
+            Parameters for the kernel
+
+        W : np.ndarray
+            Weights, with the shape of K(x1, x2)
+
+        K : np.ndarray
+            (optional) K(x1, x2) if already computed
+
+        Xstar1, Xstar2 : np.ndarray
+            (optional) Inputs; by default the design matrix with itself, and if only Xstar1 is
+            given, Xstar1 with itself
+
+        Returns
+        ----------
+        - np.ndarray of sum(W*dK/dtheta) for l and tau
+        """
+        D = self._distances() if Xstar1 is None else periodic_distances(Xstar1, Xstar2)
+        if K is None:
+            K = Periodic_kernel(D, parm, Xstar2 is None)
+        WK = W*K
+        return np.array([4.0*np.vdot(WK, D)/np.power(parm[1],2), np.sum(WK)/parm[2]])
 
     def K_arbitrary_X(self, parm, Xstar1, Xstar2):
         """ Returns K(x1,x2)
@@ -389,7 +638,7 @@ class Periodic(object):
         ----------
         - K(x1, x2)
         """
-        return Periodic_K_arbitrary_X_matrix(Xstar1, Xstar2, parm)
+        return Periodic_kernel(periodic_distances(Xstar1, Xstar2), parm)
 
     def Kstar(self, parm, Xstar):
         """ Returns K(x, x*)
@@ -406,7 +655,7 @@ class Periodic(object):
         ----------
         - K(x, x*)
         """
-        return Periodic_Kstar_matrix(self.X, Xstar, parm)
+        return Periodic_kernel(periodic_distances(self.X, Xstar), parm)
 
     def Kstarstar(self, parm, Xstar):
         """ Returns K(x*, x*)
@@ -423,4 +672,4 @@ class Periodic(object):
         ----------
         - K(x*, x*)
         """
-        return Periodic_Kstarstar_matrix(Xstar, parm)
\ No newline at end of file
+        return Periodic_kernel(periodic_distances(Xstar), parm, True)
\ No newline at end of file
@@ -376,4 +376,133 @@ def test_per_predict_is_nans():
 	model = pf.GPNARX(data=data, ar=2, kernel=pf.Periodic())
 	x = model.fit()
 	x.summary()
-	assert(len(model.predict_is(h=5).values[np.isnan(model.predict_is(h=5).values)]) == 0)
\ No newline at end of file
+	assert(len(model.predict_is(h=5).values[np.isnan(model.predict_is(h=5).values)]) == 0)
+
+def test_cached_factorisation():
+	"""
+	Tests that the design matrix and the Cholesky factor are reused for the same
+	hyperparameters, and that forecasts agree with a fresh factorisation
+	"""
+	model = pf.GPNARX(data=data, ar=2, kernel=pf.SquaredExponential())
+	x = model.fit()
+	assert(model.X() is model.X())
+	beta = model.latent_variables.get_z_values()
+	parm = np.array([model.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
+	assert(model._L(parm) is model._L(parm))
+	predictions = model.predict(h=5)
+	model._cached_parm = None
+	assert(np.allclose(predictions.values, model.predict(h=5).values))
+
+def test_predict_is_keeps_kernel():
+	"""
+	Tests that in-sample prediction does not change the design matrix of the model's kernel
+	"""
+	model = pf.GPNARX(data=data, ar=2, kernel=pf.SquaredExponential())
+	x = model.fit()
+	X = model.kernel.X
+	model.predict_is(h=3)
+	assert(model.kernel.X is X)
+
+def test_sparse_full_inducing():
+	"""
+	Tests that the FITC and VFE approximations with every lag vector as an inducing input
+	agree with the exact likelihood and expected values
+	"""
+	model = pf.GPNARX(data=data, ar=2, kernel=pf.SquaredExponential())
+	beta = np.array([np.log(0.3), np.log(1.2), np.log(1.5)])
+	for approximation in ['fitc', 'vfe']:
+		sparse = pf.GPNARX(data=data, ar=2, kernel=pf.SquaredExponential(), approximation=approximation, inducing=data.shape[0])
+		assert(abs(sparse.full_neg_loglik(beta) - model.full_neg_loglik(beta)) < 1e-4)
+		assert(np.allclose(sparse.expected_values(beta), model.expected_values(beta), atol=1e-5))
+
+def test_sparse_predict():
+	"""
+	Tests that sparse GPNARX models with few inducing inputs estimate non-nan latent variables
+	and forecasts
+	"""
+	for approximation in ['fitc', 'vfe']:
+		model = pf.GPNARX(data=data, ar=2, kernel=pf.SquaredExponential(), approximation=approximation, inducing=10)
+		x = model.fit()
+		assert(model.inducing_inputs.shape[0] <= 10)
+		lvs = np.array([i.value for i in model.latent_variables.z_list])
+		assert(len(lvs[np.isnan(lvs)]) == 0)
+		assert(len(model.predict(h=5).values[np.isnan(model.predict(h=5).values)]) == 0)
+
+def test_likelihood_gradient():
+	"""
+	Tests that the analytic gradient of the negative log likelihood agrees with finite
+	differences for every kernel
+	"""
+	for kernel in [pf.SquaredExponential(), pf.OrnsteinUhlenbeck(), pf.ARD(), pf.RationalQuadratic(), pf.Periodic()]:
+		model = pf.GPNARX(data=data, ar=2, kernel=kernel)
+		beta = np.random.normal(0,0.3,model.z_no)
+		value, gradient = model.neg_loglik_and_grad(beta)
+		assert(abs(value - model.full_neg_loglik(beta)) < 1e-10)
+		for k in range(model.z_no):
+			step = np.zeros(model.z_no)
+			step[k] = 1e-6
+			fd = (model.full_neg_loglik(beta+step) - model.full_neg_loglik(beta-step))/(2e-6)
+			assert(abs(gradient[k] - fd) < 1e-4*max(1.0,abs(fd)))
+
+def test_sim_prediction():
+	"""
+	Tests that simulated forecast paths are centred on the forecasts at the first step and
+	spread at least as much as the one step predictive variance
+	"""
+	model = pf.GPNARX(data=data, ar=2, kernel=pf.SquaredExponential())
+	x = model.fit()
+	beta = model.latent_variables.get_z_values()
+	predictions, variances, _, _ = model._construct_predict(beta, 5)
+	sims = model._sim_prediction(beta, 5, 4000)
+	noise = model.latent_variables.z_list[0].prior.transform(beta[0])
+	assert(sims.shape == (5, 4000))
+	assert(abs(np.mean(sims[0]) - predictions[0]) < 4*np.sqrt((variances[0] + noise)/4000))
+	assert(abs(np.var(sims[0])/(variances[0] + noise) - 1) < 0.1)
+	assert(np.all(np.var(sims,axis=1) > 0.9*variances))
+
+def test_blocked_assembly():
+	"""
+	Tests that the blocked Gram matrix assembly, in memory and memory-mapped, factorises in
+	place and agrees with the exact likelihood, expected values, variances and forecasts
+	"""
+	model = pf.GPNARX(data=data, ar=2, kernel=pf.ARD())
+	beta = np.array([np.log(0.3), np.log(1.2), np.log(0.8), np.log(1.5)])
+	for memmap in [False, True]:
+		blocked = pf.GPNARX(data=data, ar=2, kernel=pf.ARD(), blocksize=7, memmap=memmap)
+		assert(abs(blocked.full_neg_loglik(beta) - model.full_neg_loglik(beta)) < 1e-8)
+		assert(np.shares_memory(blocked._L(np.exp(beta)), blocked._buffer))
+		assert(np.allclose(blocked.expected_values(beta), model.expected_values(beta)))
+		assert(np.allclose(blocked.variance_values(beta), np.diag(model.variance_values(beta))))
+		assert(np.allclose(blocked._construct_predict(beta, 5)[0], model._construct_predict(beta, 5)[0]))
+
+def test_exact_alpha():
+	"""
+	Tests that alpha for the exact GP is K^-1 y, with K including the noise variance, and
+	that the negative log likelihood is that of a N(0, K) vector
+	"""
+	model = pf.GPNARX(data=data, ar=2, kernel=pf.SquaredExponential())
+	beta = np.array([np.log(0.3), np.log(1.2), np.log(1.5)])
+	parm = np.exp(beta)
+	K = model.kernel.K(parm) + np.identity(model.data.shape[0])*parm[0]
+	_, L, alpha = model._covariance_terms(parm)
+	assert(np.allclose(alpha, np.linalg.solve(K, model.data)))
+	_, logdet = np.linalg.slogdet(K)
+	neg_loglik = 0.5*(np.dot(model.data, np.linalg.solve(K, model.data)) + logdet + model.data.shape[0]*np.log(2.0*np.pi))
+	assert(abs(model.full_neg_loglik(beta) - neg_loglik) < 1e-8)
+
+def test_sparse_likelihood_gradient():
+	"""
+	Tests that the analytic gradient of the FITC and VFE objectives agrees with finite
+	differences for every kernel
+	"""
+	for approximation in ['fitc', 'vfe']:
+		for kernel in [pf.SquaredExponential(), pf.OrnsteinUhlenbeck(), pf.ARD(), pf.RationalQuadratic(), pf.Periodic()]:
+			model = pf.GPNARX(data=data, ar=2, kernel=kernel, approximation=approximation, inducing=8)
+			beta = np.random.normal(0,0.3,model.z_no)
+			value, gradient = model.neg_loglik_and_grad(beta)
+			assert(abs(value - model.full_neg_loglik(beta)) < 1e-10)
+			for k in range(model.z_no):
+				step = np.zeros(model.z_no)
+				step[k] = 1e-6
+				fd = (model.full_neg_loglik(beta+step) - model.full_neg_loglik(beta-step))/(2e-6)
+				assert(abs(gradient[k] - fd) < 1e-4*max(1.0,abs(fd)))
@@ -0,0 +1,56 @@
+import numpy as np
+import pyflux as pf
+
+X = np.random.normal(0,1,(30,2))
+Xstar = np.random.normal(0,1,(4,2))
+
+def direct(X1, X2, function):
+	return np.array([[function(x1 - x2) for x2 in X2] for x1 in X1])
+
+def test_kernel_values():
+	"""
+	Tests that the kernels agree with their formulas evaluated pair by pair
+	"""
+	parm = np.array([0.3,1.3,2.0])
+	ard_parm = np.array([0.3,1.1,0.7,2.0])
+	rq_parm = np.array([0.3,1.5,1.3,2.0])
+	kernels = [(pf.SquaredExponential(), parm, lambda d: 2.0*np.exp(-0.5*np.sum(d**2)/1.3**2)),
+		(pf.OrnsteinUhlenbeck(), parm, lambda d: 2.0*np.exp(-np.sum(np.abs(d))/1.3)),
+		(pf.ARD(), ard_parm, lambda d: 2.0*np.exp(-0.5*np.sum(d**2/ard_parm[1:-1]**2))),
+		(pf.RationalQuadratic(), rq_parm, lambda d: 2.0*(1.0 + 0.5*np.sum(d**2)/(1.5*1.3**2))**-1.5),
+		(pf.Periodic(), parm, lambda d: 2.0*np.exp(-np.sum((2.0*np.sin(d))**2)/1.3))]
+	for kernel, p, function in kernels:
+		kernel.X = X
+		assert(np.allclose(kernel.K(p), direct(X, X, function)))
+		assert(np.allclose(kernel.Kstar(p, Xstar), direct(X, Xstar, function)))
+		assert(np.allclose(kernel.Kstarstar(p, Xstar), direct(Xstar, Xstar, function)))
+		assert(np.allclose(kernel.K_arbitrary_X(p, Xstar, X), direct(Xstar, X, function)))
+
+def test_distances_cached():
+	"""
+	Tests that the pairwise distances are computed once per design matrix
+	"""
+	kernel = pf.SquaredExponential()
+	kernel.X = X
+	D = kernel._distances()
+	kernel.K(np.array([0.3,1.3,2.0]))
+	assert(kernel._distances() is D)
+	kernel.X = Xstar
+	assert(kernel._distances().shape == (4,4))
+
+def test_kernel_corrections():
+	"""
+	Tests the behaviour that differs from the original kernel routines: the rational quadratic
+	amplitude is tau rather than a, the ARD amplitude is the last latent variable, and
+	cross-covariances are not set to tau on their diagonal
+	"""
+	rq = pf.RationalQuadratic()
+	rq.X = X
+	assert(np.allclose(np.diag(rq.K(np.array([0.3,1.5,1.3,2.0]))), 2.0))
+	ard = pf.ARD()
+	ard.X = X
+	assert(np.allclose(np.diag(ard.K(np.array([0.3,1.1,0.7,2.5]))), 2.5))
+	se = pf.SquaredExponential()
+	se.X = X
+	Kstar = se.Kstar(np.array([0.3,1.3,2.0]), Xstar)
+	assert(np.all(np.diag(Kstar) < 2.0))
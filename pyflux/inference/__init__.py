@@ -1,4 +1,4 @@
 from .priors import Normal, TruncatedNormal, InverseGamma, Uniform, InverseWishart
-from .metropolis_hastings import MetropolisHastings
+from .metropolis_hastings import MetropolisHastings, AdaptiveMetropolis
 from .norm_post_sim import norm_post_sim
-from .bbvi import BBVI, CBBVI
+from .bbvi import BBVI, CBBVI, SBBVI
@@ -4,6 +4,7 @@ if sys.version_info < (3,):
 
 import numpy as np
 import scipy.stats as ss
+import scipy.linalg as la
 
 from .stoch_optim import RMSProp, ADAM
 
@@ -25,10 +26,13 @@ class BBVI(object):
         Step size for RMSProp
     iterations: int
         How many iterations to run
+    batch_posterior : function
+        (optional) posterior function taking one set of latent variables per row
     """
 
-    def __init__(self,neg_posterior,q,sims,optimizer='RMSProp',iterations=1000):
+    def __init__(self,neg_posterior,q,sims,optimizer='RMSProp',iterations=1000,batch_posterior=None):
         self.neg_posterior = neg_posterior
+        self.batch_posterior = batch_posterior
         self.q = q
         self.sims = sims
         self.iterations = iterations
@@ -153,6 +157,8 @@ class BBVI(object):
         """
         The unnormalized log posterior components (the quantity we want to approximate)
         """
+        if self.batch_posterior is not None:
+            return -self.batch_posterior(z)
         return log_p_posterior(z, self.neg_posterior)
 
     def normal_log_q(self,z):
@@ -329,4 +335,233 @@ class CBBVI(BBVI):
 
         vectorized = gradient - ((alpha0/np.var(grad_log_q,axis=1))*grad_log_q.T).T
 
-        return np.mean(vectorized,axis=1)
\ No newline at end of file
+        return np.mean(vectorized,axis=1)
+
+class SBBVI(object):
+    """
+    Structured Black Box Variational Inference for state space models
+
+    The latent variables have a mean-field normal family. The states have a Gaussian Markov
+    chain whose precision is block tridiagonal in time; it is parameterised by its lower
+    Cholesky factor L, which is block bidiagonal, so drawing states (solving L'x = e) and the
+    entropy (-sum log diag(L)) cost O(n m^2). Gradients are reparameterisation gradients:
+    analytic for the states, and central differences of the posterior for the (few) latent
+    variables.
+
+    Parameters
+    ----------
+    neg_posterior : function
+        posterior function, taking the latent variables followed by the states, state by state
+    state_gradient : function
+        gradient of the log posterior with respect to the states, as an (m x n) array
+    z_start : np.array
+        Starting means for the latent variables
+    states_start : np.array
+        Starting means for the states, as an (m x n) array
+    precision : np.array
+        Starting precision of the states (ordered by time), as the lower band of the matrix
+        in the format of scipy.linalg.cholesky_banded
+    sims : int
+        Number of Monte Carlo sims for the gradient
+    optimizer : str
+        Stochastic optimizer: either RMSProp or ADAM
+    iterations: int
+        How many iterations to run
+    learning_rate : float
+        Step size for the optimizer
+    refresh : function
+        (optional) takes latent variables and returns state means and precision (as for
+        states_start and precision) of a Gaussian approximation to the states given them
+    refresh_every : int
+        How often to reset the states' family to refresh at the current latent variable
+        means; the latent variables move faster this way than if they wait for the states'
+        family to follow them by stochastic gradient steps
+    """
+
+    def __init__(self,neg_posterior,state_gradient,z_start,states_start,precision,sims=10,
+        optimizer='RMSProp',iterations=1000,learning_rate=0.01,refresh=None,refresh_every=10):
+        self.neg_posterior = neg_posterior
+        self.state_gradient = state_gradient
+        self.sims = sims
+        self.optimizer = optimizer
+        self.iterations = iterations
+        self.learning_rate = learning_rate
+        self.refresh = refresh
+        self.refresh_every = refresh_every
+        self.printer = True
+
+        self.z_no = z_start.shape[0]
+        self.m, self.n = states_start.shape
+        self.N = self.m*self.n
+        self.p = 2*self.m - 1
+
+        # Entries of the band of L that lie in the diagonal or sub-diagonal blocks
+        index = np.arange(self.N)
+        self.mask = np.array([((index + d) < self.N) & ((index + d)//self.m - index//self.m <= 1) 
+            for d in range(self.p + 1)])
+
+        self.parameters = np.concatenate([z_start, -3.0*np.ones(self.z_no), self.states_parameters(states_start, precision)])
+
+    def states_parameters(self,states_mean,precision):
+        """
+        Parameters of the states' family for given means (m x n) and precision (lower band)
+        """
+        # The posterior can be flat along states that do not enter the measurement equation,
+        # so a small ridge keeps the factor well defined
+        precision = precision.copy()
+        precision[0] = precision[0] + 10**-8*np.max(precision[0])
+        band = la.cholesky_banded(precision,lower=True)
+        band[0] = np.log(band[0])
+        return np.append(states_mean.T.ravel(), band[self.mask])
+
+    def unpack(self,parameters):
+        """
+        Splits the parameter vector into the latent variable means and log scales, the
+        state means (ordered by time) and the band of L
+        """
+        k, N = self.z_no, self.N
+        band = np.zeros((self.p + 1, N))
+        band[self.mask] = parameters[2*k + N:]
+        band[0] = np.exp(band[0])
+        return parameters[:k], parameters[k:2*k], parameters[2*k:2*k + N], band
+
+    def to_states(self,x):
+        """
+        Reorders a time-ordered state vector into an (m x n) array
+        """
+        return x.reshape(self.n, self.m).T
+
+    def draw(self,parameters):
+        """
+        Draws latent variables and states by reparameterisation
+        """
+        z_mean, z_log_scale, states_mean, band = self.unpack(parameters)
+        e_z = np.random.normal(0, 1, (self.z_no, self.sims))
+        e_states = np.random.normal(0, 1, (self.N, self.sims))
+
+        # Upper band of L' for solve_banded
+        upper = np.zeros((self.p + 1, self.N))
+        for d in range(self.p + 1):
+            upper[self.p - d, d:] = band[d, :self.N - d]
+        x = la.solve_banded((0, self.p), upper, e_states)
+
+        z = z_mean[:,None] + np.exp(z_log_scale)[:,None]*e_z
+        return z, e_z, x, states_mean[:,None] + x
+
+    def log_p_and_gradients(self,z,states):
+        """
+        Log posterior and its gradients with respect to the latent variables and states
+        """
+        log_p = np.zeros(self.sims)
+        z_gradient = np.zeros((self.z_no, self.sims))
+        states_gradient = np.zeros((self.N, self.sims))
+
+        for i in range(self.sims):
+            alpha = self.to_states(states[:,i])
+            log_p[i] = -self.neg_posterior(np.append(z[:,i], alpha.ravel()))
+            states_gradient[:,i] = self.state_gradient(np.append(z[:,i], alpha.ravel())).T.ravel()
+            for j in range(self.z_no):
+                step = np.zeros(self.z_no)
+                step[j] = 10**-5
+                z_gradient[j,i] = (self.neg_posterior(np.append(z[:,i] - step, alpha.ravel())) 
+                    - self.neg_posterior(np.append(z[:,i] + step, alpha.ravel())))/(2*10**-5)
+
+        return log_p, z_gradient, states_gradient
+
+    def entropy(self,parameters):
+        """
+        Entropy of the approximating distribution (up to a constant)
+        """
+        z_mean, z_log_scale, states_mean, band = self.unpack(parameters)
+        return np.sum(z_log_scale) - np.sum(np.log(band[0]))
+
+    def gradient(self,parameters):
+        """
+        Reparameterisation gradient of the ELBO, and the ELBO estimate
+        """
+        z_mean, z_log_scale, states_mean, band = self.unpack(parameters)
+        z, e_z, x, states = self.draw(parameters)
+        log_p, z_gradient, states_gradient = self.log_p_and_gradients(z, states)
+
+        # States are mean + L'^-1 e, so d/dL[j+d,j] of g'x is -u[j] x[j+d] with u = L^-1 g
+        u = la.solve_banded((self.p, 0), band, states_gradient)
+        band_gradient = np.zeros((self.p + 1, self.N))
+        for d in range(self.p + 1):
+            band_gradient[d, :self.N - d] = -np.mean(u[:self.N - d]*x[d:], axis=1)
+        band_gradient[0] = band_gradient[0]*band[0] - 1.0
+
+        gradient = np.concatenate([np.mean(z_gradient, axis=1),
+            np.mean(z_gradient*e_z, axis=1)*np.exp(z_log_scale) + 1.0,
+            np.mean(states_gradient, axis=1), band_gradient[self.mask]])
+
+        return gradient, np.mean(log_p) + self.entropy(parameters)
+
+    def print_progress(self, i, elbo):
+        """
+        Prints the current ELBO at every decile of total iterations
+        """
+        for split in range(1,11):
+            if i == (round(self.iterations/10*split)-1):
+                print(str(split) + "0% done : ELBO is " + str(elbo))
+
+    def states_variance(self,parameters):
+        """
+        Marginal variances of the states, from the band of the inverse of LL' (computed
+        backwards in time as in Takahashi's recursions)
+        """
+        z_mean, z_log_scale, states_mean, band = self.unpack(parameters)
+        S = np.zeros((self.p + 1, self.N))
+
+        for j in reversed(range(self.N)):
+            w = min(self.p, self.N - 1 - j)
+            a = np.arange(1, w + 1)
+            window = S[np.abs(a[:,None] - a[None,:]), j + np.minimum(a[:,None], a[None,:])]
+            l = band[1:w + 1, j]
+            S[1:w + 1, j] = -np.dot(window, l)/band[0, j]
+            S[0, j] = (1.0/band[0, j] - np.dot(S[1:w + 1, j], l))/band[0, j]
+
+        return self.to_states(S[0])
+
+    def run(self):
+        """
+        The core SBBVI routine - draws reparameterisation gradients and uses a stochastic optimizer.
+
+        Returns
+        ----------
+        Latent variable means and log scales, and the means and variances of the states
+        """
+        gradient, elbo = self.gradient(self.parameters)
+        final_parameters = self.parameters.copy()
+        final_samples = 1
+
+        # Create optimizer
+        if self.optimizer == 'ADAM':
+            self.optim = ADAM(self.parameters.copy(),np.power(gradient,2),self.learning_rate,0.9,0.999)
+        elif self.optimizer == 'RMSProp':
+            self.optim = RMSProp(self.parameters.copy(),np.power(gradient,2),self.learning_rate,0.99)
+
+        for i in range(self.iterations):
+            if self.refresh is not None and i > 0 and i % self.refresh_every == 0:
+                self.optim.parameters[2*self.z_no:] = self.states_parameters(*self.refresh(self.optim.parameters[:self.z_no]))
+
+            gradient, elbo = self.gradient(self.optim.parameters)
+            gradient[np.isnan(gradient)] = 0
+            self.optim.update(gradient)
+
+            if self.printer is True:
+                self.print_progress(i,elbo)
+
+            # Construct final parameters using final 10% of samples
+            if i > self.iterations-round(self.iterations/10):
+                final_samples += 1
+                final_parameters = final_parameters+self.optim.parameters
+
+        final_parameters = final_parameters/float(final_samples)
+        self.parameters = final_parameters
+        z_mean, z_log_scale, states_mean, band = self.unpack(final_parameters)
+
+        if self.printer is True:
+            print("")
+            print("Final model ELBO is " + str(self.gradient(final_parameters)[1]))
+
+        return z_mean, z_log_scale, self.to_states(states_mean), self.states_variance(final_parameters)
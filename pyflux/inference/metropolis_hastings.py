@@ -3,8 +3,6 @@ import sys
 if sys.version_info < (3,):
     range = xrange
 
-from scipy.stats import multivariate_normal
-
 from .metropolis_sampler import metropolis_sampler
 
 class MetropolisHastings(object):
@@ -83,6 +81,11 @@ class MetropolisHastings(object):
     def sample(self):
         """ Sample from M-H algorithm
 
+        Notes
+        ----------
+        Each tuning chain carries on from where the last one stopped, so the final chain starts
+        from the tuned state rather than from the initial values.
+
         Returns
         ----------
         chain : np.array
@@ -103,6 +106,10 @@ class MetropolisHastings(object):
 
         acceptance = 1
         finish = 0
+        last = None
+
+        # Proposals are standard normal draws mapped through the Cholesky factor in one call
+        chol = np.linalg.cholesky(self.cov_matrix)
 
         while (acceptance < 0.234 or acceptance > 0.4) or finish == 0:
 
@@ -115,29 +122,157 @@ class MetropolisHastings(object):
             else:
                 sims_to_do = int(self.nsims/2) # For acceptance rate tuning
 
+            if last is not None:
+                self.phi[0] = last
+
             # Holds data on acceptance rates and uniform random numbers
             a_rate = np.zeros([sims_to_do,1])
             crit = np.random.rand(sims_to_do,1)
-            post = multivariate_normal(np.zeros(self.param_no),self.cov_matrix)
-            rnums = post.rvs()*self.scale
-            for k in range(1,sims_to_do): 
-                rnums = np.vstack((rnums,post.rvs()*self.scale))
+            rnums = np.dot(np.random.normal(0,1,(sims_to_do,self.param_no)),chol.T)*self.scale
 
-            self.phi, a_rate = metropolis_sampler(sims_to_do, self.phi, self.posterior, 
+            self.phi, a_rate = metropolis_sampler(sims_to_do, self.phi, self.posterior,
                 a_rate, rnums, crit)
+            last = self.phi[sims_to_do-1].copy()
 
             acceptance = a_rate.sum()/a_rate.shape[0]
             self.scale = self.tune_scale(acceptance,self.scale)
 
             print("Acceptance rate of Metropolis-Hastings is " + str(acceptance))
 
-        chain = np.array([self.phi[i][0] for i in range(0,self.phi.shape[0])])
-        for m in range(1,self.param_no):
-            chain = np.vstack((chain,[self.phi[i][m] for i in range(0,self.phi.shape[0])]))
+        chain = self.phi.T.copy()
+        mean_est = np.mean(self.phi, axis=0)
+        median_est = np.median(self.phi, axis=0)
+        upper_95_est, lower_95_est = np.percentile(self.phi, [95, 5], axis=0)
+
+        return chain, mean_est, median_est, upper_95_est, lower_95_est
+
+
+class AdaptiveMetropolis(MetropolisHastings):
+    """ ADAPTIVE METROPOLIS MCMC
+
+    Notes
+    ----------
+    Random-walk Metropolis with a proposal covariance learnt from the chain (Haario, Saksman
+    and Tamminen, 2001). During the burn-in, the running mean and covariance of the states are
+    updated with Welford's algorithm. Once there are more states than twice the number of latent
+    variables, the proposal becomes N(0, scale^2*(C + epsilon*I)), with epsilon 1e-10 times the
+    largest variance. The log of the scale
+    follows a Robbins-Monro recursion towards the target acceptance rate (Andrieu and Thoms,
+    2008). Adaptation then stops, so the chain that is kept uses a fixed proposal and is
+    sampled as in MetropolisHastings.
+
+    Parameters
+    ----------
+    posterior : function
+        A posterior function
+
+    scale : float
+        The starting scale for the random walk
+
+    nsims : int
+        The number of simulations to keep
+
+    initials : np.array
+        Where to start the MCMC chain
+
+    cov_matrix : np.array
+        (optional) A starting covariance matrix for the random walk
+
+    model_object : TSM object
+        A model object (for use in SPDK sampling)
+
+    adapt : int (default : nsims/2)
+        The number of adaptive burn-in iterations
+
+    target : float (default : 0.234)
+        Acceptance rate the scale is adapted towards
+    """
+
+    def __init__(self,posterior,scale,nsims,initials,cov_matrix=None,model_object=None,adapt=None,
+        target=0.234):
+        super(AdaptiveMetropolis,self).__init__(posterior,scale,nsims,initials,cov_matrix,model_object)
+        self.adapt = int(nsims/2) if adapt is None else adapt
+        self.target = target
+
+    def sample(self):
+        """ Sample from the adaptive Metropolis algorithm
+
+        Returns
+        ----------
+        chain : np.array
+            Chains for each parameter
+
+        mean_est : np.array
+            Mean values for each parameter
+
+        median_est : np.array
+            Median values for each parameter
+
+        upper_95_est : np.array
+            Upper 95% credibility interval for each parameter
+
+        lower_95_est : np.array
+            Lower 95% credibility interval for each parameter
+        """
+
+        x = self.initials.copy()
+        old_lik = -self.posterior(x)
+        chol = np.linalg.cholesky(self.cov_matrix)
+        log_scale = np.log(self.scale)
+
+        # Welford's running mean and sum of squared deviations of the states
+        count = 1
+        mean = x.copy()
+        M2 = np.zeros((self.param_no,self.param_no))
+
+        rnums = np.random.normal(0,1,(self.adapt,self.param_no))
+        log_crit = np.log(np.random.rand(self.adapt))
+        accepted = 0
+
+        for i in range(self.adapt):
+            phi_prop = x + np.exp(log_scale)*np.dot(chol,rnums[i])
+            post_prop = -self.posterior(phi_prop)
+            log_ratio = post_prop - old_lik
+
+            if log_crit[i] < log_ratio:
+                x = phi_prop
+                old_lik = post_prop
+                accepted += 1
+
+            acceptance = np.exp(min(log_ratio,0.0)) if np.isfinite(log_ratio) else 0.0
+            log_scale += (acceptance - self.target)/np.power(i+1.0,0.6)
+
+            count += 1
+            delta = x - mean
+            mean += delta/count
+            M2 += np.outer(delta,x - mean)
+
+            if count > 2*self.param_no:
+                cov = M2/(count - 1)
+                try:
+                    chol = np.linalg.cholesky(cov + 1e-10*np.identity(self.param_no)*max(np.max(np.diag(cov)),1e-10))
+                except np.linalg.LinAlgError:
+                    pass
+
+        if self.adapt > 0:
+            print("Acceptance rate during adaptation is " + str(accepted/float(self.adapt)))
+            print("")
+            print("Adaptation complete! Now sampling.")
+
+        self.scale = np.exp(log_scale)
+        self.cov_matrix = np.dot(chol,chol.T)
+
+        self.phi[0] = x
+        a_rate = np.zeros([self.nsims,1])
+        crit = np.random.rand(self.nsims,1)
+        rnums = np.dot(np.random.normal(0,1,(self.nsims,self.param_no)),chol.T)*self.scale
+        self.phi, a_rate = metropolis_sampler(self.nsims, self.phi, self.posterior, a_rate, rnums, crit)
+
+        print("Acceptance rate of adaptive Metropolis is " + str(a_rate.sum()/a_rate.shape[0]))
 
-        mean_est = np.array([np.mean(np.array([self.phi[i][j] for i in range(0,self.phi.shape[0])])) for j in range(self.param_no)])
-        median_est = np.array([np.median(np.array([self.phi[i][j] for i in range(0,self.phi.shape[0])])) for j in range(self.param_no)])
-        upper_95_est = np.array([np.percentile(np.array([self.phi[i][j] for i in range(0,self.phi.shape[0])]),95) for j in range(self.param_no)])
-        lower_95_est = np.array([np.percentile(np.array([self.phi[i][j] for i in range(0,self.phi.shape[0])]),5) for j in range(self.param_no)])
+        chain = self.phi.T.copy()
+        mean_est = np.mean(self.phi, axis=0)
+        median_est = np.median(self.phi, axis=0)
+        upper_95_est, lower_95_est = np.percentile(self.phi, [95, 5], axis=0)
 
-        return chain, mean_est, median_est, upper_95_est, lower_95_est
\ No newline at end of file
+        return chain, mean_est, median_est, upper_95_est, lower_95_est
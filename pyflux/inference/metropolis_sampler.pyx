@@ -10,18 +10,18 @@ def metropolis_sampler(int sims_to_do, np.ndarray[double,ndim=2] phi,
     np.ndarray[double,ndim=2] crit):
 
     cdef Py_ssize_t i
-    cdef float post_prop, lik_rate, old_lik
+    cdef double post_prop, old_lik
     cdef np.ndarray[double, ndim=1, mode="c"] phi_prop 
+    cdef np.ndarray[double, ndim=1] log_crit = np.log(crit[:,0])
 
     old_lik = -posterior(phi[0]) # Initial posterior
 
-    # Sampling time!
+    # Sampling time! Compares log posteriors, so large differences cannot overflow
     for i in range(1,sims_to_do):
         phi_prop = phi[i-1] + rnums[i]
         post_prop = -posterior(phi_prop)
-        lik_rat = np.exp(post_prop - old_lik)
 
-        if crit[i] < lik_rat:
+        if log_crit[i] < post_prop - old_lik:
             phi[i] = phi_prop
             a_rate[i] = 1
             old_lik = post_prop
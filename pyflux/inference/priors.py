@@ -38,6 +38,21 @@ def itransform_define(transform):
     else:
         return None
 
+def dtransform_define(transform):
+    """
+    This function links the user's choice of transformation with its derivative
+    """
+    if transform == 'tanh':
+        return lambda x: 1.0 - np.power(np.tanh(x),2)
+    elif transform == 'exp':
+        return np.exp
+    elif transform == 'logit':
+        return lambda x: ilogit(x)*(1.0 - ilogit(x))
+    elif transform is None:
+        return np.ones_like
+    else:
+        return None
+
 def itransform_name_define(transform):
     """
     This function is used for model results table, displaying any transformations performed
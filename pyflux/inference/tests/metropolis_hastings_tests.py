@@ -0,0 +1,58 @@
+import numpy as np
+import pyflux as pf
+from pyflux.inference import MetropolisHastings
+from pyflux.inference.norm_post_sim import norm_post_sim
+
+cov = np.array([[1.0,0.5],[0.5,2.0]])
+precision = np.linalg.inv(cov)
+
+def neg_logposterior(beta):
+	return 0.5*np.dot(beta,np.dot(precision,beta))
+
+def test_gaussian_target():
+	"""
+	Tests that the Metropolis-Hastings chain for a Gaussian target has the right shape and
+	summaries close to the target's moments
+	"""
+	sampler = MetropolisHastings(neg_logposterior,1.0,40000,np.zeros(2),cov_matrix=cov)
+	chain, mean_est, median_est, upper_95_est, lower_95_est = sampler.sample()
+	assert(chain.shape == (2, 40000))
+	assert(np.all(np.abs(mean_est) < 0.15))
+	assert(np.allclose(upper_95_est, 1.645*np.sqrt(np.diag(cov)), atol=0.2))
+	assert(np.allclose(lower_95_est, np.percentile(chain, 5, axis=1)))
+	assert(np.allclose(median_est, np.median(chain, axis=1)))
+
+def test_tuning_carries_state():
+	"""
+	Tests that the sampling chain starts where the tuning chains stopped, not at the initial values
+	"""
+	initials = np.array([30.0,-30.0])
+	sampler = MetropolisHastings(neg_logposterior,1.0,2000,initials)
+	chain, mean_est, median_est, upper_95_est, lower_95_est = sampler.sample()
+	assert(np.all(chain[:,0] != initials))
+	assert(np.all(np.abs(mean_est) < 5.0))
+
+def test_norm_post_sim():
+	"""
+	Tests that the normal approximation summaries agree with its chain, for one latent variable
+	"""
+	chain, mean_est, median_est, upper_95_est, lower_95_est = norm_post_sim(np.array([1.0]),np.array([[4.0]]))
+	assert(chain.shape == (1, 30000))
+	assert(abs(mean_est[0] - 1.0) < 0.1)
+	assert(np.allclose(upper_95_est, np.percentile(chain, 95, axis=1)))
+
+def test_adaptive_covariance():
+	"""
+	Tests that the adaptive Metropolis sampler learns the correlation of a Gaussian target from a
+	diagonal starting proposal, and that its chain summarizes the target
+	"""
+	correlated = np.array([[1.0,0.95],[0.95,1.0]])
+	inverse = np.linalg.inv(correlated)
+	sampler = pf.inference.AdaptiveMetropolis(lambda beta: 0.5*np.dot(beta,np.dot(inverse,beta)),
+		1.0,20000,np.zeros(2),adapt=10000)
+	chain, mean_est, median_est, upper_95_est, lower_95_est = sampler.sample()
+	assert(chain.shape == (2, 20000))
+	learnt = sampler.cov_matrix
+	assert(abs(learnt[0,1]/np.sqrt(learnt[0,0]*learnt[1,1]) - 0.95) < 0.05)
+	assert(np.all(np.abs(mean_est) < 0.2))
+	assert(np.allclose(np.cov(chain), correlated, atol=0.2))
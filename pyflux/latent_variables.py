@@ -6,6 +6,7 @@ import seaborn as sns
 from .covariances import acf
 from .output import TablePrinter
 from .inference import *
+from .inference.priors import dtransform_define
 from .distributions import *
 
 class LatentVariables(object):
@@ -140,6 +141,16 @@ class LatentVariables(object):
             transforms.append(z.prior.transform_name)
         return transforms
 
+    def get_z_transform_gradients(self,values):
+        """ Derivatives of the transformed latent variables with respect to the untransformed values,
+        for converting gradients with respect to transformed values (e.g. variances) into gradients
+        with respect to the optimized values
+        """
+        gradients = np.zeros(len(self.z_list))
+        for i in range(len(self.z_list)):
+            gradients[i] = dtransform_define(self.z_list[i].prior.transform_name)(values[i])
+        return gradients
+
     def get_z_starting_values(self,transformed=False):
         transforms = self.get_z_transforms()
 
@@ -45,7 +45,7 @@ class MLEResults(Results):
 
         self.objective_object = objective_object
 
-        if self.method == 'MLE' or self.method == 'OLS':
+        if self.method == 'MLE' or self.method == 'OLS' or self.method == 'Lasso':
             self.loglik = -self.objective_object(self.z_values)
             self.aic = 2*len(self.z_values)+2*self.objective_object(self.z_values)
             self.bic = 2*self.objective_object(self.z_values) + len(self.z_values)*np.log(self.data_length)
@@ -63,6 +63,8 @@ class MLEResults(Results):
             print("MLE Results Object")
         elif self.method == 'OLS':
             print("OLS Results Object")
+        elif self.method == 'Lasso':
+            print("Lasso Results Object")
         else:
             print("PML Results Object")
         print("==========================")
@@ -183,8 +185,9 @@ class MLEResults(Results):
 
         t_z = self.z.get_z_values(transformed=True)
 
-        print ("Hessian not invertible! Consider a different model specification.")
-        print ("")      
+        if self.method != 'Lasso':
+            print ("Hessian not invertible! Consider a different model specification.")
+            print ("")      
 
         data = []
 
@@ -203,7 +206,7 @@ class MLEResults(Results):
             ('', 'model_results', 50)
             ]
 
-        if self.method == 'MLE':
+        if self.method == 'MLE' or self.method == 'Lasso':
             obj_desc = "Log Likelihood: " + str(np.round(-self.objective_object(self.results.x),4))
         else:
             obj_desc = "Unnormalized Log Posterior: " + str(np.round(-self.objective_object(self.results.x),4))
@@ -43,7 +43,7 @@ class DAR(tsm.TSM):
         self.model_name = "DAR(" + str(self.ar) + ", integrated=" + str(self.integ) + ")"
         self.max_lag = self.ar
         self._z_hide = 0 # Whether to cutoff latent variables from results table
-        self.supported_methods = ["MLE", "PML", "Laplace", "M-H", "BBVI"]
+        self.supported_methods = ["MLE", "PML", "Laplace", "M-H", "AM", "BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
 
@@ -93,7 +93,7 @@ class DAR(tsm.TSM):
 
         self.latent_variables.add_z('Sigma^2 irregular',ifr.Uniform(transform='exp'),dst.q_Normal(0,3))
 
-        self.latent_variables.add_z('Constant',ifr.Uniform(transform=None),dst.q_Normal(0,3))
+        self.latent_variables.add_z('Constant',ifr.Uniform(transform='exp'),dst.q_Normal(0,3))
 
         for parm in range(1,self.ar+1):
             self.latent_variables.add_z('Sigma^2 AR(' + str(parm) + ')',ifr.Uniform(transform='exp'),dst.q_Normal(0,3))
@@ -176,11 +176,25 @@ class DAR(tsm.TSM):
         ----------
         The negative log logliklihood of the model
         """         
-        _, _, _, F, v = self._model(self.y,beta)
-        loglik = 0.0
-        for i in range(0,self.y.shape[0]):
-            loglik += np.linalg.slogdet(F[:,:,i])[1] + np.dot(v[i],np.dot(np.linalg.pinv(F[:,:,i]),v[i]))
-        return -(-((self.y.shape[0]/2)*np.log(2*np.pi))-0.5*loglik.T[0].sum())
+        T, Z, R, Q, H = self._ss_matrices(beta)
+        return -dl_univariate_kalman(self.y,Z,H,T,Q,R,0.0,output='loglik')
+
+    def neg_loglik_and_grad(self,beta):
+        """ Creates the negative log marginal likelihood of the model and its gradient
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for latent variables
+
+        Returns
+        ----------
+        The negative log likelihood of the model and its gradient with respect to beta
+        """
+        T, Z, R, Q, H = self._ss_matrices(beta)
+        loglik, score_H, score_Q = dl_univariate_KFS(self.y,Z,H,T,Q,R,0.0,output='score')
+        score = np.append(score_H, np.diag(score_Q))*self.latent_variables.get_z_transform_gradients(beta)
+        return -loglik, -score
 
     def plot_predict(self, h=5, past_values=20, intervals=True, **kwargs):        
         """ Makes forecast with the estimated model
@@ -410,7 +424,7 @@ class DAR(tsm.TSM):
         plt.legend(loc=2)   
         plt.show()          
 
-    def simulation_smoother(self,beta):
+    def simulation_smoother(self,beta,n_draws=None):
         """ Koopman's simulation smoother - simulates from states given
         model parameters and observations
 
@@ -420,37 +434,18 @@ class DAR(tsm.TSM):
         beta : np.array
             Contains untransformed starting values for latent variables
 
+        n_draws : int (default : None)
+            Number of state evolutions to simulate; if None, a single one is returned
+
         Returns
         ----------
-        - A simulated state evolution
+        - np.array (m x T) of a simulated state evolution, or (n_draws x m x T) of n_draws of
+        them if n_draws is given
         """         
 
         T, Z, R, Q, H = self._ss_matrices(beta)
-
-        # Generate e_t+ and n_t+
-        rnd_h = np.random.normal(0,np.sqrt(H),self.data.shape[0]+1)
-        q_dist = ss.multivariate_normal([0.0, 0.0], Q)
-        rnd_q = q_dist.rvs(self.data.shape[0]+1)
-
-        # Generate a_t+ and y_t+
-        a_plus = np.zeros((T.shape[0],self.data.shape[0]+1)) 
-        a_plus[0,0] = np.mean(self.data[0:5])
-        y_plus = np.zeros(self.data.shape[0])
-
-        for t in range(0,self.data.shape[0]+1):
-            if t == 0:
-                a_plus[:,t] = np.dot(T,a_plus[:,t]) + rnd_q[t,:]
-                y_plus[t] = np.dot(Z,a_plus[:,t]) + rnd_h[t]
-            else:
-                if t != self.data.shape[0]:
-                    a_plus[:,t] = np.dot(T,a_plus[:,t-1]) + rnd_q[t,:]
-                    y_plus[t] = np.dot(Z,a_plus[:,t]) + rnd_h[t]
-
-        alpha_hat, _ = self.smoothed_state(self.data,beta)
-        alpha_hat_plus, _ = self.smoothed_state(y_plus,beta)
-        alpha_tilde = alpha_hat - alpha_hat_plus + a_plus
-    
-        return alpha_tilde
+        draws = simulation_smoother_draws(self.data, Z, H, T, Q, R, 0.0, 1 if n_draws is None else n_draws)
+        return draws[0] if n_draws is None else draws
 
     def smoothed_state(self,data,beta):
         """ Creates the negative log marginal likelihood of the model
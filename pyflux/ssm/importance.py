@@ -0,0 +1,197 @@
+import numpy as np
+
+def initial_signal(dist, y):
+    """ Starting value of the signal for the mode iterations
+
+    Parameters
+    ----------
+    dist : str
+        Measurement density of the model
+
+    y : np.array
+        The time series data
+
+    Returns
+    ----------
+    - np.array of the signal implied by the data
+    """
+
+    if dist == 'Poisson':
+        return np.log(np.maximum(y, 0.0) + 0.5)
+    elif dist == 'Exponential':
+        return -np.log(np.maximum(y, 10**-8))
+    else:
+        return y.copy()
+
+def approximating_model(dist, y, signal, scale=0.0, shape=0.0, skewness=0.0):
+    """ Linear Gaussian approximation to the measurement density about a signal
+
+    Notes
+    ----------
+    Log-concave densities (Poisson, Exponential) are linearised by a Newton step:
+    H = -1/p'' and y~ = signal + Hp' with p = log p(y|signal). Heavy-tailed densities
+    (t, skewt, Laplace) use their normal scale-mixture weights instead, with y~ = y.
+    In both cases a fixed point of the iterations is a mode of p(alpha|y) (Durbin and
+    Koopman, 2012, section 10.6).
+
+    Parameters
+    ----------
+    dist : str
+        Measurement density of the model
+
+    y : np.array
+        The time series data
+
+    signal : np.array
+        Signal about which to approximate the measurement density
+
+    scale, shape, skewness : float
+        Transformed measurement latent variables (see _get_scale_and_shape)
+
+    Returns
+    ----------
+    H : np.array
+        Approximating measurement variances
+
+    mu : np.array
+        Approximating measurement constants, so that y = mu + signal + e with e ~ N(0,H)
+    """
+
+    if dist == 'Poisson':
+        H = np.exp(-signal)
+        y_tilde = signal + H*y - 1.0
+    elif dist == 'Exponential':
+        H = np.exp(-signal)/np.maximum(y, 10**-8)
+        y_tilde = signal + H - 1.0
+    elif dist == 'Laplace':
+        H = scale*np.maximum(np.abs(y - signal), 10**-3*scale)
+        y_tilde = y
+    elif dist == 't':
+        H = (shape*np.power(scale,2) + np.power(y - signal,2))/(shape + 1.0)
+        y_tilde = y
+    elif dist == 'skewt':
+        side_scale = np.where(y - signal >= 0, scale*skewness, scale/skewness)
+        H = (shape*np.power(side_scale,2) + np.power(y - signal,2))/(shape + 1.0)
+        y_tilde = y
+    else:
+        raise ValueError("No approximating model for the " + str(dist) + " distribution!")
+
+    return H, y - y_tilde
+
+def importance_draws(nsims, n, m):
+    """ Standard normal draws for the simulation smoother, held fixed across likelihood
+    evaluations so that the importance sampling estimate is smooth in the latent variables
+
+    Parameters
+    ----------
+    nsims : int
+        Number of importance samples; these are drawn as nsims/2 antithetic pairs
+
+    n : int
+        Length of the time series
+
+    m : int
+        Number of states
+
+    Returns
+    ----------
+    - np.array of shape (nsims/2, n, m+1); the last column drives the measurement noise
+    """
+
+    return np.random.normal(0, 1, (max(nsims//2, 1), n, m+1))
+
+def simulate_states(T, R, Q, rnd):
+    """ Simulates the states of a state space model with a diagonal Q
+
+    Parameters
+    ----------
+    T, R, Q : np.array
+        State space matrices used in KFS algorithm
+
+    rnd : np.array
+        Standard normal draws of shape (draws, n, m) or larger (see importance_draws)
+
+    Returns
+    ----------
+    - np.array of shape (draws, m, n) of simulated states
+    """
+
+    m = T.shape[0]
+    eta = rnd[:,:,:m]*np.sqrt(np.diag(Q))
+    a = np.zeros((rnd.shape[0],m))
+    states = np.zeros((rnd.shape[0],m,rnd.shape[1]))
+
+    for t in range(rnd.shape[1]):
+        a = np.dot(a,T.T) + np.dot(eta[:,t,:],R.T)
+        states[:,:,t] = a
+
+    return states
+
+def importance_loglik(gaussian_loglik, log_weights):
+    """ Combines the approximating model likelihood with the importance weights
+
+    Parameters
+    ----------
+    gaussian_loglik : float
+        Loglikelihood of the approximating Gaussian model
+
+    log_weights : np.array
+        log p(y|theta) - log g(y|theta) for each simulated signal
+
+    Returns
+    ----------
+    - Importance sampling estimate of the loglikelihood
+    """
+
+    w_max = np.max(log_weights)
+    return gaussian_loglik + w_max + np.log(np.mean(np.exp(log_weights - w_max)))
+
+def state_precision(T, Q, Z, H, n):
+    """ Precision matrix of the states under an approximating Gaussian model
+
+    Notes
+    ----------
+    With a flat prior on the first state, the precision is block tridiagonal in time: the
+    state equation contributes Q^-1 and T'Q^-1T on the diagonal blocks and -Q^-1T below
+    them, and the measurement equation adds Z'Z/H to each diagonal block. States are
+    ordered by time, so the matrix has bandwidth 2m-1.
+
+    Parameters
+    ----------
+    T, Q : np.array
+        State space matrices used in KFS algorithm
+
+    Z : np.array
+        Design vector for the states, or a matrix with one row per observation
+
+    H : np.array
+        Approximating measurement variances
+
+    n : int
+        Length of the time series
+
+    Returns
+    ----------
+    - np.array of the lower band of the precision, in the format of scipy.linalg.cholesky_banded
+    """
+
+    m = T.shape[0]
+    Q_inv = np.linalg.inv(Q)
+    if Z.ndim == 1:
+        Z = np.ones((n,1))*Z
+
+    blocks = np.zeros((n,m,m))
+    blocks[1:] += Q_inv
+    blocks[:-1] += np.dot(np.dot(T.T,Q_inv),T)
+    blocks += Z[:,:,None]*Z[:,None,:]/np.ravel(H)[:,None,None]
+    lower = -np.dot(Q_inv,T)
+
+    band = np.zeros((2*m,n*m))
+    for d in range(2*m):
+        for i in range(m):
+            # Row t*m+i+d of column t*m+i falls in the diagonal block if i+d < m
+            if i + d < m:
+                band[d,i::m] = blocks[:,i+d,i]
+            elif i + d < 2*m:
+                band[d,i:(n-1)*m:m] = lower[i+d-m,i]
+    return band
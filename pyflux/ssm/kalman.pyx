@@ -1,16 +1,975 @@
 import numpy as np
 cimport numpy as np
 cimport cython
+from libc.math cimport fabs, fmax, log
 
 # TO DO: REFACTOR AND COMBINE THESE SCRIPTS TO USE A SINGLE KALMAN FILTER/SMOOTHER SCRIPT
 # Main differences between these functions are whether they treat certain matrices as
 # constant or not
 
+# SPECIALISED KERNELS
+# The local level (m=1) and local linear trend (m=2) models spend almost all of their time
+# inside the filter, so these kernels run the recursions on C doubles with no allocation
+# inside the time loop. The public functions below dispatch to them when the state is small.
+# For time-invariant models P, K and F converge to a fixed point; once the relative change in P
+# falls below STEADY_STATE_TOL the kernels stop the covariance recursions and only update the mean.
+#
+# Dynamic regressions (identity transition, diagonal state covariance) have their own kernels,
+# where each filter step is a rank-one downdate of P plus a diagonal, done in place in O(k^2).
+# Any other state goes through _general_filter, which only keeps the current P.
+#
+# All kernels store states, variances and gains time-major, so that the matrices for a timestep
+# are contiguous, and only keep the histories the caller asks for through the output argument
+# of the public functions - see _filter_output. Full output is returned as transposed views in
+# the (m x T) and (m x m x T) shapes used throughout the state space models.
+
+cdef double STEADY_STATE_TOL = 1e-12
+
+FILTER_OUTPUTS = ['full', 'loglik', 'last', 'mean']
+SMOOTHER_OUTPUTS = ['full', 'mean']
+GAUSSIAN_SMOOTHER_OUTPUTS = ['full', 'mean', 'score']
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef Py_ssize_t _scalar_filter(double[:] y, double[:] h, double[:] mu, double z, double tt, double rqr,
+    double[:,::1] a, double[:,:,::1] P, double[:,::1] K, double[::1] F, double[::1] v, double[::1] ll,
+    Py_ssize_t n_obs, Py_ssize_t n_steps, Py_ssize_t n_update, double tol,
+    bint store_a, bint store_P, bint store_K) nogil:
+    """ Kalman filter for a scalar state - see _small_filter """
+    cdef Py_ssize_t t, t_ss = n_steps
+    cdef bint converged = False, steady = False
+    cdef double at = a[0,0], p = P[0,0,0], p_next, f = 0.0, k = 0.0, vt, loglik = 0.0
+
+    for t in range(n_steps):
+        if t < n_obs:
+            vt = y[t] - z*at - mu[t]
+            if not steady:
+                f = z*p*z + h[t]
+                k = tt*p*z/f
+            loglik = loglik + log(f) + vt*vt/f
+        else:
+            steady = False
+            vt = 0.0
+            f = 10000000.0
+            k = 0.0
+        v[t] = vt
+
+        if steady:
+            at = tt*at + k*vt
+            if store_a:
+                a[t+1,0] = at
+            continue
+
+        F[t] = f
+        K[t if store_K else 0,0] = k
+
+        if converged:
+            steady = True
+            converged = False
+            t_ss = t
+            at = tt*at + k*vt
+            if store_a:
+                a[t+1,0] = at
+            continue
+
+        if t < n_update:
+            at = tt*at + k*vt
+            p_next = tt*p*tt + rqr - f*k*k
+            if store_a:
+                a[t+1,0] = at
+            if store_P:
+                P[t+1,0,0] = p_next
+            if tol > 0 and t + 1 < n_obs and fabs(p_next - p) < tol*(1.0 + fabs(p)):
+                converged = True
+            p = p_next
+
+    if not store_a:
+        a[0,0] = at
+    if not store_P:
+        P[0,0,0] = p
+    ll[0] = loglik
+    return t_ss
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef Py_ssize_t _bivariate_filter(double[:] y, double[:] h, double[:] mu, double[:] Z, double[:,:] T, double[:,:] RQR,
+    double[:,::1] a, double[:,:,::1] P, double[:,::1] K, double[::1] F, double[::1] v, double[::1] ll,
+    Py_ssize_t n_obs, Py_ssize_t n_steps, Py_ssize_t n_update, double tol,
+    bint store_a, bint store_P, bint store_K) nogil:
+    """ Kalman filter for a two-dimensional state - see _small_filter """
+    cdef Py_ssize_t t, tk, t_ss = n_steps
+    cdef bint converged = False, steady = False
+    cdef double z0 = Z[0], z1 = Z[1]
+    cdef double t00 = T[0,0], t01 = T[0,1], t10 = T[1,0], t11 = T[1,1]
+    cdef double q00 = RQR[0,0], q01 = RQR[0,1], q10 = RQR[1,0], q11 = RQR[1,1]
+    cdef double a0 = a[0,0], a1 = a[0,1], a0_next
+    cdef double p00 = P[0,0,0], p01 = P[0,0,1], p10 = P[0,1,0], p11 = P[0,1,1]
+    cdef double n00, n01, n10, n11, pz0, pz1, tp00, tp01, tp10, tp11
+    cdef double f = 0.0, k0 = 0.0, k1 = 0.0, vt, change, loglik = 0.0
+
+    for t in range(n_steps):
+        if t < n_obs:
+            vt = y[t] - z0*a0 - z1*a1 - mu[t]
+            if not steady:
+                pz0 = p00*z0 + p01*z1
+                pz1 = p10*z0 + p11*z1
+                f = z0*pz0 + z1*pz1 + h[t]
+                k0 = (t00*pz0 + t01*pz1)/f
+                k1 = (t10*pz0 + t11*pz1)/f
+            loglik = loglik + log(f) + vt*vt/f
+        else:
+            steady = False
+            vt = 0.0
+            f = 10000000.0
+            k0 = 0.0
+            k1 = 0.0
+        v[t] = vt
+
+        if not steady:
+            tk = t if store_K else 0
+            F[t] = f
+            K[tk,0] = k0
+            K[tk,1] = k1
+
+        if steady or converged or t < n_update:
+            a0_next = t00*a0 + t01*a1 + k0*vt
+            a1 = t10*a0 + t11*a1 + k1*vt
+            a0 = a0_next
+            if store_a:
+                a[t+1,0] = a0
+                a[t+1,1] = a1
+
+        if steady:
+            continue
+
+        if converged:
+            steady = True
+            converged = False
+            t_ss = t
+            continue
+
+        if t < n_update:
+            tp00 = t00*p00 + t01*p10
+            tp01 = t00*p01 + t01*p11
+            tp10 = t10*p00 + t11*p10
+            tp11 = t10*p01 + t11*p11
+            n00 = tp00*t00 + tp01*t01 + q00 - f*k0*k0
+            n01 = tp00*t10 + tp01*t11 + q01 - f*k0*k1
+            n10 = tp10*t00 + tp11*t01 + q10 - f*k1*k0
+            n11 = tp10*t10 + tp11*t11 + q11 - f*k1*k1
+            if store_P:
+                P[t+1,0,0] = n00
+                P[t+1,0,1] = n01
+                P[t+1,1,0] = n10
+                P[t+1,1,1] = n11
+            if tol > 0 and t + 1 < n_obs:
+                change = fmax(fmax(fabs(n00 - p00), fabs(n01 - p01)), fmax(fabs(n10 - p10), fabs(n11 - p11)))
+                if change < tol*(1.0 + fmax(fabs(p00), fabs(p11))):
+                    converged = True
+            p00 = n00
+            p01 = n01
+            p10 = n10
+            p11 = n11
+
+    if not store_a:
+        a[0,0] = a0
+        a[0,1] = a1
+    if not store_P:
+        P[0,0,0] = p00
+        P[0,0,1] = p01
+        P[0,1,0] = p10
+        P[0,1,1] = p11
+    ll[0] = loglik
+    return t_ss
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _scalar_smoother(double z, double tt, double[:,::1] a, double[:,:,::1] P, double[:,::1] K,
+    double[::1] F, double[::1] v, double[:,::1] alpha, double[:,:,::1] V, Py_ssize_t n_obs) nogil:
+    """ State smoother for a scalar state - see _small_smoother """
+    cdef Py_ssize_t t
+    cdef double r = 0.0, N = 0.0, l, p
+
+    for t in range(n_obs-1, -1, -1):
+        l = tt - K[t,0]*z
+        r = z*v[t]/F[t] + l*r
+        N = z*z/F[t] + l*N*l
+        p = P[t,0,0]
+        alpha[t,0] = a[t,0] + p*r
+        V[t,0,0] = p - p*N*p
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _bivariate_smoother(double[:] Z, double[:,:] T, double[:,::1] a, double[:,:,::1] P, double[:,::1] K,
+    double[::1] F, double[::1] v, double[:,::1] alpha, double[:,:,::1] V, Py_ssize_t n_obs) nogil:
+    """ State smoother for a two-dimensional state - see _small_smoother """
+    cdef Py_ssize_t t
+    cdef double z0 = Z[0], z1 = Z[1]
+    cdef double t00 = T[0,0], t01 = T[0,1], t10 = T[1,0], t11 = T[1,1]
+    cdef double r0 = 0.0, r1 = 0.0, n00 = 0.0, n01 = 0.0, n10 = 0.0, n11 = 0.0
+    cdef double l00, l01, l10, l11, nl00, nl01, nl10, nl11, u, f, r0_new
+    cdef double p00, p01, p10, p11, pn00, pn01, pn10, pn11
+
+    for t in range(n_obs-1, -1, -1):
+        f = F[t]
+        l00 = t00 - K[t,0]*z0
+        l01 = t01 - K[t,0]*z1
+        l10 = t10 - K[t,1]*z0
+        l11 = t11 - K[t,1]*z1
+
+        # r_t-1 = Z'v/F + L'r_t
+        u = v[t]/f
+        r0_new = z0*u + l00*r0 + l10*r1
+        r1 = z1*u + l01*r0 + l11*r1
+        r0 = r0_new
+
+        # N_t-1 = Z'Z/F + L'N_tL
+        nl00 = n00*l00 + n01*l10
+        nl01 = n00*l01 + n01*l11
+        nl10 = n10*l00 + n11*l10
+        nl11 = n10*l01 + n11*l11
+        n00 = z0*z0/f + l00*nl00 + l10*nl10
+        n01 = z0*z1/f + l00*nl01 + l10*nl11
+        n10 = z1*z0/f + l01*nl00 + l11*nl10
+        n11 = z1*z1/f + l01*nl01 + l11*nl11
+
+        p00 = P[t,0,0]
+        p01 = P[t,0,1]
+        p10 = P[t,1,0]
+        p11 = P[t,1,1]
+        alpha[t,0] = a[t,0] + p00*r0 + p01*r1
+        alpha[t,1] = a[t,1] + p10*r0 + p11*r1
+
+        pn00 = p00*n00 + p01*n10
+        pn01 = p00*n01 + p01*n11
+        pn10 = p10*n00 + p11*n10
+        pn11 = p10*n01 + p11*n11
+        V[t,0,0] = p00 - (pn00*p00 + pn01*p10)
+        V[t,0,1] = p01 - (pn00*p01 + pn01*p11)
+        V[t,1,0] = p10 - (pn10*p00 + pn11*p10)
+        V[t,1,1] = p11 - (pn10*p01 + pn11*p11)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _mean_smoother(double[:,:] Z, bint z_varies, double[:,::1] T, double[:,::1] RQR,
+    double[:,::1] K, double[::1] F, double[::1] v, double[::1] a_init, double[:,::1] P_init,
+    double[:,::1] r, double[:,::1] alpha, Py_ssize_t n_obs) nogil:
+    """ Smoothed states without their variances, from the filtered residuals and gains only
+
+    Notes
+    ----------
+    The fast state smoother of Durbin and Koopman (2012), section 4.6.2: a backwards pass
+    r_t-1 = Z'v_t/F_t + T'r_t - Z(K_t'r_t) followed by a forwards pass
+    alpha_t+1 = T alpha_t + RQR'r_t, starting from alpha_0 = a_0 + P_0 r_-1. r holds
+    r_t-1 in row t and needs n_obs + 1 rows.
+    """
+    cdef Py_ssize_t t, i, j, zt
+    cdef Py_ssize_t m = alpha.shape[1]
+    cdef double kr, s
+
+    for i in range(m):
+        r[n_obs,i] = 0.0
+
+    for t in range(n_obs-1, -1, -1):
+        zt = t if z_varies else 0
+        kr = 0.0
+        for i in range(m):
+            kr = kr + K[t,i]*r[t+1,i]
+        for i in range(m):
+            s = Z[zt,i]*(v[t]/F[t] - kr)
+            for j in range(m):
+                s = s + T[j,i]*r[t+1,j]
+            r[t,i] = s
+
+    for i in range(m):
+        s = a_init[i]
+        for j in range(m):
+            s = s + P_init[i,j]*r[0,j]
+        alpha[0,i] = s
+
+    for t in range(n_obs-1):
+        for i in range(m):
+            s = 0.0
+            for j in range(m):
+                s = s + T[i,j]*alpha[t,j] + RQR[i,j]*r[t+1,j]
+            alpha[t+1,i] = s
+
+cdef object _filter_output(a, P, K, F, v, double loglik, str output):
+    """ Selects the filter output requested by the caller
+
+    Parameters
+    ----------
+    a, P, K, F, v : np.array
+        Time-major filter arrays; a and P only hold the final state and variance
+        unless their histories were stored
+
+    loglik : float
+        Sum of log F_t + v_t^2/F_t over the observations
+
+    output : str
+        One of 'full', 'loglik', 'last' or 'mean'
+
+    Returns
+    ----------
+    'full' : a, P, K, F, v in the (m x T) and (m x m x T) layout
+    'loglik' : the Gaussian log likelihood
+    'last' : the final state and its variance
+    'mean' : the filtered states
+    """
+    if output == 'loglik':
+        return -((v.shape[0]/2.0)*np.log(2*np.pi)) - 0.5*loglik
+    elif output == 'last':
+        return a[-1], P[-1]
+    elif output == 'mean':
+        return a.T
+    else:
+        return a.T, P.transpose(1,2,0), K.T, F.reshape(1,1,F.shape[0]), v
+
+def _check_output(output, options):
+    if output not in options:
+        raise ValueError("output must be one of " + ", ".join(options))
+
+cdef tuple _small_filter(y, Z, H, T, Q, R, mu, double a_init, Py_ssize_t h, bint update_last,
+    double tol=0.0, bint store_a=True, bint store_P=True, bint store_K=True, bint compact=False):
+    """ Kalman filter for states of dimension one or two
+
+    Parameters
+    ----------
+    y : np.array
+        The time series data
+
+    Z, T, Q, R : np.array
+        State space matrices
+
+    H, mu : np.array
+        Measurement variance and constant for each timestep
+
+    a_init : float
+        Initial value of the first state
+
+    h : int
+        How many steps to forecast ahead
+
+    update_last : boolean
+        Whether to predict the state after the final timestep
+
+    tol : float
+        Relative change in P below which the covariance recursions are treated as
+        converged; from then on only the state mean is updated. Zero disables this.
+
+    store_a, store_P, store_K : boolean
+        Whether to keep the state, variance and gain for every timestep, rather than
+        only the latest one
+
+    compact : boolean
+        Whether to truncate P, K and F after steady state is reached, in which case
+        their last entry applies to all remaining timesteps
+
+    Returns
+    ----------
+    a, P, K, F, v : np.array
+        Time-major filtered states, variances, gains, signal-to-noise terms and residuals
+
+    loglik : float
+        Sum of log F_t + v_t^2/F_t over the observations
+    """
+    cdef Py_ssize_t m = T.shape[0]
+    cdef Py_ssize_t n = y.shape[0]
+    cdef Py_ssize_t n_steps = n + h
+    cdef Py_ssize_t n_update = n_steps if update_last else n_steps - 1
+    cdef Py_ssize_t t_ss, s
+
+    cdef double[:] y_c = np.ascontiguousarray(y, dtype=np.float64)
+    cdef double[:] h_c = np.ascontiguousarray(H, dtype=np.float64)
+    cdef double[:] mu_c = np.ascontiguousarray(mu, dtype=np.float64)
+    cdef double[:] Z_c = np.ascontiguousarray(np.ravel(Z), dtype=np.float64)
+    cdef double[:,:] T_c = np.ascontiguousarray(T, dtype=np.float64)
+    cdef double[:,:] RQR_c = np.ascontiguousarray(np.dot(np.dot(R,Q),R.T), dtype=np.float64)
+    cdef double[::1] ll = np.zeros(1)
+
+    a = np.zeros((n_steps+1 if store_a else 1,m))
+    a[0][0] = a_init
+    v = np.zeros(n_steps)
+
+    # In compact mode the steady-state tail is never written, so those pages are never touched
+    P = np.empty((n_steps+1 if store_P else 1,m,m))
+    P[0] = 10**7 # diffuse prior asumed
+    K = np.empty((n_steps if store_K else 1,m))
+    F = np.empty(n_steps)
+
+    if m == 1:
+        t_ss = _scalar_filter(y_c, h_c, mu_c, Z_c[0], T_c[0,0], RQR_c[0,0], a, P, K, F, v, ll,
+            n, n_steps, n_update, tol, store_a, store_P, store_K)
+    else:
+        t_ss = _bivariate_filter(y_c, h_c, mu_c, Z_c, T_c, RQR_c, a, P, K, F, v, ll,
+            n, n_steps, n_update, tol, store_a, store_P, store_K)
+
+    if t_ss < n_steps:
+        s = t_ss + 1
+        if compact:
+            return a, P[:s].copy(), K[:s].copy(), F[:s].copy(), v, ll[0]
+        if store_P:
+            P[s:n+1] = P[t_ss]
+        if store_K:
+            K[s:n] = K[t_ss]
+        F[s:n] = F[t_ss]
+
+    return a, P, K, F, v, ll[0]
+
+cdef object _small_kalman(y, Z, H, T, Q, R, mu, double a_init, Py_ssize_t h, bint update_last, double tol, str output):
+    """ Kalman filter for states of dimension one or two, returning the requested output """
+    a, P, K, F, v, loglik = _small_filter(y, Z, H, T, Q, R, mu, a_init, h, update_last, tol,
+        output in ['full','mean'], output == 'full', output == 'full')
+    return _filter_output(a, P, K, F, v, loglik, output)
+
+cdef object _small_smoother(y, Z, H, T, Q, R, mu, double a_init, bint update_last, Py_ssize_t extra,
+    double tol=0.0, str output='full'):
+    """ Kalman filter and state smoother for states of dimension one or two
+
+    Notes
+    ----------
+    Uses the state smoothing recursions of Durbin and Koopman (2012), section 4.4:
+
+    r_t-1 = Z'v_t/F_t + L_t'r_t                 N_t-1 = Z'Z/F_t + L_t'N_tL_t
+    alpha_t = a_t + P_tr_t-1                    V_t = P_t - P_tN_t-1P_t
+
+    For output 'mean' the variances are not stored - see _mean_smoother.
+
+    Parameters
+    ----------
+    extra : int
+        Number of trailing (zero) columns to append to the smoothed output
+
+    tol : float
+        Steady state tolerance passed to the filter - see _small_filter
+
+    output : str
+        Either 'full' or 'mean'
+
+    Returns
+    ----------
+    alpha : np.array
+        Smoothed states
+
+    V : np.array
+        Variance of smoothed states (output 'full' only)
+    """
+    cdef Py_ssize_t m = T.shape[0]
+    cdef Py_ssize_t n = y.shape[0]
+    cdef double[:,:] Z_c = np.ascontiguousarray(np.ravel(Z), dtype=np.float64).reshape(1,m)
+    cdef double[:,::1] T_c = np.ascontiguousarray(T, dtype=np.float64)
+
+    alpha = np.zeros((n+extra,m))
+
+    if output == 'mean':
+        a, P, K, F, v, _ = _small_filter(y, Z, H, T, Q, R, mu, a_init, 0, update_last, tol, False, False, True)
+        a_0 = np.zeros(m)
+        a_0[0] = a_init
+        _mean_smoother(Z_c, False, T_c, np.ascontiguousarray(np.dot(np.dot(R,Q),R.T), dtype=np.float64),
+            K, F, v, a_0, np.ones((m,m))*(10**7), np.empty((n+1,m)), alpha, n)
+        return alpha.T
+
+    a, P, K, F, v, _ = _small_filter(y, Z, H, T, Q, R, mu, a_init, 0, update_last, tol)
+    V = np.zeros((n+extra,m,m))
+
+    if m == 1:
+        _scalar_smoother(Z_c[0,0], T_c[0,0], a, P, K, F, v, alpha, V, n)
+    else:
+        _bivariate_smoother(Z_c[0], T_c, a, P, K, F, v, alpha, V, n)
+
+    return alpha.T, V.transpose(1,2,0)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _dynreg_filter(double[:] y, double[:,:] Z, double[:] h, double[:] mu, double[:] q,
+    double[:,::1] a, double[:,:,::1] P_store, double[::1] at, double[:,::1] P, double[::1] pz, double[:,::1] K,
+    double[::1] F, double[::1] v, double[::1] ll, Py_ssize_t n_obs, Py_ssize_t n_steps, Py_ssize_t n_update,
+    bint store_a, bint store_P, bint store_K) nogil:
+    """ Kalman filter for a dynamic regression - see _dynreg_filter_arrays """
+    cdef Py_ssize_t t, tk, i, j
+    cdef Py_ssize_t k = at.shape[0]
+    cdef double f, vt, zi, pzi, loglik = 0.0
+
+    for t in range(n_steps):
+        tk = t if store_K else 0
+        if t < n_obs:
+            vt = y[t] - mu[t]
+            f = h[t]
+            for i in range(k):
+                zi = Z[t,i]
+                vt = vt - zi*at[i]
+                pzi = 0.0
+                for j in range(k):
+                    pzi = pzi + P[i,j]*Z[t,j]
+                pz[i] = pzi
+                f = f + zi*pzi
+            for i in range(k):
+                K[tk,i] = pz[i]/f
+            loglik = loglik + log(f) + vt*vt/f
+        else:
+            vt = 0.0
+            f = 10000000.0
+            for i in range(k):
+                pz[i] = 0.0
+                K[tk,i] = 0.0
+        v[t] = vt
+        F[t] = f
+
+        if t < n_update:
+            for i in range(k):
+                at[i] = at[i] + K[tk,i]*vt
+                # P = P - Pz(Pz)'/F + Q, exploiting symmetry
+                for j in range(i, k):
+                    P[i,j] = P[i,j] - pz[i]*pz[j]/f
+                    P[j,i] = P[i,j]
+                P[i,i] = P[i,i] + q[i]
+            if store_a:
+                for i in range(k):
+                    a[t+1,i] = at[i]
+            if store_P:
+                for i in range(k):
+                    for j in range(k):
+                        P_store[t+1,i,j] = P[i,j]
+
+    ll[0] = loglik
+
+cdef tuple _dynreg_filter_arrays(y, Z, H, Q, R, mu, Py_ssize_t h, bint update_last,
+    bint store_a=True, bint store_P=True, bint store_K=True):
+    """ Kalman filter for a dynamic regression: T is the identity and RQR' is diagonal
+
+    Parameters
+    ----------
+    y : np.array
+        The time series data
+
+    Z : np.array
+        Design matrix, with one row per timestep
+
+    H, mu : np.array
+        Measurement variance and constant for each timestep
+
+    Q, R : np.array
+        State space matrices
+
+    h : int
+        How many steps to forecast ahead
+
+    update_last : boolean
+        Whether to predict the state after the final timestep
+
+    store_a, store_P, store_K : boolean
+        Whether to keep the state, variance and gain for every timestep, rather than
+        only the latest one
+
+    Returns
+    ----------
+    a, P, K, F, v : np.array
+        Time-major filtered states, variances, gains, signal-to-noise terms and residuals
+
+    loglik : float
+        Sum of log F_t + v_t^2/F_t over the observations
+    """
+    cdef Py_ssize_t k = Q.shape[0]
+    cdef Py_ssize_t n = y.shape[0]
+    cdef Py_ssize_t n_steps = n + h
+    cdef Py_ssize_t n_update = n_steps if update_last else n_steps - 1
+
+    cdef double[:] y_c = np.ascontiguousarray(y, dtype=np.float64)
+    cdef double[:,:] Z_c = np.ascontiguousarray(Z, dtype=np.float64)
+    cdef double[:] h_c = np.ascontiguousarray(H, dtype=np.float64)
+    cdef double[:] mu_c = np.ascontiguousarray(mu, dtype=np.float64)
+    cdef double[:] q_c = np.ascontiguousarray(np.diag(np.dot(np.dot(R,Q),R.T)), dtype=np.float64)
+    cdef double[::1] ll = np.zeros(1)
+
+    at = np.zeros(k)
+    P = np.ones((k,k))*(10**7) # diffuse prior asumed
+    a = np.zeros((n_steps+1 if store_a else 1,k))
+    P_store = np.empty((n_steps+1 if store_P else 1,k,k))
+    P_store[0] = P
+    K = np.zeros((n_steps if store_K else 1,k))
+    F = np.zeros(n_steps)
+    v = np.zeros(n_steps)
+
+    _dynreg_filter(y_c, Z_c, h_c, mu_c, q_c, a, P_store, at, P, np.zeros(k), K, F, v, ll,
+        n, n_steps, n_update, store_a, store_P, store_K)
+
+    if not store_a:
+        a[0] = at
+    if not store_P:
+        P_store[0] = P
+
+    return a, P_store, K, F, v, ll[0]
+
+cdef object _dynreg_kalman(y, Z, H, Q, R, mu, Py_ssize_t h, str output):
+    """ Kalman filter for a dynamic regression, returning the requested output """
+    a, P, K, F, v, loglik = _dynreg_filter_arrays(y, Z, H, Q, R, mu, h, True,
+        output in ['full','mean'], output == 'full', output == 'full')
+    return _filter_output(a, P, K, F, v, loglik, output)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _general_filter(double[:] y, double[:,:] Z, bint z_varies, double[:] h, double[:] mu,
+    double[:,::1] T, double[:,::1] RQR, double[:,::1] a, double[:,:,::1] P_store, double[::1] at,
+    double[::1] at_next, double[:,::1] P, double[:,::1] TP, double[::1] pz, double[:,::1] K,
+    double[::1] F, double[::1] v, double[::1] ll, Py_ssize_t n_obs,
+    bint store_a, bint store_P, bint store_K) nogil:
+    """ Kalman filter for a state of any dimension - see _general_filter_arrays """
+    cdef Py_ssize_t t, tk, zt, i, j, l
+    cdef Py_ssize_t m = T.shape[0]
+    cdef double f, vt, s, loglik = 0.0
+
+    for t in range(n_obs):
+        tk = t if store_K else 0
+        zt = t if z_varies else 0
+        vt = y[t] - mu[t]
+        f = h[t]
+        for i in range(m):
+            vt = vt - Z[zt,i]*at[i]
+            s = 0.0
+            for j in range(m):
+                s = s + P[i,j]*Z[zt,j]
+            pz[i] = s
+            f = f + Z[zt,i]*s
+        for i in range(m):
+            s = 0.0
+            for j in range(m):
+                s = s + T[i,j]*pz[j]
+            K[tk,i] = s/f
+        v[t] = vt
+        F[t] = f
+        loglik = loglik + log(f) + vt*vt/f
+
+        # a_t+1 = Ta_t + K_tv_t and P_t+1 = TPT' + RQR' - F_tK_tK_t'
+        for i in range(m):
+            s = K[tk,i]*vt
+            for j in range(m):
+                s = s + T[i,j]*at[j]
+                TP[i,j] = 0.0
+                for l in range(m):
+                    TP[i,j] = TP[i,j] + T[i,l]*P[l,j]
+            at_next[i] = s
+        for i in range(m):
+            at[i] = at_next[i]
+            for j in range(m):
+                s = RQR[i,j] - f*K[tk,i]*K[tk,j]
+                for l in range(m):
+                    s = s + TP[i,l]*T[j,l]
+                P[i,j] = s
+
+        if store_a:
+            for i in range(m):
+                a[t+1,i] = at[i]
+        if store_P:
+            for i in range(m):
+                for j in range(m):
+                    P_store[t+1,i,j] = P[i,j]
+
+    ll[0] = loglik
+
+cdef tuple _general_filter_arrays(y, Z, bint z_varies, H, T, Q, R, mu, double a_init,
+    bint store_a=True, bint store_P=True, bint store_K=True):
+    """ Kalman filter for a state of any dimension
+
+    Parameters
+    ----------
+    y : np.array
+        The time series data
+
+    Z : np.array
+        Design matrix, with one row per timestep if z_varies
+
+    z_varies : boolean
+        Whether Z has a row for each timestep
+
+    H, mu : np.array
+        Measurement variance and constant for each timestep
+
+    T, Q, R : np.array
+        State space matrices
+
+    a_init : float
+        Initial value of the first state
+
+    store_a, store_P, store_K : boolean
+        Whether to keep the state, variance and gain for every timestep, rather than
+        only the latest one
+
+    Returns
+    ----------
+    a, P, K, F, v : np.array
+        Time-major filtered states, variances, gains, signal-to-noise terms and residuals
+
+    loglik : float
+        Sum of log F_t + v_t^2/F_t over the observations
+    """
+    cdef Py_ssize_t m = T.shape[0]
+    cdef Py_ssize_t n = y.shape[0]
+    cdef double[::1] ll = np.zeros(1)
+
+    at = np.zeros(m)
+    at[0] = a_init
+    P = np.ones((m,m))*(10**7) # diffuse prior asumed
+    a = np.zeros((n+1 if store_a else 1,m))
+    a[0] = at
+    P_store = np.empty((n+1 if store_P else 1,m,m))
+    P_store[0] = P
+    K = np.zeros((n if store_K else 1,m))
+    F = np.zeros(n)
+    v = np.zeros(n)
+
+    _general_filter(np.ascontiguousarray(y, dtype=np.float64),
+        np.ascontiguousarray(Z, dtype=np.float64).reshape(-1,m), z_varies,
+        np.ascontiguousarray(H, dtype=np.float64), np.ascontiguousarray(mu, dtype=np.float64),
+        np.ascontiguousarray(T, dtype=np.float64), np.ascontiguousarray(np.dot(np.dot(R,Q),R.T), dtype=np.float64),
+        a, P_store, at, np.zeros(m), P, np.zeros((m,m)), np.zeros(m), K, F, v, ll, n,
+        store_a, store_P, store_K)
+
+    if not store_a:
+        a[0] = at
+    if not store_P:
+        P_store[0] = P
+
+    return a, P_store, K, F, v, ll[0]
+
+cdef object _general_kalman(y, Z, bint z_varies, H, T, Q, R, mu, double a_init, str output):
+    """ Kalman filter for a state of any dimension, returning the requested output """
+    a, P, K, F, v, loglik = _general_filter_arrays(y, Z, z_varies, H, T, Q, R, mu, a_init,
+        output in ['full','mean'], output == 'full', output == 'full')
+    return _filter_output(a, P, K, F, v, loglik, output)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _dynreg_state_smoother(double[:,:] Z, double[:,::1] a, double[:,:,::1] P, double[:,::1] K,
+    double[::1] F, double[::1] v, double[:,::1] alpha, double[::1] r, double[:,::1] N, double[::1] nk,
+    Py_ssize_t t) nogil:
+    """ One backwards step of the dynamic regression smoother: updates r and N to r_t-1
+    and N_t-1 and writes the smoothed state for timestep t """
+    cdef Py_ssize_t i, j
+    cdef Py_ssize_t k = a.shape[1]
+    cdef double kr = 0.0, c = 0.0, u, w, s
+
+    # With L = I - KZ': r_t-1 = Z'v/F + r - Z(K'r)
+    for i in range(k):
+        kr = kr + K[t,i]*r[i]
+    u = v[t]/F[t] - kr
+    for i in range(k):
+        r[i] = r[i] + Z[t,i]*u
+
+    # N_t-1 = Z'Z/F + N - Z(NK)' - (NK)Z' + (K'NK)ZZ'
+    for i in range(k):
+        s = 0.0
+        for j in range(k):
+            s = s + N[i,j]*K[t,j]
+        nk[i] = s
+        c = c + K[t,i]*s
+    w = c + 1.0/F[t]
+    for i in range(k):
+        for j in range(i, k):
+            N[i,j] = N[i,j] - Z[t,i]*nk[j] - nk[i]*Z[t,j] + w*Z[t,i]*Z[t,j]
+            N[j,i] = N[i,j]
+
+    # alpha_t = a_t + P_t r_t-1
+    for i in range(k):
+        s = a[t,i]
+        for j in range(k):
+            s = s + P[t,i,j]*r[j]
+        alpha[t,i] = s
+
+cdef object _dynreg_smoother(y, Z, H, Q, R, mu, bint update_last, Py_ssize_t extra, str output='full'):
+    """ Kalman filter and state smoother for a dynamic regression
+
+    Notes
+    ----------
+    Uses the state smoothing recursions of Durbin and Koopman (2012), section 4.4, with
+    T = I so that the r and N recursions cost O(k^2) per timestep. The smoothed variances
+    V_t = P_t - P_tN_t-1P_t are formed with matrix products into preallocated buffers.
+    For output 'mean' neither P nor V is stored - see _mean_smoother.
+
+    Parameters
+    ----------
+    extra : int
+        Number of trailing (zero) columns to append to the smoothed output
+
+    output : str
+        Either 'full' or 'mean'
+
+    Returns
+    ----------
+    alpha : np.array
+        Smoothed states
+
+    V : np.array
+        Variance of smoothed states (output 'full' only)
+    """
+    cdef Py_ssize_t k = Q.shape[0]
+    cdef Py_ssize_t n = y.shape[0]
+    cdef Py_ssize_t t
+    cdef double[:,:] Z_c = np.ascontiguousarray(Z, dtype=np.float64)
+
+    alpha = np.zeros((n+extra,k))
+
+    if output == 'mean':
+        a, P, K, F, v, _ = _dynreg_filter_arrays(y, Z, H, Q, R, mu, 0, update_last, False, False, True)
+        _mean_smoother(Z_c, True, np.identity(k), np.ascontiguousarray(np.dot(np.dot(R,Q),R.T), dtype=np.float64),
+            K, F, v, np.zeros(k), np.ones((k,k))*(10**7), np.empty((n+1,k)), alpha, n)
+        return alpha.T
+
+    a, P, K, F, v, _ = _dynreg_filter_arrays(y, Z, H, Q, R, mu, 0, update_last)
+    V = np.zeros((n+extra,k,k))
+    r = np.zeros(k)
+    N = np.zeros((k,k))
+    nk = np.zeros(k)
+    PN = np.empty((k,k))
+    PNP = np.empty((k,k))
+
+    for t in range(n-1, -1, -1):
+        _dynreg_state_smoother(Z_c, a, P, K, F, v, alpha, r, N, nk, t)
+        np.dot(P[t], N, out=PN)
+        np.dot(PN, P[t], out=PNP)
+        np.subtract(P[t], PNP, out=V[t])
+
+    return alpha.T, V.transpose(1,2,0)
+
+cdef bint _is_dynamic_regression(T, Q, R):
+    """ Whether the transition is the identity and the state covariance RQR' is diagonal """
+    RQR = np.dot(np.dot(R,Q),R.T)
+    return np.array_equal(T, np.identity(T.shape[0])) and np.array_equal(RQR, np.diag(np.diag(RQR)))
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef double _score_smoother(double[:,:] Z, bint z_varies, double[:,::1] T, bint t_identity,
+    double[:,::1] K, double[::1] F, double[::1] v, double[::1] r, double[::1] r_new, double[:,::1] N,
+    double[:,::1] NT, double[::1] nk, double[::1] g, double[:,::1] S, Py_ssize_t n_obs) nogil:
+    """ Backwards pass for the score of the Gaussian log likelihood
+
+    Notes
+    ----------
+    Durbin and Koopman (2012), section 7.3.3: with the smoothing errors u_t = v_t/F_t - K_t'r_t
+    and their variances D_t = 1/F_t + K_t'N_tK_t,
+
+    dlogL/dH = 0.5 sum (u_t^2 - D_t)            dlogL/d(RQR') = 0.5 sum (r_tr_t' - N_t)
+
+    Returns sum (u_t^2 - D_t) and accumulates sum (r_tr_t' - N_t) into S. r, r_new, nk and g
+    are buffers of length m, N and NT buffers of size m x m.
+    """
+    cdef Py_ssize_t t, i, j, l, zt
+    cdef Py_ssize_t m = r.shape[0]
+    cdef double kr, c, u, d, s
+    cdef double h_score = 0.0
+
+    for i in range(m):
+        r[i] = 0.0
+        for j in range(m):
+            N[i,j] = 0.0
+            S[i,j] = 0.0
+
+    for t in range(n_obs-1, -1, -1):
+        zt = t if z_varies else 0
+        kr = 0.0
+        c = 0.0
+        for i in range(m):
+            s = 0.0
+            for j in range(m):
+                S[i,j] = S[i,j] + r[i]*r[j] - N[i,j]
+                s = s + N[i,j]*K[t,j]
+            nk[i] = s
+            kr = kr + K[t,i]*r[i]
+            c = c + K[t,i]*s
+        u = v[t]/F[t] - kr
+        d = 1.0/F[t] + c
+        h_score = h_score + u*u - d
+
+        # r_t-1 = Zu_t + T'r_t        N_t-1 = T'N_tT - gZ' - Zg' + D_tZZ'  where g = T'N_tK_t
+        if t_identity:
+            for i in range(m):
+                g[i] = nk[i]
+                r_new[i] = r[i]
+        else:
+            for i in range(m):
+                s = 0.0
+                for l in range(m):
+                    s = s + T[l,i]*nk[l]
+                g[i] = s
+                s = 0.0
+                for l in range(m):
+                    s = s + T[l,i]*r[l]
+                r_new[i] = s
+            for i in range(m):
+                for j in range(m):
+                    s = 0.0
+                    for l in range(m):
+                        s = s + N[i,l]*T[l,j]
+                    NT[i,j] = s
+            for i in range(m):
+                for j in range(m):
+                    s = 0.0
+                    for l in range(m):
+                        s = s + T[l,i]*NT[l,j]
+                    N[i,j] = s
+
+        for i in range(m):
+            r[i] = r_new[i] + Z[zt,i]*u
+        for i in range(m):
+            for j in range(i, m):
+                N[i,j] = N[i,j] - g[i]*Z[zt,j] - Z[zt,i]*g[j] + d*Z[zt,i]*Z[zt,j]
+                N[j,i] = N[i,j]
+
+    return h_score
+
+cdef tuple _score_output(Z, bint z_varies, T, R, K, F, v, double loglik):
+    """ Log likelihood and its gradient with respect to H and Q from the filter output
+
+    Parameters
+    ----------
+    Z, T, R : np.array
+        State space matrices; Z has one row per timestep if z_varies
+
+    K, F, v : np.array
+        Time-major Kalman gains, signal-to-noise terms and residuals
+
+    loglik : float
+        Sum of log F_t + v_t^2/F_t over the observations
+
+    Returns
+    ----------
+    loglik : float
+        The Gaussian log likelihood
+
+    score_H : float
+        Derivative of the log likelihood with respect to the measurement variance
+
+    score_Q : np.array
+        Derivatives of the log likelihood with respect to the elements of Q
+    """
+    cdef Py_ssize_t m = T.shape[0]
+    cdef Py_ssize_t n = v.shape[0]
+    cdef double[:,::1] T_c = np.ascontiguousarray(T, dtype=np.float64)
+    cdef double[:,::1] S = np.zeros((m,m))
+    cdef double h_score
+
+    Z_c = np.ascontiguousarray(Z, dtype=np.float64).reshape(-1,m)
+    h_score = _score_smoother(Z_c, z_varies, T_c, np.array_equal(T, np.identity(m)),
+        np.ascontiguousarray(K, dtype=np.float64), np.ascontiguousarray(F, dtype=np.float64),
+        np.ascontiguousarray(v, dtype=np.float64), np.zeros(m), np.zeros(m), np.zeros((m,m)),
+        np.zeros((m,m)), np.zeros(m), np.zeros(m), S, n)
+
+    return (-((n/2.0)*np.log(2*np.pi)) - 0.5*loglik, 0.5*h_score,
+        0.5*np.dot(np.dot(R.T,np.asarray(S)),R))
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.cdivision(True)
 def univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z, np.ndarray[double,ndim=2] H,
-    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu):
+    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu, output='full'):
     """ Kalman filtering and smoothing for univariate time series
 
     Notes
@@ -42,6 +1001,11 @@ def univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z, np.
     mu : float
         Constant term for measurement equation
 
+    output : str (default : 'full')
+        Which quantities to return: 'full', 'mean' (the smoothed states only, computed
+        without storing the state variances) or 'score' (the log likelihood and its
+        gradient with respect to H and Q, from one smoothing pass)
+
     Returns
     ----------
     alpha : np.array
@@ -49,8 +1013,25 @@ def univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z, np.
 
     V : np.array
         Variance of smoothed states
+
+    For output 'score': the log likelihood, its derivative with respect to H and the
+    matrix of its derivatives with respect to the elements of Q
     """     
 
+    _check_output(output, GAUSSIAN_SMOOTHER_OUTPUTS)
+
+    if T.shape[0] <= 2:
+        if output == 'score':
+            _, _, K_s, F_s, v_s, loglik = _small_filter(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu,
+                np.mean(y[0:5]), 0, True, STEADY_STATE_TOL, False, False, True)
+            return _score_output(Z, False, T, R, K_s, F_s, v_s, loglik)
+        return _small_smoother(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, np.mean(y[0:5]), True, 1, STEADY_STATE_TOL, output)
+
+    if output == 'score':
+        _, _, K_s, F_s, v_s, loglik = _general_filter_arrays(y, Z, False, np.ones(y.shape[0])*H.ravel()[0], T, Q, R,
+            np.ones(y.shape[0])*mu, np.mean(y[0:5]), False, False, True)
+        return _score_output(Z, False, T, R, K_s, F_s, v_s, loglik)
+
     # Filtering matrices
     cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1), dtype=np.float64) 
     a[0][0] = np.mean(y[0:5]) # Initialization
@@ -99,13 +1080,15 @@ def univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z, np.
             alpha[:,t] = a[:,t]
             V[:,:,t] = P[:,:,t]            
 
+    if output == 'mean':
+        return alpha
     return alpha, V
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.cdivision(True)
 def univariate_kalman(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z, np.ndarray[double,ndim=2] H,
-    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu):
+    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu, output='full'):
     """ Kalman filtering for univariate time series
 
     Notes
@@ -137,6 +1120,10 @@ def univariate_kalman(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z,
     mu : float
         Constant term for measurement equation
 
+    output : str (default : 'full')
+        Which quantities to return: 'full', 'loglik' (the log likelihood only), 'last'
+        (the final state and its variance only) or 'mean' (the filtered states only)
+
     Returns
     ----------
     a : np.array
@@ -155,28 +1142,12 @@ def univariate_kalman(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z,
         Residuals
     """         
 
-    cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1), dtype=np.float64) 
-    a[0][0] = np.mean(y[0:5]) # Initialization
-    cdef np.ndarray[double, ndim=3, mode="c"] P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1), dtype=np.float64)*(10**7) # diffuse prior asumed
+    _check_output(output, FILTER_OUTPUTS)
 
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((a.shape[0],y.shape[0]), dtype=np.float64)
-    cdef np.ndarray[double, ndim=1, mode="c"] v = np.zeros(y.shape[0], dtype=np.float64)
-    cdef np.ndarray[double, ndim=3, mode="c"] F = np.zeros((H.shape[0],H.shape[1],y.shape[0]), dtype=np.float64)
-
-    cdef Py_ssize_t t
-
-    for t in range(0,y.shape[0]):
-        v[t] = y[t] - np.dot(Z,a[:,t]) - mu
+    if T.shape[0] <= 2:
+        return _small_kalman(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, np.mean(y[0:5]), 0, True, STEADY_STATE_TOL, output)
 
-        F[:,:,t] = np.dot(np.dot(Z,P[:,:,t]),Z.T) + H.ravel()[0]
-
-        K[:,t] = np.dot(np.dot(T,P[:,:,t]),Z.T)/(F[:,:,t]).ravel()[0]
-
-        a[:,t+1] = np.dot(T,a[:,t]) + np.dot(K[:,t],v[t]) 
-
-        P[:,:,t+1] = np.dot(np.dot(T,P[:,:,t]),T.T) + np.dot(np.dot(R,Q),R.T) - F[:,:,t].ravel()[0]*np.dot(np.array([K[:,t]]).T,np.array([K[:,t]]))
-
-    return a, P, K, F, v
+    return _general_kalman(y, Z, False, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, np.mean(y[0:5]), output)
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
@@ -226,6 +1197,9 @@ def univariate_kalman_fcst(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2
         Variance of forecasted states
     """         
 
+    if T.shape[0] <= 2:
+        return _small_kalman(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, np.mean(y[0:5]), h, True, STEADY_STATE_TOL, 'full')[:2]
+
     cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1+h), dtype=np.float64)
     a[0][0] = np.mean(y[0:5]) # Initialization
     cdef np.ndarray[double, ndim=3, mode="c"] P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1+h), dtype=np.float64)*(10**7) # diffuse prior asumed
@@ -256,7 +1230,7 @@ def univariate_kalman_fcst(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2
 @cython.wraparound(False)
 @cython.cdivision(True)
 def llt_univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=1] Z, np.ndarray[double,ndim=2] H,
-    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu):
+    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu, output='full'):
     """ Kalman filtering and smoothing for univariate time series
 
     Notes
@@ -288,6 +1262,11 @@ def llt_univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=1] Z,
     mu : float
         Constant term for measurement equation
 
+    output : str (default : 'full')
+        Which quantities to return: 'full', 'mean' (the smoothed states only, computed
+        without storing the state variances) or 'score' (the log likelihood and its
+        gradient with respect to H and Q, from one smoothing pass)
+
     Returns
     ----------
     alpha : np.array
@@ -295,8 +1274,25 @@ def llt_univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=1] Z,
 
     V : np.array
         Variance of smoothed states
+
+    For output 'score': the log likelihood, its derivative with respect to H and the
+    matrix of its derivatives with respect to the elements of Q
     """     
 
+    _check_output(output, GAUSSIAN_SMOOTHER_OUTPUTS)
+
+    if T.shape[0] <= 2:
+        if output == 'score':
+            _, _, K_s, F_s, v_s, loglik = _small_filter(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu,
+                np.mean(y[0:5]), 0, True, STEADY_STATE_TOL, False, False, True)
+            return _score_output(Z, False, T, R, K_s, F_s, v_s, loglik)
+        return _small_smoother(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, np.mean(y[0:5]), True, 1, STEADY_STATE_TOL, output)
+
+    if output == 'score':
+        _, _, K_s, F_s, v_s, loglik = _general_filter_arrays(y, Z, False, np.ones(y.shape[0])*H.ravel()[0], T, Q, R,
+            np.ones(y.shape[0])*mu, np.mean(y[0:5]), False, False, True)
+        return _score_output(Z, False, T, R, K_s, F_s, v_s, loglik)
+
     # Filtering matrices
     cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1), dtype=np.float64) 
     a[0][0] = np.mean(y[0:5]) # Initialization
@@ -345,13 +1341,15 @@ def llt_univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=1] Z,
             alpha[:,t] = a[:,t]
             V[:,:,t] = P[:,:,t]            
 
+    if output == 'mean':
+        return alpha
     return alpha, V
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.cdivision(True)
 def llt_univariate_kalman(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=1] Z, np.ndarray[double,ndim=2] H,
-    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu):
+    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu, output='full'):
     """ Kalman filtering for univariate time series
 
     Notes
@@ -383,6 +1381,10 @@ def llt_univariate_kalman(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=1]
     mu : float
         Constant term for measurement equation
 
+    output : str (default : 'full')
+        Which quantities to return: 'full', 'loglik' (the log likelihood only), 'last'
+        (the final state and its variance only) or 'mean' (the filtered states only)
+
     Returns
     ----------
     a : np.array
@@ -401,28 +1403,12 @@ def llt_univariate_kalman(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=1]
         Residuals
     """         
 
-    cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1), dtype=np.float64) 
-    a[0][0] = np.mean(y[0:5]) # Initialization
-    cdef np.ndarray[double, ndim=3, mode="c"] P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1), dtype=np.float64)*(10**7) # diffuse prior asumed
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((a.shape[0],y.shape[0]), dtype=np.float64)
-    cdef np.ndarray[double, ndim=1, mode="c"] v = np.zeros(y.shape[0], dtype=np.float64)
-    cdef np.ndarray[double, ndim=3, mode="c"] F = np.zeros((H.shape[0],H.shape[1],y.shape[0]), dtype=np.float64)
-
-    cdef Py_ssize_t t
-
-    for t in range(0,y.shape[0]):
-        v[t] = y[t] - np.dot(Z,a[:,t]) - mu
-
-        F[:,:,t] = np.dot(np.dot(Z,P[:,:,t]),Z.T) + H.ravel()[0]
+    _check_output(output, FILTER_OUTPUTS)
 
-        K[:,t] = np.dot(np.dot(T,P[:,:,t]),Z.T)/(F[:,:,t]).ravel()[0]
-
-        a[:,t+1] = np.dot(T,a[:,t]) + np.dot(K[:,t],v[t]) 
+    if T.shape[0] <= 2:
+        return _small_kalman(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, np.mean(y[0:5]), 0, True, STEADY_STATE_TOL, output)
 
-        P[:,:,t+1] = np.dot(np.dot(T,P[:,:,t]),T.T) + np.dot(np.dot(R,Q),R.T) - F[:,:,t].ravel()[0]*np.dot(np.array([K[:,t]]).T,np.array([K[:,t]]))
-
-    return a, P, K, F, v
+    return _general_kalman(y, Z, False, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, np.mean(y[0:5]), output)
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
@@ -472,6 +1458,9 @@ def llt_univariate_kalman_fcst(np.ndarray[double,ndim=1] y, np.ndarray[double,nd
         Variance of forecasted states
     """         
 
+    if T.shape[0] <= 2:
+        return _small_kalman(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, np.mean(y[0:5]), h, True, STEADY_STATE_TOL, 'full')[:2]
+
     cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1+h), dtype=np.float64)
     a[0][0] = np.mean(y[0:5]) # Initialization
     cdef np.ndarray[double, ndim=3, mode="c"] P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1+h), dtype=np.float64)*(10**7) # diffuse prior asumed
@@ -498,7 +1487,310 @@ def llt_univariate_kalman_fcst(np.ndarray[double,ndim=1] y, np.ndarray[double,nd
 
     return a, P
 
-def nl_univariate_KFS(y,Z,H,T,Q,R,mu):
+def univariate_kalman_steady(y,Z,H,T,Q,R,mu):
+    """ Kalman filtering for univariate time series with time-invariant matrices,
+    storing the variances and gains only up to the point they reach steady state
+
+    Notes
+    ----------
+
+    y = Za_t + e_t         where   e_t ~ N(0,H)  MEASUREMENT EQUATION
+    a_t = Ta_t-1 + Rn_t    where   n_t ~ N(0,Q)  STATE EQUATION
+
+    Parameters
+    ----------
+    y : np.array
+        The time series data
+
+    Z : np.array
+        Design matrix for state matrix a
+
+    H : np.array
+        Covariance matrix for measurement noise
+
+    T : np.array
+        Design matrix for lagged state matrix in state equation
+
+    Q : np.array
+        Covariance matrix for state evolution noise
+
+    R : np.array
+        Scale matrix for state equation covariance matrix
+
+    mu : float
+        Constant term for measurement equation
+
+    Returns
+    ----------
+    a : np.array
+        Filtered states
+
+    P : np.array
+        Filtered variances
+
+    K : np.array
+        Kalman Gain matrices
+
+    F : np.array
+        Signal-to-noise term
+
+    v : np.array
+        Residuals
+
+    The time dimension of P, K and F stops at the first steady-state timestep; their
+    last entry applies to every later timestep. States with more than two dimensions
+    are filtered in full.
+    """
+
+    if T.shape[0] <= 2:
+        a, P, K, F, v, _ = _small_filter(y, Z, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu,
+            np.mean(y[0:5]), 0, True, STEADY_STATE_TOL, True, True, True, True)
+        return _filter_output(a, P, K, F, v, 0.0, 'full')
+    else:
+        return univariate_kalman(y,Z,H,T,Q,R,mu)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _batch_filter(double[:] y, double[:] mu, double[:] Z, double[:,:] T, double[:,:] R,
+    double[:,:] variances, double a_init, double[::1] h, double[:,::1] RQR, double[:,::1] a,
+    double[:,:,::1] P, double[:,::1] K, double[::1] F, double[::1] v, double[::1] ll,
+    double[::1] loglik, Py_ssize_t n_obs, double tol) nogil:
+    """ Runs the small state filter once per row of variances - see univariate_kalman_batch """
+    cdef Py_ssize_t b, t, i, j, l
+    cdef Py_ssize_t m = T.shape[0]
+    cdef double s
+
+    for b in range(variances.shape[0]):
+        for t in range(n_obs):
+            h[t] = variances[b,0]
+
+        # RQR' with Q = diag(variances[b,1:])
+        for i in range(m):
+            for j in range(m):
+                s = 0.0
+                for l in range(m):
+                    s = s + R[i,l]*variances[b,l+1]*R[j,l]
+                RQR[i,j] = s
+
+        for i in range(m):
+            a[0,i] = 0.0
+            for j in range(m):
+                P[0,i,j] = 10000000.0 # diffuse prior asumed
+        a[0,0] = a_init
+
+        if m == 1:
+            _scalar_filter(y, h, mu, Z[0], T[0,0], RQR[0,0], a, P, K, F, v, ll,
+                n_obs, n_obs, n_obs, tol, False, False, False)
+        else:
+            _bivariate_filter(y, h, mu, Z, T, RQR, a, P, K, F, v, ll,
+                n_obs, n_obs, n_obs, tol, False, False, False)
+        loglik[b] = ll[0]
+
+def univariate_kalman_batch(y,Z,T,R,variances,mu):
+    """ Gaussian log likelihoods of a univariate time series for many sets of variances
+
+    Notes
+    ----------
+    For states of dimension one or two, each row of variances is filtered in compiled code
+    without storing the states, variances or gains, so a batch of B parameter vectors costs
+    one call. Larger states fall back to llt_univariate_kalman with output='loglik'.
+
+    Parameters
+    ----------
+    y : np.array
+        The time series data
+
+    Z : np.array
+        Design matrix for state matrix a
+
+    T : np.array
+        Design matrix for lagged state matrix in state equation
+
+    R : np.array
+        Scale matrix for state equation covariance matrix
+
+    variances : np.array
+        B x (m+1) matrix; each row holds the measurement variance H followed by the
+        diagonal of the state covariance Q
+
+    mu : float
+        Constant term for measurement equation
+
+    Returns
+    ----------
+    loglik : np.array
+        The B log likelihoods
+    """
+
+    cdef Py_ssize_t m = T.shape[0]
+    cdef Py_ssize_t n = y.shape[0]
+
+    variances = np.atleast_2d(np.asarray(variances, dtype=np.float64))
+    if variances.shape[1] != m + 1:
+        raise ValueError("variances must have one column for H and one for each state")
+
+    if m > 2:
+        return np.array([llt_univariate_kalman(y,np.ravel(Z).astype(np.float64),np.identity(1)*row[0],T,np.diag(row[1:]),R,mu,output='loglik')
+            for row in variances])
+
+    loglik = np.zeros(variances.shape[0])
+    _batch_filter(np.ascontiguousarray(y, dtype=np.float64), np.ones(n)*mu,
+        np.ascontiguousarray(np.ravel(Z), dtype=np.float64), np.ascontiguousarray(T, dtype=np.float64),
+        np.ascontiguousarray(R, dtype=np.float64), variances, np.mean(y[0:5]), np.empty(n), np.empty((m,m)),
+        np.empty((1,m)), np.empty((1,m,m)), np.empty((1,m)), np.empty(n), np.empty(n), np.zeros(1),
+        loglik, n, STEADY_STATE_TOL)
+
+    return -((n/2.0)*np.log(2*np.pi)) - 0.5*loglik
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _gain_filter(double[:,:] Z, bint z_varies, double[::1] h, double[:,::1] T, double[:,::1] RQR,
+    double[:,::1] P, double[:,::1] TP, double[::1] pz, double[:,::1] K, double[::1] F, Py_ssize_t n_obs) nogil:
+    """ Covariance recursions of the Kalman filter, which do not involve the data: stores K_t and
+    F_t for each timestep, updating P in place """
+    cdef Py_ssize_t t, i, j, l, zt
+    cdef Py_ssize_t m = T.shape[0]
+    cdef double f, s
+
+    for t in range(n_obs):
+        zt = t if z_varies else 0
+        f = h[t]
+        for i in range(m):
+            s = 0.0
+            for j in range(m):
+                s = s + P[i,j]*Z[zt,j]
+            pz[i] = s
+            f = f + Z[zt,i]*s
+        F[t] = f
+        for i in range(m):
+            s = 0.0
+            for j in range(m):
+                s = s + T[i,j]*pz[j]
+            K[t,i] = s/f
+
+        # P_t+1 = TPT' + RQR' - F_tK_tK_t'
+        for i in range(m):
+            for j in range(m):
+                s = 0.0
+                for l in range(m):
+                    s = s + T[i,l]*P[l,j]
+                TP[i,j] = s
+        for i in range(m):
+            for j in range(m):
+                s = RQR[i,j] - f*K[t,i]*K[t,j]
+                for l in range(m):
+                    s = s + TP[i,l]*T[j,l]
+                P[i,j] = s
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _batch_mean_smoother(double[:,:] Y, double[:,:] Z, bint z_varies, double[::1] mu, double[:,::1] T,
+    double[:,::1] RQR, double[:,::1] K, double[::1] F, double[:,::1] a_init, double[:,::1] P_init,
+    double[::1] at, double[::1] at_next, double[::1] v, double[:,::1] r, double[:,:,::1] alpha,
+    Py_ssize_t n_obs) nogil:
+    """ Smoothed states for each row of Y, sharing one set of gains - see simulation_smoother_draws """
+    cdef Py_ssize_t d, t, i, j, zt
+    cdef Py_ssize_t m = T.shape[0]
+    cdef double s
+
+    for d in range(Y.shape[0]):
+        for i in range(m):
+            at[i] = a_init[d,i]
+
+        for t in range(n_obs):
+            zt = t if z_varies else 0
+            s = Y[d,t] - mu[t]
+            for i in range(m):
+                s = s - Z[zt,i]*at[i]
+            v[t] = s
+            for i in range(m):
+                at_next[i] = K[t,i]*v[t]
+                for j in range(m):
+                    at_next[i] = at_next[i] + T[i,j]*at[j]
+            for i in range(m):
+                at[i] = at_next[i]
+
+        _mean_smoother(Z, z_varies, T, RQR, K, F, v, a_init[d], P_init, r, alpha[d], n_obs)
+
+def simulation_smoother_draws(y, Z, H, T, Q, R, mu, n_draws, level_start=False):
+    """ Koopman's simulation smoother for many draws at once
+
+    Notes
+    ----------
+    The simulation smoother draws states from p(a|y) as a_hat - a_hat+ + a+, where a+ and y+ are
+    simulated from the model and a_hat, a_hat+ are the smoothed states given y and y+. The
+    gains K_t and variances F_t do not depend on the data, so the covariance recursions are run
+    once; all the simulated paths are generated as (n_draws x n x m) arrays and the data and
+    the simulated series are then smoothed in a single compiled pass with the fast state
+    smoother (see _mean_smoother). Q is assumed diagonal, as in the models' _ss_matrices.
+
+    Parameters
+    ----------
+    y : np.array
+        The time series data
+
+    Z : np.array
+        Design vector for the states, or a matrix with one row per timestep
+
+    H : float or np.array
+        Measurement variance, for every timestep or for each one
+
+    T, Q, R : np.array
+        State space matrices
+
+    mu : float or np.array
+        Constant term for measurement equation, for every timestep or for each one
+
+    n_draws : int
+        Number of draws from the states
+
+    level_start : boolean (default : False)
+        Whether the filter starts the first state at the mean of the first five observations
+        of each series, as univariate_KFS and llt_univariate_KFS do; otherwise it starts at zero
+
+    Returns
+    ----------
+    - np.array of shape (n_draws, m, n) of simulated states
+    """
+
+    cdef Py_ssize_t m = T.shape[0]
+    cdef Py_ssize_t n = y.shape[0]
+    cdef Py_ssize_t t
+
+    Z_c = np.ascontiguousarray(np.atleast_2d(Z), dtype=np.float64)
+    h = np.ascontiguousarray(np.ones(n)*np.ravel(H), dtype=np.float64)
+    mu_c = np.ascontiguousarray(np.ones(n)*np.ravel(mu), dtype=np.float64)
+    T_c = np.ascontiguousarray(T, dtype=np.float64)
+    RQR = np.ascontiguousarray(np.dot(np.dot(R,Q),R.T), dtype=np.float64)
+
+    # Generate a_t+ and y_t+ for all draws
+    eta = np.random.normal(0, 1, (n_draws,n,Q.shape[0]))*np.sqrt(np.diag(Q))
+    a_plus = np.zeros((n_draws,n,m))
+    state = np.zeros((n_draws,m))
+    for t in range(n):
+        state = np.dot(state,T.T) + np.dot(eta[:,t,:],R.T)
+        a_plus[:,t,:] = state
+    y_plus = mu_c + np.sum(a_plus*Z_c,axis=2) + np.random.normal(0, 1, (n_draws,n))*np.sqrt(h)
+
+    Y = np.ascontiguousarray(np.vstack((y,y_plus)), dtype=np.float64)
+    a_init = np.zeros((n_draws+1,m))
+    if level_start:
+        a_init[:,0] = np.mean(Y[:,0:5],axis=1)
+
+    K = np.empty((n,m))
+    F = np.empty(n)
+    _gain_filter(Z_c, Z_c.shape[0] > 1, h, T_c, RQR, np.ones((m,m))*(10**7), np.empty((m,m)), np.empty(m), K, F, n)
+
+    alpha = np.zeros((n_draws+1,n,m))
+    _batch_mean_smoother(Y, Z_c, Z_c.shape[0] > 1, mu_c, T_c, RQR, K, F, a_init, np.ones((m,m))*(10**7),
+        np.empty(m), np.empty(m), np.empty(n), np.empty((n+1,m)), alpha, n)
+
+    return (alpha[0] - alpha[1:] + a_plus).transpose(0,2,1)
+
+def nl_univariate_KFS(y,Z,H,T,Q,R,mu,output='full'):
     """ Kalman filtering and smoothing for univariate time series
     Notes
     ----------
@@ -520,6 +1812,9 @@ def nl_univariate_KFS(y,Z,H,T,Q,R,mu):
         Scale matrix for state equation covariance matrix
     mu : float
         Constant term for measurement equation
+    output : str (default : 'full')
+        Which quantities to return: 'full' or 'mean' (the smoothed states only, computed
+        without storing the state variances)
     Returns
     ----------
     alpha : np.array
@@ -528,6 +1823,11 @@ def nl_univariate_KFS(y,Z,H,T,Q,R,mu):
         Variance of smoothed states
     """     
 
+    _check_output(output, SMOOTHER_OUTPUTS)
+
+    if T.shape[0] <= 2:
+        return _small_smoother(y, Z, np.ravel(H), T, Q, R, np.ravel(mu), 0.0, False, 0, 0.0, output)
+
     # Filtering matrices
     a = np.zeros((T.shape[0],y.shape[0]+1)) # Initialization
     P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1))*(10**7) # diffuse prior asumed
@@ -570,9 +1870,11 @@ def nl_univariate_KFS(y,Z,H,T,Q,R,mu):
             alpha[:,t] = a[:,t]
             V[:,:,t] = P[:,:,t] 
 
+    if output == 'mean':
+        return alpha
     return alpha, V
 
-def nl_univariate_kalman(y,Z,H,T,Q,R,mu):
+def nl_univariate_kalman(y,Z,H,T,Q,R,mu,output='full'):
     """ Kalman filtering for univariate time series
     Notes
     ----------
@@ -594,6 +1896,9 @@ def nl_univariate_kalman(y,Z,H,T,Q,R,mu):
         Scale matrix for state equation covariance matrix
     mu : float
         Constant term for measurement equation
+    output : str (default : 'full')
+        Which quantities to return: 'full', 'loglik' (the log likelihood only), 'last'
+        (the final state and its variance only) or 'mean' (the filtered states only)
     Returns
     ----------
     a : np.array
@@ -608,32 +1913,19 @@ def nl_univariate_kalman(y,Z,H,T,Q,R,mu):
         Residuals
     """         
 
-    a = np.zeros((T.shape[0],y.shape[0]+1)) # Initialization
-    P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1))*(10**7) # diffuse prior asumed
-
-    K = np.zeros((a.shape[0],y.shape[0]))
-    v = np.zeros(y.shape[0])
-    F = np.zeros((1,1,y.shape[0]))
+    _check_output(output, FILTER_OUTPUTS)
 
-    for t in range(0,y.shape[0]):
-        v[t] = y[t] - np.dot(Z,a[:,t]) - mu[t]
+    if T.shape[0] <= 2:
+        return _small_kalman(y, Z, np.ravel(H), T, Q, R, np.ravel(mu), 0.0, 0, True, 0.0, output)
 
-        F[:,:,t] = np.dot(np.dot(Z,P[:,:,t]),Z.T) + H[t].ravel()[0]
-
-        K[:,t] = np.dot(np.dot(T,P[:,:,t]),Z.T)/(F[:,:,t]).ravel()[0]
-
-        a[:,t+1] = np.dot(T,a[:,t]) + np.dot(K[:,t],v[t]) 
-
-        P[:,:,t+1] = np.dot(np.dot(T,P[:,:,t]),T.T) + np.dot(np.dot(R,Q),R.T) - F[:,:,t].ravel()[0]*np.dot(np.array([K[:,t]]).T,np.array([K[:,t]]))
-
-    return a, P, K, F, v
+    return _general_kalman(y, Z, False, np.ravel(H), T, Q, R, np.ravel(mu), 0.0, output)
 
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.cdivision(True)
 def dl_univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z, np.ndarray[double,ndim=2] H,
-    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu):
+    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu, output='full'):
     """ Kalman filtering and smoothing for univariate time series
 
     Notes
@@ -665,6 +1957,11 @@ def dl_univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z,
     mu : float
         Constant term for measurement equation
 
+    output : str (default : 'full')
+        Which quantities to return: 'full', 'mean' (the smoothed states only, computed
+        without storing the state variances) or 'score' (the log likelihood and its
+        gradient with respect to H and Q, from one smoothing pass)
+
     Returns
     ----------
     alpha : np.array
@@ -672,8 +1969,25 @@ def dl_univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z,
 
     V : np.array
         Variance of smoothed states
+
+    For output 'score': the log likelihood, its derivative with respect to H and the
+    matrix of its derivatives with respect to the elements of Q
     """     
 
+    _check_output(output, GAUSSIAN_SMOOTHER_OUTPUTS)
+
+    if _is_dynamic_regression(T, Q, R):
+        if output == 'score':
+            _, _, K_s, F_s, v_s, loglik = _dynreg_filter_arrays(y, Z, np.ones(y.shape[0])*H.ravel()[0], Q, R,
+                np.ones(y.shape[0])*mu, 0, True, False, False, True)
+            return _score_output(Z, True, T, R, K_s, F_s, v_s, loglik)
+        return _dynreg_smoother(y, Z, np.ones(y.shape[0])*H.ravel()[0], Q, R, np.ones(y.shape[0])*mu, True, 1, output)
+
+    if output == 'score':
+        _, _, K_s, F_s, v_s, loglik = _general_filter_arrays(y, Z, True, np.ones(y.shape[0])*H.ravel()[0], T, Q, R,
+            np.ones(y.shape[0])*mu, 0.0, False, False, True)
+        return _score_output(Z, True, T, R, K_s, F_s, v_s, loglik)
+
     # Filtering matrices
     cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1), dtype=np.float64) 
     cdef np.ndarray[double, ndim=3, mode="c"] P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1), dtype=np.float64)*(10**7) # diffuse prior asumed
@@ -727,13 +2041,15 @@ def dl_univariate_KFS(np.ndarray[double,ndim=1] y, np.ndarray[double,ndim=2] Z,
             alpha[:,t] = a[:,t]
             V[:,:,t] = P[:,:,t]            
 
+    if output == 'mean':
+        return alpha
     return alpha, V
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.cdivision(True)
 def dl_univariate_kalman(np.ndarray[double,ndim=1] y,np.ndarray[double,ndim=2] Z, np.ndarray[double,ndim=2] H,
-    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu):
+    np.ndarray[double,ndim=2] T, np.ndarray[double,ndim=2] Q, np.ndarray[double,ndim=2] R, double mu, output='full'):
     """ Kalman filtering for univariate time series
 
     Notes
@@ -765,6 +2081,10 @@ def dl_univariate_kalman(np.ndarray[double,ndim=1] y,np.ndarray[double,ndim=2] Z
     mu : float
         Constant term for measurement equation
 
+    output : str (default : 'full')
+        Which quantities to return: 'full', 'loglik' (the log likelihood only), 'last'
+        (the final state and its variance only) or 'mean' (the filtered states only)
+
     Returns
     ----------
     a : np.array
@@ -783,27 +2103,12 @@ def dl_univariate_kalman(np.ndarray[double,ndim=1] y,np.ndarray[double,ndim=2] Z
         Residuals
     """         
 
-    cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1), dtype=np.float64) 
-    cdef np.ndarray[double, ndim=3, mode="c"] P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1), dtype=np.float64)*(10**7) # diffuse prior asumed
-
-    cdef np.ndarray[double, ndim=2, mode="c"] K = np.zeros((a.shape[0],y.shape[0]), dtype=np.float64)
-    cdef np.ndarray[double, ndim=1, mode="c"] v = np.zeros(y.shape[0], dtype=np.float64)
-    cdef np.ndarray[double, ndim=3, mode="c"] F = np.zeros((H.shape[0],H.shape[1],y.shape[0]), dtype=np.float64)
-
-    cdef Py_ssize_t t
-
-    for t in range(0,y.shape[0]):
-        v[t] = y[t] - np.dot(Z[t],a[:,t]) - mu
+    _check_output(output, FILTER_OUTPUTS)
 
-        F[:,:,t] = np.dot(np.dot(Z[t],P[:,:,t]),Z[t].T) + H.ravel()[0]
+    if _is_dynamic_regression(T, Q, R):
+        return _dynreg_kalman(y, Z, np.ones(y.shape[0])*H.ravel()[0], Q, R, np.ones(y.shape[0])*mu, 0, output)
 
-        K[:,t] = np.dot(np.dot(T,P[:,:,t]),Z[t].T)/(F[:,:,t]).ravel()[0]
-
-        a[:,t+1] = np.dot(T,a[:,t]) + np.dot(K[:,t],v[t]) 
-
-        P[:,:,t+1] = np.dot(np.dot(T,P[:,:,t]),T.T) + np.dot(np.dot(R,Q),R.T) - F[:,:,t].ravel()[0]*np.dot(np.array([K[:,t]]).T,np.array([K[:,t]]))
-
-    return a, P, K, F, v
+    return _general_kalman(y, Z, True, np.ones(y.shape[0])*H.ravel()[0], T, Q, R, np.ones(y.shape[0])*mu, 0.0, output)
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
@@ -850,6 +2155,9 @@ def dl_univariate_kalman_fcst(np.ndarray[double,ndim=1] y, np.ndarray[double,ndi
         Variance of forecasted states
     """         
 
+    if _is_dynamic_regression(T, Q, R):
+        return _dynreg_kalman(y, Z, np.ones(y.shape[0])*H.ravel()[0], Q, R, np.ones(y.shape[0])*mu, h, 'full')[:2]
+
     cdef np.ndarray[double, ndim=2, mode="c"] a = np.zeros((T.shape[0],y.shape[0]+1+h), dtype=np.float64)
     cdef np.ndarray[double, ndim=3, mode="c"] P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1+h), dtype=np.float64)*(10**7) # diffuse prior asumed
 
@@ -875,7 +2183,7 @@ def dl_univariate_kalman_fcst(np.ndarray[double,ndim=1] y, np.ndarray[double,ndi
 
     return a, P
 
-def nld_univariate_KFS(y,Z,H,T,Q,R,mu):
+def nld_univariate_KFS(y,Z,H,T,Q,R,mu,output='full'):
     """ Kalman filtering and smoothing for univariate time series
     Notes
     ----------
@@ -897,6 +2205,9 @@ def nld_univariate_KFS(y,Z,H,T,Q,R,mu):
         Scale matrix for state equation covariance matrix
     mu : float
         Constant term for measurement equation
+    output : str (default : 'full')
+        Which quantities to return: 'full' or 'mean' (the smoothed states only, computed
+        without storing the state variances)
     Returns
     ----------
     alpha : np.array
@@ -905,6 +2216,11 @@ def nld_univariate_KFS(y,Z,H,T,Q,R,mu):
         Variance of smoothed states
     """     
 
+    _check_output(output, SMOOTHER_OUTPUTS)
+
+    if _is_dynamic_regression(T, Q, R):
+        return _dynreg_smoother(y, Z, np.ravel(H), Q, R, np.ravel(mu), False, 0, output)
+
     # Filtering matrices
     a = np.zeros((T.shape[0],y.shape[0]+1)) # Initialization
     P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1))*(10**7) # diffuse prior asumed
@@ -947,9 +2263,11 @@ def nld_univariate_KFS(y,Z,H,T,Q,R,mu):
             alpha[:,t] = a[:,t]
             V[:,:,t] = P[:,:,t] 
 
+    if output == 'mean':
+        return alpha
     return alpha, V
 
-def nld_univariate_kalman(y,Z,H,T,Q,R,mu):
+def nld_univariate_kalman(y,Z,H,T,Q,R,mu,output='full'):
     """ Kalman filtering for univariate time series
     Notes
     ----------
@@ -971,6 +2289,9 @@ def nld_univariate_kalman(y,Z,H,T,Q,R,mu):
         Scale matrix for state equation covariance matrix
     mu : float
         Constant term for measurement equation
+    output : str (default : 'full')
+        Which quantities to return: 'full', 'loglik' (the log likelihood only), 'last'
+        (the final state and its variance only) or 'mean' (the filtered states only)
     Returns
     ----------
     a : np.array
@@ -985,25 +2306,12 @@ def nld_univariate_kalman(y,Z,H,T,Q,R,mu):
         Residuals
     """         
 
-    a = np.zeros((T.shape[0],y.shape[0]+1)) 
-    P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1))*(10**7) # diffuse prior asumed
+    _check_output(output, FILTER_OUTPUTS)
 
-    K = np.zeros((a.shape[0],y.shape[0]))
-    v = np.zeros(y.shape[0])
-    F = np.zeros((H.shape[0],H.shape[1],y.shape[0]))
+    if _is_dynamic_regression(T, Q, R):
+        return _dynreg_kalman(y, Z, np.ravel(H), Q, R, np.ravel(mu), 0, output)
 
-    for t in range(0,y.shape[0]):
-        v[t] = y[t] - np.dot(Z[t],a[:,t]) - mu[t]
-
-        F[:,:,t] = np.dot(np.dot(Z[t],P[:,:,t]),Z[t].T) + H[t].ravel()[0]
-
-        K[:,t] = np.dot(np.dot(T,P[:,:,t]),Z[t].T)/(F[:,:,t]).ravel()[0]
-
-        a[:,t+1] = np.dot(T,a[:,t]) + np.dot(K[:,t],v[t]) 
-
-        P[:,:,t+1] = np.dot(np.dot(T,P[:,:,t]),T.T) + np.dot(np.dot(R,Q),R.T) - F[:,:,t].ravel()[0]*np.dot(np.array([K[:,t]]).T,np.array([K[:,t]]))
-
-    return a, P, K, F, v
+    return _general_kalman(y, Z, True, np.ravel(H), T, Q, R, np.ravel(mu), 0.0, output)
 
 def nld_univariate_kalman_fcst(y,Z,H,T,Q,R,mu,h):
     """ Kalman filtering for univariate time series
@@ -1035,6 +2343,9 @@ def nld_univariate_kalman_fcst(y,Z,H,T,Q,R,mu,h):
         Variance of forecasted states
     """         
 
+    if _is_dynamic_regression(T, Q, R):
+        return _dynreg_kalman(y, Z, np.ravel(H), Q, R, np.ravel(mu), h, 'full')[:2]
+
     a = np.zeros((T.shape[0],y.shape[0]+1+h))
     P = np.ones((a.shape[0],a.shape[0],y.shape[0]+1+h))*(10**7) # diffuse prior asumed
 
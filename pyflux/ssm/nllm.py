@@ -19,6 +19,8 @@ from .. import results as res
 from .. import gas as gas
 
 from .kalman import *
+from .importance import *
+from .particle import *
 from .llm import *
 
 class NLLEV(tsm.TSM):
@@ -50,7 +52,7 @@ class NLLEV(tsm.TSM):
         self.integ = integ
         self.max_lag = 0
         self._z_hide = 0 # Whether to cutoff variance latent variables from results
-        self.supported_methods = ["MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["MLE","BBVI"]
         self.default_method = "MLE"
         self.multivariate_model = False
         self.state_no = 1
@@ -99,19 +101,29 @@ class NLLEV(tsm.TSM):
 
         self.latent_variables.add_z('Sigma^2 level',ifr.Uniform(transform='exp'),dst.q_Normal(0,3))
 
-    def _get_scale_and_shape(self):
+    def _get_scale_and_shape(self,beta=None):
         """ Retrieves the scale and shape for the model
 
+        Parameters
+        ----------
+        beta : np.array (default : None)
+            Untransformed latent variables to use; if None, the current estimates are used
+
         Returns
         ----------
         Scale (float) and shape (float)
         """
+        if beta is None:
+            z = self.latent_variables.get_z_values(transformed=True)
+        else:
+            z = np.array([self.latent_variables.z_list[i].prior.transform(beta[i]) for i in range(len(beta))])
+
         if self.dist == 't':
-            return self.latent_variables.get_z_values(transformed=True)[-2],self.latent_variables.get_z_values(transformed=True)[-1],0
+            return z[-2],z[-1],0
         elif self.dist == 'Laplace':
-            return self.latent_variables.get_z_values(transformed=True)[-1],0,0
+            return z[-1],0,0
         elif self.dist == 'skewt':
-            return self.latent_variables.get_z_values(transformed=True)[-2],self.latent_variables.get_z_values(transformed=True)[-1],self.latent_variables.get_z_values(transformed=True)[-3]
+            return z[-2],z[-1],z[-3]
         else:
             return 0, 0, 0
 
@@ -282,6 +294,46 @@ class NLLEV(tsm.TSM):
 
         return H, mu
 
+    def _mode_approximating_model(self,beta,T,Z,R,Q):
+        """ Creates approximating Gaussian model at the posterior mode of the states
+
+        Notes
+        ----------
+        Alternates between smoothing the approximating model and re-approximating the
+        measurement density about the smoothed signal (see importance.approximating_model)
+        until the signal stops changing.
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for latent variables
+
+        T, Z, R, Q : np.array
+            State space matrices used in KFS algorithm
+
+        Returns
+        ----------
+
+        H : np.array
+            Approximating measurement variance matrix
+
+        mu : np.array
+            Approximating measurement constants
+        """     
+
+        scale, shape, skewness = self._get_scale_and_shape(beta)
+        signal = initial_signal(self.dist, self.data)
+
+        for it in range(100):
+            H, mu = approximating_model(self.dist, self.data, signal, scale, shape, skewness)
+            alpha = nl_univariate_KFS(self.data,Z,H,T,Q,R,mu,output='mean')
+            tol = np.max(np.abs(alpha[0] - signal))
+            signal = alpha[0]
+            if tol < 10**-10:
+                break
+
+        return approximating_model(self.dist, self.data, signal, scale, shape, skewness)
+
     @classmethod
     def Exponential(cls,data,integ=0,target=None):
         """ Creates Exponential-distributed state space model
@@ -612,7 +664,74 @@ class NLLEV(tsm.TSM):
         states[0,:] = beta[self.param_no:self.param_no+self.data.shape[0]] 
         return -self.loglik(beta[:self.param_no],states) 
 
-    def fit(self,optimizer='RMSProp',iterations=1000,print_progress=True,start_diffuse=False,**kwargs):
+    def neg_loglik_importance(self,beta):
+        """ Creates negative loglikelihood of the model by importance sampling
+
+        Notes
+        ----------
+        States are simulated from the approximating model at the mode in antithetic pairs;
+        the likelihood is that of the approximating model times the mean of the weights
+        p(y|theta)/g(y|theta) (Durbin and Koopman, 2012, section 11.4). The same standard
+        normal draws are used on every call, so the estimate is smooth in beta.
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for latent variables
+
+        Returns
+        ----------
+        Negative loglikelihood
+        """     
+
+        T, Z, R, Q = self._ss_matrices(beta)
+        H, mu = self._mode_approximating_model(beta,T,Z,R,Q)
+
+        if not hasattr(self, '_importance_rnd') or self._importance_rnd.shape[1:] != (self.data.shape[0],T.shape[0]+1):
+            self._importance_rnd = importance_draws(100, self.data.shape[0], T.shape[0])
+
+        alpha_hat = nl_univariate_KFS(self.data,Z,H,T,Q,R,mu,output='mean')
+        alpha_plus = simulate_states(T, R, Q, self._importance_rnd)
+        y_plus = alpha_plus[:,0,:] + np.sqrt(H)*self._importance_rnd[:,:,-1]
+        y_tilde = self.data - mu
+
+        log_weights = []
+        for i in range(alpha_plus.shape[0]):
+            # By linearity of the smoother, alpha_hat - alpha_hat_plus is the smooth of y - y_plus
+            alpha_tilde = alpha_plus[i] + nl_univariate_KFS(self.data - y_plus[i],Z,H,T,Q,R,mu,output='mean')
+            for alpha in [alpha_tilde, 2*alpha_hat - alpha_tilde]:
+                log_weights.append(self.meas_likelihood(beta,alpha) 
+                    - np.sum(ss.norm.logpdf(y_tilde,loc=alpha[0],scale=np.sqrt(H))))
+
+        return -importance_loglik(nl_univariate_kalman(self.data,Z,H,T,Q,R,mu,output='loglik'), np.array(log_weights))
+
+    def log_p_state_gradient(self,beta):
+        """ Creates gradient of the log posterior with respect to the states
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for latent variables, followed by the states
+
+        Returns
+        ----------
+        Gradient, with one row per state
+        """     
+
+        states = np.zeros([self.state_no, self.data.shape[0]])
+        states[0,:] = beta[self.param_no:self.param_no+self.data.shape[0]]
+        _, _, _, Q = self._ss_matrices(beta)
+        scale, shape, skewness = self._get_scale_and_shape(beta[:self.param_no])
+
+        # The state likelihood treats each state as a random walk
+        residuals = np.diff(states,axis=1)/np.diag(Q)[:,np.newaxis]
+        gradient = np.zeros(states.shape)
+        gradient[:,1:] -= residuals
+        gradient[:,:-1] += residuals
+        gradient[0] += measurement_score(self.dist,self.data,states[0],scale,shape,skewness)
+        return gradient
+
+    def fit(self,optimizer='RMSProp',iterations=1000,print_progress=True,start_diffuse=False,method='BBVI',structured=False,**kwargs):
         """ Fits the model
 
         Parameters
@@ -628,12 +747,27 @@ class NLLEV(tsm.TSM):
         
         start_diffuse : bool
             Whether to start from diffuse values (if not: use approx Gaussian)
+
+        method : str (default : 'BBVI')
+            'BBVI', or 'MLE' to maximize the importance sampling loglikelihood
+            (other keyword arguments are passed to _importance_fit)
+
+        structured : bool (default : False)
+            Whether BBVI uses a Gauss-Markov family for the states (see ifr.SBBVI) rather
+            than a mean-field family
         
         Returns
         ----------
-        BBVI fit object
+        BBVI fit object, or MLEResults object if method is 'MLE'
         """     
 
+        if method == 'MLE':
+            return self._importance_fit(**kwargs)
+        elif method != 'BBVI':
+            raise ValueError("Method not supported!")
+        elif structured is True:
+            return self._sbbvi_fit(optimizer=optimizer,iterations=iterations,print_progress=print_progress,**kwargs)
+
         return self._bbvi_fit(self.neg_logposterior,optimizer=optimizer,print_progress=print_progress,
             start_diffuse=start_diffuse,iterations=iterations,**kwargs)
 
@@ -722,6 +856,93 @@ class NLLEV(tsm.TSM):
             method='BBVI',ses=q_ses[:self.param_no],signal=theta,scores=scores,
             z_hide=self._z_hide,max_lag=self.max_lag,states=states,states_var=np.power(states_ses,2))
 
+    def _gauss_markov_approximation(self,beta):
+        """ Creates the mean and precision of the states under the approximating model at the mode
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for latent variables
+
+        Returns
+        ----------
+        Smoothed states, and the lower band of their precision (see importance.state_precision)
+        """
+
+        T, Z, R, Q = self._ss_matrices(beta)
+        H, mu = self._mode_approximating_model(beta,T,Z,R,Q)
+        a = nl_univariate_KFS(self.data,Z,H,T,Q,R,mu,output='mean')
+        return a, state_precision(np.identity(self.state_no),Q,np.ravel(Z),H,self.data.shape[0])
+
+    def _sbbvi_fit(self,optimizer='RMSProp',iterations=1000,print_progress=True,**kwargs):
+        """ Performs Black Box Variational Inference with a Gauss-Markov family for the states
+
+        Parameters
+        ----------
+        optimizer : string
+            Stochastic optimizer: either RMSProp or ADAM.
+
+        iterations: int
+            How many iterations to run
+
+        print_progress : bool
+            Whether tp print the ELBO progress or not
+
+        Returns
+        ----------
+        BBVIResults object
+        """
+
+        phi = self.latent_variables.get_z_starting_values()
+        a, precision = self._gauss_markov_approximation(phi)
+
+        sbbvi_obj = ifr.SBBVI(self.neg_logposterior,self.log_p_state_gradient,phi,a,precision,
+            optimizer=optimizer,iterations=iterations,refresh=self._gauss_markov_approximation,**kwargs)
+
+        if print_progress is False:
+            sbbvi_obj.printer = False
+
+        z_means, z_log_scales, states, states_var = sbbvi_obj.run()
+
+        self.latent_variables.set_z_values(z_means,'BBVI',np.exp(z_log_scales),None)
+        for k in range(len(self.latent_variables.z_list)):
+            self.latent_variables.z_list[k].q = dst.q_Normal(z_means[k],z_log_scales[k])
+
+        theta = states[0]
+        X_names = None
+        self.states = states[0]
+        self.states_ses = np.sqrt(states_var[0])
+
+        return res.BBVISSResults(data_name=self.data_name,X_names=X_names,model_name=self.model_name,
+            model_type=self.model_type, latent_variables=self.latent_variables,data=self.data,index=self.index,
+            multivariate_model=self.multivariate_model,objective=self.neg_logposterior(np.append(z_means,states.ravel())),
+            method='BBVI',ses=z_log_scales,signal=theta,scores=None,
+            z_hide=self._z_hide,max_lag=self.max_lag,states=states[0],states_var=states_var[0])
+
+    def _importance_fit(self,nsims=100,**kwargs):
+        """ Fits the model by maximizing the importance sampling loglikelihood
+
+        Parameters
+        ----------
+        nsims : int (default : 100)
+            Number of importance samples, drawn as antithetic pairs
+
+        Returns
+        ----------
+        MLEResults object
+        """
+
+        phi = kwargs.get('start',self.latent_variables.get_z_starting_values()).copy()
+        T, Z, R, Q = self._ss_matrices(phi)
+        self._importance_rnd = importance_draws(nsims, self.data.shape[0], T.shape[0])
+
+        p = optimize.minimize(self.neg_loglik_importance, phi, method='L-BFGS-B', options={'eps': 10**-5})
+        results = self._mle_results(p, self.neg_loglik_importance, 'MLE')
+
+        self.states = results.states
+        self.states_ses = np.sqrt(results.states_var)
+        return results
+
     def exponential_likelihood(self,beta,alpha):
         """ Creates Exponential loglikelihood of the data given the states
 
@@ -737,7 +958,7 @@ class NLLEV(tsm.TSM):
         ----------
         Exponential loglikelihood
         """     
-        return np.sum(ss.expon.logpdf(self.data,1/np.exp(alpha[0])))
+        return np.sum(ss.expon.logpdf(self.data,scale=1/np.exp(alpha[0])))
 
     def exponential_likelihood_markov_blanket(self,beta,alpha):
         """ Creates Expnonential Markov blanket for each state
@@ -754,7 +975,7 @@ class NLLEV(tsm.TSM):
         ----------
         Exponential loglikelihood
         """     
-        return ss.expon.logpdf(self.data,1/np.exp(alpha[0]))
+        return ss.expon.logpdf(self.data,scale=1/np.exp(alpha[0]))
 
     def laplace_likelihood(self,beta,alpha):
         """ Creates Poisson loglikelihood of the data given the states
@@ -1194,7 +1415,7 @@ class NLLEV(tsm.TSM):
         plt.legend(loc=2)   
         plt.show()          
 
-    def simulation_smoother(self,beta):
+    def simulation_smoother(self,beta,n_draws=None):
         """ Durbin and Koopman simulation smoother - simulates from states 
         given model latent variables and observations
 
@@ -1204,37 +1425,19 @@ class NLLEV(tsm.TSM):
         beta : np.array
             Contains untransformed starting values for latent variables
 
+        n_draws : int (default : None)
+            Number of state evolutions to simulate; if None, a single one is returned
+
         Returns
         ----------
-        - A simulated state evolution
+        - np.array (m x T) of a simulated state evolution, or (n_draws x m x T) of n_draws of
+        them if n_draws is given
         """         
 
         T, Z, R, Q = self._ss_matrices(beta)
         H, mu = self._approximating_model(beta,T,Z,R,Q)
-
-        # Generate e_t+ and n_t+
-        rnd_h = np.random.normal(0,np.sqrt(H),self.data.shape[0])
-        q_dist = ss.multivariate_normal([0.0], Q)
-        rnd_q = q_dist.rvs(self.data.shape[0])
-
-        # Generate a_t+ and y_t+
-        a_plus = np.zeros((T.shape[0],self.data.shape[0])) 
-        y_plus = np.zeros(self.data.shape[0])
-
-        for t in range(0,self.data.shape[0]):
-            if t == 0:
-                a_plus[:,t] = np.dot(T,a_plus[:,t]) + rnd_q[t]
-                y_plus[t] = mu[t] + np.dot(Z,a_plus[:,t]) + rnd_h[t]
-            else:
-                if t != self.data.shape[0]:
-                    a_plus[:,t] = np.dot(T,a_plus[:,t-1]) + rnd_q[t]
-                    y_plus[t] = mu[t] + np.dot(Z,a_plus[:,t]) + rnd_h[t]
-
-        alpha_hat, _ = self.smoothed_state(self.data,beta, H, mu)
-        alpha_hat_plus, _ = self.smoothed_state(y_plus,beta, H, mu)
-        alpha_tilde = alpha_hat - alpha_hat_plus + a_plus
-        
-        return alpha_tilde
+        draws = simulation_smoother_draws(self.data, Z, H, T, Q, R, mu, 1 if n_draws is None else n_draws)
+        return draws[0] if n_draws is None else draws
 
     def smoothed_state(self,data,beta, H, mu):
         """ Creates smoothed state estimate given state matrices and 
@@ -1258,6 +1461,67 @@ class NLLEV(tsm.TSM):
         alpha, V = nl_univariate_KFS(data,Z,H,T,Q,R,mu)
         return alpha, V
 
+    def _mode_smoothed_state(self,beta):
+        """ Creates smoothed state estimate from the approximating model at the posterior mode
+
+        Parameters
+        ----------
+
+        beta : np.array
+            Contains untransformed starting values for latent variables
+
+        Returns
+        ----------
+        - Signal, smoothed states and smoothed state variances
+        """         
+
+        T, Z, R, Q = self._ss_matrices(beta)
+        H, mu = self._mode_approximating_model(beta,T,Z,R,Q)
+        alpha, V = self.smoothed_state(self.data,beta,H,mu)
+        return alpha[0], alpha[0], V[0][0]
+
+    def particle_filter(self,beta=None,nparticles=1000,auxiliary=False,ess_threshold=0.5,quantiles=[0.05,0.5,0.95]):
+        """ Runs a particle filter over the data
+
+        Parameters
+        ----------
+        beta : np.array (default : None)
+            Untransformed latent variables to use; if None, the current estimates (or the starting values) are used
+
+        nparticles : int (default : 1000)
+            Number of particles
+
+        auxiliary : boolean (default : False)
+            Whether to use the auxiliary particle filter rather than the bootstrap filter
+
+        ess_threshold : float (default : 0.5)
+            Share of nparticles below which the effective sample size triggers resampling
+
+        quantiles : list (default : [0.05,0.5,0.95])
+            Quantiles of the filtered states to store
+
+        Returns
+        ----------
+        ParticleFilter object, holding the loglikelihood estimate, filtered states and
+        filtered quantiles; further observations can be passed to its update method
+        """
+
+        if beta is None:
+            if self.latent_variables.estimated is True:
+                beta = self.latent_variables.get_z_values()
+            else:
+                beta = self.latent_variables.get_z_starting_values()
+
+        T, Z, R, Q = self._ss_matrices(beta)
+        scale, shape, skewness = self._get_scale_and_shape(beta)
+        signal = initial_signal(self.dist, self.data)
+        a0 = np.array([np.mean(signal[0:5])])
+
+        filt = ParticleFilter(T, R, Q, self.dist, scale, shape, skewness, a0, np.identity(T.shape[0])*np.var(signal),
+            nparticles=nparticles, ess_threshold=ess_threshold, auxiliary=auxiliary, quantiles=quantiles)
+        filt.filter(self.data, np.ravel(Z))
+        return filt
+
 
 # TO DO - INTEGRATE THIS INTO EXISTING CODE MORE CLEANLY
 
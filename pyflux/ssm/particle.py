@@ -0,0 +1,261 @@
+import numpy as np
+import scipy.stats as ss
+from scipy.special import gammaln
+
+def measurement_logpdf(dist, y, signal, scale=0.0, shape=0.0, skewness=0.0):
+    """ Log-density of one observation for every particle's signal
+
+    Parameters
+    ----------
+    dist : str
+        Measurement density of the model
+
+    y : float
+        The observation
+
+    signal : np.array
+        Signal of each particle
+
+    scale, shape, skewness : float
+        Transformed measurement latent variables (see _get_scale_and_shape)
+
+    Returns
+    ----------
+    - np.array of log p(y|signal) for each particle
+    """
+
+    if dist == 'Poisson':
+        return y*signal - np.exp(signal) - gammaln(y + 1.0)
+    elif dist == 'Exponential':
+        return signal - y*np.exp(signal)
+    elif dist == 'Laplace':
+        return -np.log(2.0*scale) - np.abs(y - signal)/scale
+    elif dist == 't':
+        return ss.t.logpdf(y - signal, df=shape, scale=scale)
+    elif dist == 'skewt':
+        x = y - signal
+        return (np.log(2.0) - np.log(skewness + 1.0/skewness)
+            + ss.t.logpdf(np.where(x < 0, x*skewness, x/skewness), df=shape, scale=scale))
+    elif dist == 'Normal':
+        return ss.norm.logpdf(y - signal, scale=scale)
+    else:
+        raise ValueError("No measurement density for the " + str(dist) + " distribution!")
+
+def measurement_score(dist, y, signal, scale=0.0, shape=0.0, skewness=0.0):
+    """ Derivative of the measurement log-density with respect to the signal
+
+    Parameters
+    ----------
+    dist : str
+        Measurement density of the model
+
+    y : float or np.array
+        The observations
+
+    signal : np.array
+        The signal
+
+    scale, shape, skewness : float
+        Transformed measurement latent variables (see _get_scale_and_shape)
+
+    Returns
+    ----------
+    - np.array of d log p(y|signal) / d signal
+    """
+
+    if dist == 'Poisson':
+        return y - np.exp(signal)
+    elif dist == 'Exponential':
+        return 1.0 - y*np.exp(signal)
+    elif dist == 'Laplace':
+        return np.sign(y - signal)/scale
+    elif dist == 't':
+        x = y - signal
+        return (shape + 1.0)*x/(shape*np.power(scale,2) + np.power(x,2))
+    elif dist == 'skewt':
+        x = y - signal
+        k = np.where(x < 0, skewness, 1.0/skewness)
+        return (shape + 1.0)*np.power(k,2)*x/(shape*np.power(scale,2) + np.power(k*x,2))
+    elif dist == 'Normal':
+        return (y - signal)/np.power(scale,2)
+    else:
+        raise ValueError("No measurement density for the " + str(dist) + " distribution!")
+
+def systematic_resample(weights):
+    """ Systematic resampling of particles
+
+    Parameters
+    ----------
+    weights : np.array
+        Normalized particle weights
+
+    Returns
+    ----------
+    - np.array of the indices of the resampled particles
+    """
+
+    N = weights.shape[0]
+    positions = (np.random.uniform() + np.arange(N))/N
+    cumulative = np.cumsum(weights)
+    cumulative[-1] = 1.0
+    return np.searchsorted(cumulative, positions)
+
+class ParticleFilter(object):
+    """ Bootstrap or auxiliary particle filter for univariate state space models
+
+    Notes
+    ----------
+    y_t ~ p(y_t|Za_t)                                   MEASUREMENT EQUATION
+    a_t = Ta_t-1 + Rn_t    where   n_t ~ N(0,Q)         STATE EQUATION
+
+    Particles are held as an (N x m) array and observations are processed one at a time
+    through update, so the cost per observation is O(N) and the filter can be run online.
+    Q is assumed diagonal, as in the models' _ss_matrices.
+
+    Parameters
+    ----------
+    T, R, Q : np.array
+        State space matrices used in KFS algorithm
+
+    dist : str
+        Measurement density of the model
+
+    scale, shape, skewness : float
+        Transformed measurement latent variables (see _get_scale_and_shape)
+
+    a0 : np.array
+        Mean of the initial state
+
+    P0 : np.array
+        Variance matrix of the initial state
+
+    nparticles : int (default : 1000)
+        Number of particles
+
+    ess_threshold : float (default : 0.5)
+        Particles are resampled when the effective sample size falls below this share of
+        nparticles (the auxiliary filter resamples every observation)
+
+    auxiliary : boolean (default : False)
+        Whether to use the auxiliary particle filter, which resamples on the likelihood of
+        the predicted signal before propagating
+
+    quantiles : list (default : [0.05, 0.5, 0.95])
+        Quantiles of the filtered states to store
+    """
+
+    def __init__(self, T, R, Q, dist, scale, shape, skewness, a0, P0, nparticles=1000,
+        ess_threshold=0.5, auxiliary=False, quantiles=[0.05, 0.5, 0.95]):
+        self.T = T
+        self.R = R
+        self.Q_sd = np.sqrt(np.diag(Q))
+        self.dist = dist
+        self.scale = scale
+        self.shape = shape
+        self.skewness = skewness
+        self.nparticles = nparticles
+        self.ess_threshold = ess_threshold
+        self.auxiliary = auxiliary
+        self.quantiles = np.array(quantiles)
+
+        self.particles = np.random.multivariate_normal(a0, P0, nparticles)
+        self.log_weights = np.ones(nparticles)*-np.log(nparticles)
+        self._started = False
+
+        self.loglik = 0.0
+        self.filtered_states = []
+        self.filtered_quantiles = []
+        self.ess = []
+
+    def _propagate(self, particles):
+        eta = np.random.normal(0, 1, particles.shape)*self.Q_sd
+        return np.dot(particles, self.T.T) + np.dot(eta, self.R.T)
+
+    def _logpdf(self, y, signal):
+        return measurement_logpdf(self.dist, y, signal, self.scale, self.shape, self.skewness)
+
+    def _weighted_quantiles(self, weights):
+        quantiles = np.zeros((self.quantiles.shape[0], self.particles.shape[1]))
+        for i in range(self.particles.shape[1]):
+            order = np.argsort(self.particles[:,i])
+            cumulative = np.cumsum(weights[order])
+            quantiles[:,i] = self.particles[order,i][np.minimum(np.searchsorted(cumulative,
+                self.quantiles*cumulative[-1]), order.shape[0]-1)]
+        return quantiles
+
+    def update(self, y, Z):
+        """ Processes one observation
+
+        Parameters
+        ----------
+        y : float
+            The observation
+
+        Z : np.array
+            Design vector for the states at this observation
+
+        Returns
+        ----------
+        - Loglikelihood contribution of the observation, filtered state means and the
+        filtered state quantiles
+        """
+
+        if self.auxiliary and self._started:
+            predicted_logpdf = self._logpdf(y, np.dot(np.dot(self.particles, self.T.T), Z))
+            first_stage = self.log_weights + predicted_logpdf
+            first_max = np.max(first_stage)
+            first_weights = np.exp(first_stage - first_max)
+            loglik = first_max + np.log(np.sum(first_weights))
+
+            index = systematic_resample(first_weights/np.sum(first_weights))
+            self.particles = self._propagate(self.particles[index])
+            log_weights = self._logpdf(y, np.dot(self.particles, Z)) - predicted_logpdf[index]
+            w_max = np.max(log_weights)
+            loglik += w_max + np.log(np.mean(np.exp(log_weights - w_max)))
+        else:
+            if self._started:
+                self.particles = self._propagate(self.particles)
+            log_weights = self.log_weights + self._logpdf(y, np.dot(self.particles, Z))
+            w_max = np.max(log_weights)
+            loglik = w_max + np.log(np.sum(np.exp(log_weights - w_max)))
+
+        self._started = True
+        self.log_weights = log_weights - (np.max(log_weights) + np.log(np.sum(np.exp(log_weights - np.max(log_weights)))))
+        weights = np.exp(self.log_weights)
+
+        mean = np.dot(weights, self.particles)
+        quantiles = self._weighted_quantiles(weights)
+        ess = 1.0/np.sum(np.power(weights,2))
+
+        if not self.auxiliary and ess < self.ess_threshold*self.nparticles:
+            self.particles = self.particles[systematic_resample(weights)]
+            self.log_weights = np.ones(self.nparticles)*-np.log(self.nparticles)
+
+        self.loglik += loglik
+        self.filtered_states.append(mean)
+        self.filtered_quantiles.append(quantiles)
+        self.ess.append(ess)
+
+        return loglik, mean, quantiles
+
+    def filter(self, y, Z):
+        """ Processes a series of observations
+
+        Parameters
+        ----------
+        y : np.array
+            The time series data
+
+        Z : np.array
+            Design vector for the states, or a matrix with one row per observation
+
+        Returns
+        ----------
+        - Loglikelihood, filtered state means (m x n) and filtered state quantiles
+        (quantiles x m x n) of the observations processed so far
+        """
+
+        for t in range(y.shape[0]):
+            self.update(y[t], Z[t] if Z.ndim == 2 else Z)
+
+        return self.loglik, np.array(self.filtered_states).T, np.transpose(np.array(self.filtered_quantiles),(1,2,0))
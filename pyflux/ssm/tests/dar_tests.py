@@ -108,4 +108,19 @@ def test_predict_is_nans():
 	model = pf.DAR(data=data, ar=2)
 	x = model.fit()
 	x.summary()
-	assert(len(model.predict_is(h=5).values[np.isnan(model.predict_is(h=5).values)]) == 0)
\ No newline at end of file
+	assert(len(model.predict_is(h=5).values[np.isnan(model.predict_is(h=5).values)]) == 0)
+
+def test_constant_variance_positive():
+	"""
+	Tests that the estimated variance of the constant stays positive on a series where an
+	unconstrained search drives it below zero
+	"""
+	noise = np.random.RandomState(13).normal(0,1,100)
+	series = np.zeros(100)
+	for i in range(1,len(series)):
+		series[i] = 0.9*series[i-1] + noise[i]
+	model = pf.DAR(data=series, ar=1)
+	x = model.fit()
+	beta = model.latent_variables.get_z_values()
+	assert(model.latent_variables.z_list[1].prior.transform(beta[1]) > 0)
+	assert(np.isfinite(model.neg_loglik(beta)))
@@ -0,0 +1,52 @@
+import numpy as np
+import pyflux as pf
+from pyflux.ssm.importance import approximating_model, importance_draws, simulate_states, importance_loglik
+
+noise = np.random.normal(0,0.1,200)
+level = np.zeros(200)
+
+for i in range(1,len(level)):
+	level[i] = level[i-1] + noise[i]
+
+countdata = np.random.poisson(3*np.exp(level))
+
+def test_poisson_approximation():
+	"""
+	Tests that the Poisson approximating model matches the first two derivatives of the
+	measurement loglikelihood at the signal
+	"""
+	signal = np.log(countdata + 0.5)
+	H, mu = approximating_model('Poisson', countdata, signal)
+	y_tilde = countdata - mu
+	assert(np.all(H > 0))
+	assert(np.allclose(1.0/H, np.exp(signal)))
+	assert(np.allclose((y_tilde - signal)/H, countdata - np.exp(signal)))
+
+def test_simulate_states():
+	"""
+	Tests that simulated local level states are random walks driven by the draws
+	"""
+	rnd = importance_draws(10, 50, 1)
+	states = simulate_states(np.identity(1), np.identity(1), np.identity(1)*4.0, rnd)
+	assert(states.shape == (5,1,50))
+	assert(np.allclose(np.diff(states[:,0,:],axis=1), 2.0*rnd[:,1:,0]))
+
+def test_importance_loglik():
+	"""
+	Tests that equal weights leave the approximating loglikelihood unchanged
+	"""
+	assert(abs(importance_loglik(-10.0, np.zeros(20)) + 10.0) < 1e-12)
+	assert(abs(importance_loglik(-10.0, np.log(np.array([0.5,1.5]))) + 10.0) < 1e-12)
+
+def test_poisson_mle():
+	"""
+	Tests that the importance sampling estimator gives a finite likelihood, non-nan latent
+	variables, and a likelihood that does not change between evaluations
+	"""
+	model = pf.NLLEV.Poisson(data=countdata)
+	x = model.fit(method='MLE')
+	lvs = np.array([i.value for i in model.latent_variables.z_list])
+	assert(len(lvs[np.isnan(lvs)]) == 0)
+	assert(np.isfinite(x.loglik))
+	beta = model.latent_variables.get_z_values()
+	assert(model.neg_loglik_importance(beta) == model.neg_loglik_importance(beta))
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+import pyflux as pf
+from pyflux.ssm.kalman import univariate_KFS, nl_univariate_KFS, llt_univariate_kalman, univariate_kalman, univariate_kalman_steady, dl_univariate_KFS, dl_univariate_kalman
+
+noise = np.random.normal(0,1,100)
+data = np.zeros(100)
+
+for i in range(1,len(data)):
+	data[i] = data[i-1] + noise[i]
+
+data = data + np.random.normal(0,1,100)
+
+def dense_local_level(y, H, Q, a0, P0):
+	"""
+	Computes the posterior mean and variance of the states of a local level
+	model directly from the joint Gaussian distribution
+	"""
+	n = y.shape[0]
+	C = P0 + Q*np.minimum.outer(np.arange(n),np.arange(n))
+	S = C + H*np.identity(n)
+	mean = a0 + np.dot(C,np.linalg.solve(S,y-a0))
+	var = np.diag(C - np.dot(C,np.linalg.solve(S,C)))
+	return mean, var
+
+def test_llev_smoother():
+	"""
+	Tests that the local level smoother agrees with the exact posterior of the states
+	"""
+	y = data[:30]
+	mean, var = dense_local_level(y, 0.7, 0.4, np.mean(y[0:5]), 10**7)
+	alpha, V = univariate_KFS(y,np.identity(1),np.identity(1)*0.7,np.identity(1),np.identity(1)*0.4,np.identity(1),0.0)
+	assert(alpha.shape == (1,31))
+	assert(np.abs(alpha[0][:-1]-mean).max() < 1e-5)
+	assert(np.abs(V[0][0][:-1]-var).max() < 1e-5)
+
+def test_nl_smoother():
+	"""
+	Tests that the smoother with time-varying measurement variance agrees with the
+	exact posterior of the states
+	"""
+	y = data[:30]
+	alpha, V = nl_univariate_KFS(y,np.identity(1),np.ones(30)*0.7,np.identity(1),np.identity(1)*0.4,np.identity(1),np.zeros(30))
+	mean, var = dense_local_level(y, 0.7, 0.4, 0.0, 10**7)
+	assert(alpha.shape == (1,30))
+	assert(np.abs(alpha[0]-mean).max() < 1e-5)
+	assert(np.abs(V[0][0]-var).max() < 1e-5)
+
+def test_llt_filter_shapes():
+	"""
+	Tests that the local linear trend filter returns arrays of the expected shape
+	"""
+	T = np.identity(2)
+	T[0][1] = 1
+	Z = np.array([1.0,0.0])
+	a, P, K, F, v = llt_univariate_kalman(data,Z,np.identity(1),T,np.identity(2)*0.1,np.identity(2),0.0)
+	assert(a.shape == (2,101))
+	assert(P.shape == (2,2,101))
+	assert(K.shape == (2,100))
+	assert(F.shape == (1,1,100))
+	assert(len(v[np.isnan(v)]) == 0)
+
+def test_steady_state_likelihood():
+	"""
+	Tests that the steady state filter stores fewer variances but gives the same residuals
+	and likelihood contributions as the full filter
+	"""
+	_, _, _, F, v = univariate_kalman(data,np.identity(1),np.identity(1),np.identity(1),np.identity(1),np.identity(1),0.0)
+	_, P_ss, K_ss, F_ss, v_ss = univariate_kalman_steady(data,np.identity(1),np.identity(1),np.identity(1),np.identity(1),np.identity(1),0.0)
+	assert(F_ss.shape[2] < F.shape[2])
+	assert(P_ss.shape[2] == F_ss.shape[2])
+	assert(np.abs(v-v_ss).max() < 1e-8)
+	F_full = np.append(F_ss[0][0], np.ones(v.shape[0]-F_ss.shape[2])*F_ss[0][0][-1])
+	assert(np.abs(np.log(F[0][0]) - np.log(F_full)).max() < 1e-8)
+
+def test_dynamic_regression_smoother():
+	"""
+	Tests that the dynamic regression smoother agrees with the exact posterior of the
+	coefficients
+	"""
+	n, k = 30, 3
+	X = np.ones((n,k))
+	X[:,1:] = np.random.normal(0,1,(n,k-1))
+	Q = np.diag([0.01,0.02,0.005])
+	y = data[:n]
+	C = np.zeros((n*k,n*k))
+	for i in range(n):
+		for j in range(n):
+			C[i*k:(i+1)*k,j*k:(j+1)*k] = 10**7 + Q*min(i,j)
+	G = np.zeros((n,n*k))
+	for t in range(n):
+		G[t,t*k:(t+1)*k] = X[t]
+	S = np.dot(np.dot(G,C),G.T) + 0.25*np.identity(n)
+	mean = np.dot(np.dot(C,G.T),np.linalg.solve(S,y)).reshape(n,k).T
+	var = C - np.dot(np.dot(C,G.T),np.linalg.solve(S,np.dot(G,C)))
+	alpha, V = dl_univariate_KFS(y,X,np.identity(1)*0.25,np.identity(k),Q,np.identity(k),0.0)
+	assert(alpha.shape == (k,n+1))
+	assert(V.shape == (k,k,n+1))
+	assert(np.abs(alpha[:,:-1]-mean).max() < 1e-5)
+	for t in range(1,n):
+		assert(np.abs(V[:,:,t]-var[t*k:(t+1)*k,t*k:(t+1)*k]).max() < 1e-5)
+
+def test_filter_output_modes():
+	"""
+	Tests that the reduced output modes agree with the full filter and smoother
+	"""
+	n, k = 50, 2
+	X = np.ones((n,k))
+	X[:,1] = np.random.normal(0,1,n)
+	Q = np.diag([0.01,0.02])
+	y = data[:n]
+	a, P, K, F, v = dl_univariate_kalman(y,X,np.identity(1)*0.25,np.identity(k),Q,np.identity(k),0.0)
+	loglik = -0.5*np.sum(np.log(2*np.pi*F[0][0]) + v**2/F[0][0])
+	assert(abs(dl_univariate_kalman(y,X,np.identity(1)*0.25,np.identity(k),Q,np.identity(k),0.0,output='loglik') - loglik) < 1e-6)
+	a_last, P_last = dl_univariate_kalman(y,X,np.identity(1)*0.25,np.identity(k),Q,np.identity(k),0.0,output='last')
+	assert(np.abs(a_last-a[:,-1]).max() < 1e-8)
+	assert(np.abs(P_last-P[:,:,-1]).max() < 1e-8)
+	alpha, V = dl_univariate_KFS(y,X,np.identity(1)*0.25,np.identity(k),Q,np.identity(k),0.0)
+	alpha_mean = dl_univariate_KFS(y,X,np.identity(1)*0.25,np.identity(k),Q,np.identity(k),0.0,output='mean')
+	assert(np.abs(alpha_mean[:,1:]-alpha[:,1:]).max() < 1e-5)
+
+def test_general_filter_output_modes():
+	"""
+	Tests that the reduced output modes of the filter for larger states agree with the
+	full filter
+	"""
+	T = np.array([[1.0,1.0,0.0],[0.0,1.0,0.0],[0.0,0.0,0.5]])
+	Z = np.array([1.0,0.0,1.0])
+	Q = np.diag([0.3,0.1,0.2])
+	a, P, K, F, v = llt_univariate_kalman(data,Z,np.identity(1)*0.7,T,Q,np.identity(3),0.0)
+	assert(a.shape == (3,101))
+	assert(P.shape == (3,3,101))
+	assert(K.shape == (3,100))
+	assert(F.shape == (1,1,100))
+	loglik = -0.5*np.sum(np.log(2*np.pi*F[0][0]) + v**2/F[0][0])
+	assert(abs(llt_univariate_kalman(data,Z,np.identity(1)*0.7,T,Q,np.identity(3),0.0,output='loglik') - loglik) < 1e-6)
+	a_last, P_last = llt_univariate_kalman(data,Z,np.identity(1)*0.7,T,Q,np.identity(3),0.0,output='last')
+	assert(np.abs(a_last-a[:,-1]).max() < 1e-8)
+	assert(np.abs(P_last-P[:,:,-1]).max() < 1e-8)
+	assert(np.abs(llt_univariate_kalman(data,Z,np.identity(1)*0.7,T,Q,np.identity(3),0.0,output='mean')-a).max() < 1e-8)
+
+def test_llev_fit():
+	"""
+	Tests that a local level model can be estimated and its latent variables are not nan
+	"""
+	model = pf.LLEV(data=data)
+	x = model.fit()
+	assert(len(model.latent_variables.z_list) == 2)
+	lvs = np.array([i.value for i in model.latent_variables.z_list])
+	assert(len(lvs[np.isnan(lvs)]) == 0)
+
+def check_score(model, beta):
+	"""
+	Checks the likelihood and gradient from neg_loglik_and_grad against neg_loglik and
+	central differences
+	"""
+	neg_loglik, grad = model.neg_loglik_and_grad(beta)
+	assert(abs(neg_loglik - model.neg_loglik(beta)) < 1e-8)
+	for i in range(beta.shape[0]):
+		step = np.zeros(beta.shape[0])
+		step[i] = 1e-4
+		fd = (model.neg_loglik(beta+step) - model.neg_loglik(beta-step))/(2*1e-4)
+		assert(abs(grad[i] - fd) < 1e-3*max(1.0,abs(fd)))
+
+def test_score():
+	"""
+	Tests that the likelihood gradient from the smoother agrees with central differences
+	"""
+	check_score(pf.LLT(data=data), np.array([0.1,-1.0,-3.0]))
+
+def test_score_llev():
+	"""
+	Tests that the local level likelihood gradient agrees with central differences
+	"""
+	check_score(pf.LLEV(data=data), np.array([0.2,-0.5]))
+
+def test_score_dynreg():
+	"""
+	Tests that the dynamic regression likelihood gradient agrees with central differences
+	"""
+	x = np.random.normal(0,1,100)
+	frame = pd.DataFrame({'y' : data + 0.5*x, 'x' : x})
+	check_score(pf.DynReg('y~x', data=frame), np.array([0.1,-2.0,-3.0]))
+
+def test_score_dar():
+	"""
+	Tests that the DAR likelihood gradient agrees with central differences
+	"""
+	check_score(pf.DAR(data=data, ar=2), np.array([0.1,-2.0,-3.0,-4.0]))
+
+def test_batch_likelihood():
+	"""
+	Tests that the batched likelihood agrees with the likelihood of each parameter vector
+	"""
+	model = pf.LLT(data=data)
+	beta = np.random.normal(-1,1,(10,3))
+	batch = model.neg_loglik_batch(beta)
+	assert(batch.shape[0] == 10)
+	for i in range(10):
+		assert(abs(batch[i] - model.neg_loglik(beta[i])) < 1e-8)
+
+def test_em_fit():
+	"""
+	Tests that the EM estimates of a local level model reach the maximum likelihood
+	"""
+	model = pf.LLEV(data=data)
+	x = model.fit('EM', polish=False)
+	mle = pf.LLEV(data=data).fit()
+	assert(x.results.nit > 1)
+	assert(abs(x.loglik - mle.loglik) < 1e-2)
+	polished = pf.LLEV(data=data).fit('EM')
+	assert(abs(polished.loglik - mle.loglik) < 1e-4)
+
+def test_em_fit_integrated():
+	"""
+	Tests that EM counts the observations of the differenced series for an integrated model
+	"""
+	model = pf.LLEV(data=np.cumsum(data), integ=1)
+	x = model.fit('EM', polish=False)
+	mle = pf.LLEV(data=np.cumsum(data), integ=1).fit()
+	assert(abs(x.loglik - mle.loglik) < 1e-2)
+
+def test_em_fit_dynreg():
+	"""
+	Tests that EM climbs towards the maximum likelihood of a dynamic regression, and
+	reaches it once polished
+	"""
+	x = np.random.normal(0,1,100)
+	frame = pd.DataFrame({'y' : data + 0.5*x, 'x' : x})
+	start = pf.DynReg('y~x', data=frame)
+	em = pf.DynReg('y~x', data=frame).fit('EM', polish=False)
+	mle = pf.DynReg('y~x', data=frame).fit()
+	polished = pf.DynReg('y~x', data=frame).fit('EM')
+	assert(-start.neg_loglik(start.latent_variables.get_z_starting_values()) < em.loglik < mle.loglik + 1e-6)
+	assert(abs(polished.loglik - mle.loglik) < 1e-3)
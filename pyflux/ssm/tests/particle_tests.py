@@ -0,0 +1,63 @@
+import numpy as np
+import scipy.stats as ss
+import pyflux as pf
+from pyflux.distributions import skewt
+from pyflux.ssm.particle import measurement_logpdf, systematic_resample, ParticleFilter
+
+noise = np.random.normal(0,0.1,200)
+level = np.zeros(200)
+
+for i in range(1,len(level)):
+	level[i] = level[i-1] + noise[i]
+
+data = level + np.random.normal(0,0.5,200)
+countdata = np.random.poisson(3*np.exp(level))
+
+def test_skewt_logpdf():
+	"""
+	Tests that the fused skew t log-density agrees with the skew t distribution
+	"""
+	signal = np.random.normal(0,1,50)
+	y = np.ones(50)*0.3
+	fused = measurement_logpdf('skewt', 0.3, signal, 1.5, 4.0, 1.2)
+	assert(np.allclose(fused, skewt.logpdf(x=y, df=4.0, loc=signal, scale=1.5, gamma=1.2)))
+
+def test_systematic_resample():
+	"""
+	Tests that systematic resampling keeps each particle floor or ceil of N times its weight
+	"""
+	weights = np.random.uniform(0,1,100)
+	weights = weights/np.sum(weights)
+	counts = np.bincount(systematic_resample(weights), minlength=100)
+	assert(np.sum(counts) == 100)
+	assert(np.all(np.abs(counts - 100*weights) < 1.0))
+
+def test_gaussian_loglik():
+	"""
+	Tests that the particle filter loglikelihood of a Gaussian local level model is close
+	to the exact loglikelihood
+	"""
+	y = data[:30]
+	n = y.shape[0]
+	C = 1.0 + 0.01*np.minimum.outer(np.arange(n),np.arange(n))
+	exact = ss.multivariate_normal.logpdf(y, mean=np.zeros(n), cov=C + 0.25*np.identity(n))
+	for auxiliary in [False, True]:
+		filt = ParticleFilter(np.identity(1), np.identity(1), np.identity(1)*0.01, 'Normal', 0.5, 0, 0,
+			np.zeros(1), np.identity(1), nparticles=20000, auxiliary=auxiliary)
+		loglik, states, quantiles = filt.filter(y, np.ones(1))
+		assert(abs(loglik - exact) < 0.5)
+		assert(states.shape == (1,n))
+		assert(quantiles.shape == (3,1,n))
+		assert(np.all(quantiles[0] <= quantiles[2]))
+
+def test_poisson_filter():
+	"""
+	Tests that the particle filter runs on a Poisson model and accepts new observations
+	"""
+	model = pf.NLLEV.Poisson(data=countdata)
+	filt = model.particle_filter(nparticles=500)
+	assert(np.isfinite(filt.loglik))
+	assert(len(filt.filtered_states) == countdata.shape[0])
+	loglik, mean, quantiles = filt.update(3.0, np.ones(1))
+	assert(np.isfinite(loglik))
+	assert(len(filt.filtered_states) == countdata.shape[0] + 1)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pyflux as pf
+
+noise = np.random.normal(0,0.1,200)
+level = np.zeros(200)
+
+for i in range(1,len(level)):
+	level[i] = level[i-1] + noise[i]
+
+data = level + np.random.normal(0,0.5,200)
+countdata = np.random.poisson(3*np.exp(level))
+x = np.random.normal(0,1,200)
+
+def test_gaussian_draws():
+	"""
+	Tests that the draws of the local level model have the shape (n_draws, m, T) and that
+	their mean and variance agree with the smoothed states
+	"""
+	model = pf.LLEV(data=data)
+	beta = np.array([np.log(0.25),np.log(0.01)])
+	draws = model.simulation_smoother(beta, 2000)
+	alpha, V = model.smoothed_state(model.data,beta)
+	assert(draws.shape == (2000,1,200))
+	assert(np.max(np.abs(np.mean(draws,axis=0) - alpha[:,:200])) < 0.05)
+	assert(np.max(np.abs(np.var(draws[:,0,10:],axis=0)/V[0,0,10:200] - 1)) < 0.25)
+
+def test_non_gaussian_draws():
+	"""
+	Tests that the draws of the non-Gaussian models are centred on the smoothed states of
+	the approximating model, within five Monte Carlo standard errors (up to rounding, as the
+	approximating observation variances can be tiny for large counts)
+	"""
+	for model in [pf.NLLT.Poisson(data=countdata), pf.NDynReg.Poisson('y~x', data=pd.DataFrame({'y' : countdata, 'x' : x}))]:
+		beta = model.latent_variables.get_z_starting_values()
+		T, Z, R, Q = model._ss_matrices(beta)
+		H, mu = model._approximating_model(beta,T,Z,R,Q)
+		alpha, _ = model.smoothed_state(model.data,beta,H,mu)
+		draws = model.simulation_smoother(beta, 1000)
+		assert(draws.shape == (1000,2,200))
+		assert(np.all(np.abs(np.mean(draws,axis=0) - alpha) < 5*np.std(draws,axis=0)/np.sqrt(1000) + 1e-6*np.abs(alpha)))
+
+def test_single_draw_shape():
+	"""
+	Tests that without n_draws a single state evolution of shape (m, T) is returned
+	"""
+	model = pf.LLEV(data=data)
+	assert(model.simulation_smoother(model.latent_variables.get_z_starting_values()).shape == (1,200))
+	model = pf.LLT(data=data)
+	assert(model.simulation_smoother(model.latent_variables.get_z_starting_values()).shape == (2,200))
+	model = pf.NLLT.Poisson(data=countdata)
+	assert(model.simulation_smoother(model.latent_variables.get_z_starting_values()).shape == (2,200))
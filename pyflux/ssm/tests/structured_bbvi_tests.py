@@ -0,0 +1,52 @@
+import numpy as np
+import pyflux as pf
+
+noise = np.random.normal(0,0.1,100)
+level = np.zeros(100)
+
+for i in range(1,len(level)):
+	level[i] = level[i-1] + noise[i]
+
+countdata = np.random.poisson(3*np.exp(level))
+data = level + np.random.standard_t(5,100)
+
+def test_state_gradient():
+	"""
+	Tests that the gradient of the log posterior with respect to the states agrees with
+	finite differences
+	"""
+	model = pf.NLLT.t(data=data)
+	z_no = len(model.latent_variables.z_list)
+	beta = np.append(np.array([-2.0,-4.0,0.0,1.5]), np.random.normal(0,1,2*data.shape[0]))
+	gradient = model.log_p_state_gradient(beta).ravel()
+	for i in np.random.choice(2*data.shape[0],5,replace=False):
+		step = np.zeros(beta.shape[0])
+		step[z_no+i] = 1e-5
+		fd = (model.neg_logposterior(beta-step) - model.neg_logposterior(beta+step))/(2*1e-5)
+		assert(abs(gradient[i] - fd) < 1e-4*max(1.0,abs(fd)))
+
+def test_states_variance():
+	"""
+	Tests that the marginal variances of the Gauss-Markov family agree with the inverse of
+	its precision
+	"""
+	model = pf.NLLT.Poisson(data=countdata)
+	phi = model.latent_variables.get_z_starting_values()
+	a, precision = model._gauss_markov_approximation(phi)
+	sbbvi_obj = pf.inference.SBBVI(model.neg_logposterior,model.log_p_state_gradient,phi,a,precision)
+	_, _, _, band = sbbvi_obj.unpack(sbbvi_obj.parameters)
+	L = np.zeros((band.shape[1],band.shape[1]))
+	for d in range(band.shape[0]):
+		L[np.arange(d,band.shape[1]),np.arange(band.shape[1]-d)] = band[d,:band.shape[1]-d]
+	variance = np.diag(np.linalg.inv(np.dot(L,L.T)))
+	assert(np.allclose(sbbvi_obj.states_variance(sbbvi_obj.parameters), sbbvi_obj.to_states(variance)))
+
+def test_structured_fit():
+	"""
+	Tests that structured BBVI gives non-nan latent variables and positive state variances
+	"""
+	model = pf.NLLEV.Poisson(data=countdata)
+	x = model.fit(structured=True, iterations=100, print_progress=False)
+	lvs = np.array([i.value for i in model.latent_variables.z_list])
+	assert(len(lvs[np.isnan(lvs)]) == 0)
+	assert(np.all(x.states_var > 0))
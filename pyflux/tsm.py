@@ -11,7 +11,7 @@ import numdifftools as nd
 import pandas as pd
 
 from .covariances import acf
-from .inference import BBVI, MetropolisHastings, norm_post_sim, Normal, InverseGamma, Uniform
+from .inference import BBVI, MetropolisHastings, AdaptiveMetropolis, norm_post_sim, Normal, InverseGamma, Uniform
 from .output import TablePrinter
 from .tests import find_p_value
 from .distributions import q_Normal
@@ -75,7 +75,12 @@ class TSM(object):
             scores = None
             states, states_var = self.smoothed_state(self.data,z)
             theta = states[0][:-1]
-            X_names = None  
+            X_names = None
+        elif self.model_type in ['NLLEV','NLLT','NDynReg']:
+            Y = self.data
+            scores = None
+            theta, states, states_var = self._mode_smoothed_state(z)
+            X_names = None
         elif self.model_type in ['GPNARX','GPR','GP']:
             Y = self.data*self._norm_std + self._norm_mean
             scores = None
@@ -138,7 +143,13 @@ class TSM(object):
 
         q_list = [k.q for k in self.latent_variables.z_list]
         
-        bbvi_obj = BBVI(posterior,q_list,batch_size,optimizer,iterations)
+        # Evaluate each batch of draws in one call if the model supports it
+        if hasattr(self, 'neg_loglik_batch') and posterior == self.neg_logposterior:
+            batch_posterior = self.neg_logposterior_batch
+        else:
+            batch_posterior = None
+
+        bbvi_obj = BBVI(posterior,q_list,batch_size,optimizer,iterations,batch_posterior=batch_posterior)
         q, q_z, q_ses = bbvi_obj.run()
         self.latent_variables.set_z_values(q_z,'BBVI',np.exp(q_ses),None)
 
@@ -213,6 +224,9 @@ class TSM(object):
 
         cov_matrix: None or np.array
             Can optionally provide a covariance matrix for M-H.
+
+        adapt : int
+            (AM only) Number of adaptive burn-in iterations; by default nsims/2
         """
         scale = 2.38/np.sqrt(self.z_no)
         # Get Mode and Inverse Hessian information
@@ -233,12 +247,16 @@ class TSM(object):
         if method == "M-H":
             sampler = MetropolisHastings(self.neg_logposterior,scale,nsims,starting_values,cov_matrix=cov_matrix,model_object=None)
             chain, mean_est, median_est, upper_95_est, lower_95_est = sampler.sample()
+        elif method == "AM":
+            sampler = AdaptiveMetropolis(self.neg_logposterior,scale,nsims,starting_values,cov_matrix=cov_matrix,
+                model_object=None,adapt=kwargs.get('adapt',None))
+            chain, mean_est, median_est, upper_95_est, lower_95_est = sampler.sample()
         else:
             raise Exception("Method not recognized!")
 
         if len(self.latent_variables.z_list) == 1:
             chain = self.latent_variables.z_list[0].prior.transform(chain)
-            self.latent_variables.set_z_values(mean_est,'M-H',None,chain)
+            self.latent_variables.set_z_values(mean_est,method,None,chain)
             mean_est = self.latent_variables.z_list[0].prior.transform(mean_est)
             median_est = self.latent_variables.z_list[0].prior.transform(median_est)
             upper_95_est = self.latent_variables.z_list[0].prior.transform(upper_95_est)
@@ -248,7 +266,7 @@ class TSM(object):
             for k in range(len(chain)):
                 chain[k] = self.latent_variables.z_list[k].prior.transform(chain[k])
 
-            self.latent_variables.set_z_values(mean_est,'M-H',None,chain)
+            self.latent_variables.set_z_values(mean_est,method,None,chain)
 
             for k in range(len(chain)):
                 mean_est[k] = self.latent_variables.z_list[k].prior.transform(mean_est[k])
@@ -267,7 +285,7 @@ class TSM(object):
         return MCMCResults(data_name=self.data_name,X_names=X_names,model_name=self.model_name,
             model_type=self.model_type, latent_variables=latent_variables_store,data=Y,index=self.index,
             multivariate_model=self.multivariate_model,objective_object=self.neg_logposterior, 
-            method='Metropolis Hastings',samples=chain,mean_est=mean_est,median_est=median_est,lower_95_est=lower_95_est,
+            method='Adaptive Metropolis' if method == 'AM' else 'Metropolis Hastings',samples=chain,mean_est=mean_est,median_est=median_est,lower_95_est=lower_95_est,
             upper_95_est=upper_95_est,signal=theta,scores=scores, z_hide=self._z_hide,max_lag=self.max_lag,
             states=states,states_var=states_var)
 
@@ -288,11 +306,12 @@ class TSM(object):
         z = res_z.copy()
         cov = self.ols_covariance()
 
-        # Inelegant - needs refactoring
+        # The covariance latent variables are the lower triangle of its Cholesky factor
+        chol = np.linalg.cholesky(cov)
         for i in range(self.ylen):
             for k in range(self.ylen):
                 if i == k or i > k:
-                    z = np.append(z,self.latent_variables.z_list[-1].prior.itransform(cov[i,k]))
+                    z = np.append(z,self.latent_variables.z_list[z.shape[0]].prior.itransform(chol[i,k]))
 
         ihessian = self.estimator_cov('OLS')
         res_ses = np.power(np.abs(np.diag(ihessian)),0.5)
@@ -339,19 +358,53 @@ class TSM(object):
 
         phi = kwargs.get('start',phi).copy() # If user supplied
 
+        # Use the analytic gradient of the likelihood if the model has one
+        if hasattr(self, 'neg_loglik_and_grad') and obj_type == self.neg_loglik:
+            objective, jac = self.neg_loglik_and_grad, True
+        elif hasattr(self, 'neg_loglik_and_grad') and obj_type == self.neg_logposterior:
+            objective, jac = self.neg_logposterior_and_grad, True
+        else:
+            objective, jac = obj_type, None
+
         # Optimize using L-BFGS-B
-        p = optimize.minimize(obj_type, phi, method='L-BFGS-B', options={'gtol': 1e-8})
+        p = optimize.minimize(objective, phi, method='L-BFGS-B', jac=jac, options={'gtol': 1e-8})
         if preoptimized is True:
-            p2 = optimize.minimize(obj_type, self.latent_variables.get_z_starting_values(), method='L-BFGS-B', 
-                options={'gtol': 1e-8})
+            p2 = optimize.minimize(objective, self.latent_variables.get_z_starting_values(), method='L-BFGS-B', 
+                jac=jac, options={'gtol': 1e-8})
             if self.neg_loglik(p2.x) < self.neg_loglik(p.x):
                 p = p2
 
+        return self._mle_results(p, obj_type, method, objective if jac is True else None)
+
+    def _mle_results(self, p, obj_type, method, objective_and_grad=None):
+        """
+        This function stores optimized latent variables and creates the results object
+
+        Parameters
+        ----------
+        p : OptimizeResult
+            Optimizer results; p.x holds the latent variables
+
+        obj_type : method
+            The objective that was minimized (negative log likelihood or log posterior)
+
+        method : str
+            'MLE' or 'PML'
+
+        objective_and_grad : method or None
+            Returns the objective and its gradient; if given, the Hessian is taken as the
+            Jacobian of the gradient, rather than from second differences of the objective
+        """
+
         theta, Y, scores, states, states_var, X_names = self._categorize_model_output(p.x)
 
         # Check that matrix is non-singular; act accordingly
         try:
-            ihessian = np.linalg.inv(nd.Hessian(obj_type)(p.x))
+            if objective_and_grad is not None:
+                hessian = nd.Jacobian(lambda x: objective_and_grad(x)[1])(p.x)
+                ihessian = np.linalg.inv(0.5*(hessian + hessian.T))
+            else:
+                ihessian = np.linalg.inv(nd.Hessian(obj_type)(p.x))
             ses = np.power(np.abs(np.diag(ihessian)),0.5)
             self.latent_variables.set_z_values(p.x,method,ses,None)
             # Change this in future
@@ -380,6 +433,66 @@ class TSM(object):
                 method=method,ihessian=None,signal=theta,scores=scores,
                 z_hide=self._z_hide,max_lag=self.max_lag,states=states,states_var=states_var)
 
+    def _em_fit(self, iterations=1000, tol=1e-8, polish=True, **kwargs):
+        """
+        This function fits models whose latent variables are the measurement variance followed by
+        the state variances, using the Expectation-Maximization algorithm
+
+        Notes
+        ----------
+        Each iteration is one pass of the Kalman filter and smoother. Given the score s of a
+        variance sigma^2 (see neg_loglik_and_grad), the M-step sets it to sigma^2 + 2sigma^4s/n,
+        the mean smoothed square of the n disturbances it governs (Durbin and Koopman, 2012,
+        section 7.3.4). The number of observations n is taken from _filtered_data, the series
+        the smoother runs on.
+
+        Parameters
+        ----------
+        iterations : int
+            Maximum number of EM iterations
+
+        tol : float
+            Relative change in the log likelihood at which the iterations stop
+
+        polish : boolean
+            Whether to finish with L-BFGS-B, started from the EM estimates
+
+        Returns
+        ----------
+        MLEResults object
+        """
+
+        beta = kwargs.get('start', self.latent_variables.get_z_starting_values()).copy()
+        transforms = self.latent_variables.get_z_transforms()
+        itransforms = [z.prior.itransform for z in self.latent_variables.z_list]
+
+        # The measurement variance governs n disturbances, the state variances n-1
+        n = self._filtered_data().shape[0]
+        counts = np.ones(self.z_no)*(n-1)
+        counts[0] = n
+
+        neg_loglik, grad = self.neg_loglik_and_grad(beta)
+        converged = False
+
+        for i in range(iterations):
+            variances = np.array([transforms[k](beta[k]) for k in range(self.z_no)])
+            score = -grad/self.latent_variables.get_z_transform_gradients(beta)
+            variances = variances + 2*np.power(variances,2)*score/counts
+            beta = np.array([itransforms[k](variances[k]) for k in range(self.z_no)])
+
+            neg_loglik_old = neg_loglik
+            neg_loglik, grad = self.neg_loglik_and_grad(beta)
+            if abs(neg_loglik_old - neg_loglik) < tol*(1.0 + abs(neg_loglik)):
+                converged = True
+                break
+
+        if polish is True:
+            return self._optimize_fit(self.neg_loglik, start=beta, preopt_search=False)
+
+        p = optimize.OptimizeResult(x=beta, fun=neg_loglik, jac=grad, nit=i+1, success=converged,
+            message='EM converged' if converged else 'EM reached the iteration limit')
+        return self._mle_results(p, self.neg_loglik, 'MLE', self.neg_loglik_and_grad)
+
     def fit(self, method=None, **kwargs):
         """ Fits a model
 
@@ -409,9 +522,9 @@ class TSM(object):
             return self._optimize_fit(self.neg_loglik, **kwargs)
         elif method == 'PML':
             return self._optimize_fit(self.neg_logposterior, **kwargs)   
-        elif method == 'M-H':
+        elif method == 'M-H' or method == 'AM':
             return self._mcmc_fit(nsims=nsims, method=method, cov_matrix=cov_matrix,
-                map_start=map_start)
+                map_start=map_start, adapt=kwargs.get('adapt', None))
         elif method == "Laplace":
             return self._laplace_fit(self.neg_logposterior) 
         elif method == "BBVI":
@@ -419,6 +532,12 @@ class TSM(object):
                 batch_size=batch_size, map_start=map_start)
         elif method == "OLS":
             return self._ols_fit()          
+        elif method == "EM":
+            return self._em_fit(**kwargs)
+        elif method == "NIW":
+            return self._niw_fit(**kwargs)
+        elif method == "Lasso":
+            return self._lasso_fit(**kwargs)
 
     def neg_logposterior(self,beta):
         """ Returns negative log posterior
@@ -438,6 +557,48 @@ class TSM(object):
             post += -self.latent_variables.z_list[k].prior.logpdf(beta[k])
         return post
 
+    def neg_logposterior_and_grad(self,beta):
+        """ Returns negative log posterior and its gradient, for models with a neg_loglik_and_grad method
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for latent variables
+
+        Returns
+        ----------
+        Negative log posterior and its gradient with respect to beta
+        """
+
+        post, grad = self.neg_loglik_and_grad(beta)
+        eps = 1e-6
+
+        # Prior gradients by central differences - these do not involve the likelihood
+        for k in range(0,self.z_no):
+            prior = self.latent_variables.z_list[k].prior
+            post += -prior.logpdf(beta[k])
+            grad[k] += -(prior.logpdf(beta[k]+eps) - prior.logpdf(beta[k]-eps))/(2*eps)
+        return post, grad
+
+    def neg_logposterior_batch(self,beta):
+        """ Returns negative log posterior for many sets of latent variables, for models with a
+        neg_loglik_batch method
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed latent variables, one set per row
+
+        Returns
+        ----------
+        Negative log posterior for each row of beta
+        """
+
+        post = self.neg_loglik_batch(beta)
+        for k in range(0,self.z_no):
+            post += -np.array([self.latent_variables.z_list[k].prior.logpdf(z) for z in beta[:,k]])
+        return post
+
     def multivariate_neg_logposterior(self,beta):
         """ Returns negative log posterior, for a model with a covariance matrix 
 
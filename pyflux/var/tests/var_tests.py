@@ -1,6 +1,7 @@
 import numpy as np
 import pyflux as pf
 import pandas as pd
+import scipy.stats as ss
 
 noise_1 = np.random.normal(0,1,350)
 noise_2 = np.random.normal(0,1,350)
@@ -114,4 +115,199 @@ def test_predict_is_nans():
 	"""
 	model = pf.VAR(data=data, lags=2)
 	x = model.fit()
-	assert(len(model.predict_is(h=5).values[np.isnan(model.predict_is(h=5).values)]) == 0)
\ No newline at end of file
+	assert(len(model.predict_is(h=5).values[np.isnan(model.predict_is(h=5).values)]) == 0)
+
+def test_loglik():
+	"""
+	Tests that the negative loglikelihood agrees with the multivariate normal density of the
+	residuals, for the estimated and the OLS covariance matrix
+	"""
+	for use_ols_covariance in [False, True]:
+		model = pf.VAR(data=data, lags=2, use_ols_covariance=use_ols_covariance)
+		beta = model.latent_variables.get_z_starting_values() + np.random.normal(0,0.05,model.z_no)
+		mu, Y = model._model(beta)
+		cov = model.ols_covariance() if use_ols_covariance else model.custom_covariance(beta)
+		loglik = np.sum(ss.multivariate_normal.logpdf((Y-mu).T, mean=np.zeros(2), cov=cov))
+		assert(abs(model.neg_loglik(beta) + loglik) < 1e-8)
+
+def test_niw():
+	"""
+	Tests that the conjugate posterior with a diffuse prior is centred on the OLS estimates,
+	and that its draws and posterior predictive paths have the right shapes and are not nan
+	"""
+	model = pf.VAR(data=data, lags=2)
+	x = model.fit('NIW', nsims=500)
+	assert(np.allclose(model._niw_posterior[0].T, model._create_B_direct(), atol=1e-6))
+	assert(x.samples.shape == (13, 500))
+	lvs = np.array([i.value for i in model.latent_variables.z_list])
+	assert(len(lvs[np.isnan(lvs)]) == 0)
+	paths = model._niw_predictive(5, 100)
+	assert(paths.shape == (100, 5, 2))
+	assert(np.all(np.isfinite(paths)))
+
+def test_minnesota():
+	"""
+	Tests that a tight Minnesota prior shrinks the coefficients towards a random walk
+	"""
+	model = pf.VAR(data=data, lags=2)
+	x = model.fit('NIW', minnesota=True, tightness=10**-4, nsims=500)
+	B = model._niw_posterior[0].T
+	assert(np.allclose(B[:,1:], np.append(np.identity(2), np.zeros((2,2)), axis=1), atol=1e-3))
+
+def test_forecast_mean():
+	"""
+	Tests that the companion form forecasts agree with the VAR recursion, and that the mean of
+	the simulated paths is close to them
+	"""
+	model = pf.VAR(data=data, lags=2)
+	x = model.fit()
+	t_params = model.transform_z()
+	mu, Y = model._model(model.latent_variables.get_z_values())
+	B = model._coefficients(t_params)
+	forecasts = model._forecast_mean(5, t_params, Y)
+	series = Y.copy()
+	for t in range(5):
+		step = B[:,0] + np.dot(B[:,1:3], series[:,-1]) + np.dot(B[:,3:5], series[:,-2])
+		series = np.append(series, step[:,np.newaxis], axis=1)
+	assert(np.allclose(forecasts, series))
+	paths = model._sim_prediction(5, t_params, 20000)
+	assert(paths.shape == (20000, 5, 2))
+	assert(np.allclose(paths.mean(axis=0), forecasts[:,-5:].T, atol=0.1))
+
+def test_sim_prediction_covariance():
+	"""
+	Tests that the simulated paths take the shock covariance from the latent variables they
+	are given, rather than from the estimated ones
+	"""
+	model = pf.VAR(data=data, lags=2)
+	x = model.fit('MLE')
+	t_params = model.transform_z()
+	t_params[-3:] = [2.0, 0.5, 3.0]
+	paths = model._sim_prediction(1, t_params, 20000)
+	chol = np.array([[2.0, 0.0], [0.5, 3.0]])
+	assert(np.allclose(np.cov(paths[:,0,:].T), np.dot(chol, chol.T), rtol=0.05, atol=0.1))
+
+def test_irf():
+	"""
+	Tests that impulse responses start at the impact matrix and are propagated by the
+	autoregressive coefficients
+	"""
+	model = pf.VAR(data=data, lags=1)
+	x = model.fit()
+	cov = model.ols_covariance()
+	A = model._coefficients(model.transform_z())[:,1:]
+	responses = model.irf(h=4)
+	assert(responses.shape == (5, 2, 2))
+	for j in range(5):
+		assert(np.allclose(responses[j], np.dot(np.linalg.matrix_power(A, j), np.linalg.cholesky(cov))))
+	generalized = model.irf(h=4, kind='generalized')
+	assert(np.allclose(generalized[0], cov/np.sqrt(np.diag(cov))))
+
+def test_irf_intervals():
+	"""
+	Tests that impulse response bands from the bootstrap and from the NIW posterior have the
+	right shapes and are ordered
+	"""
+	model = pf.VAR(data=data, lags=2)
+	for method in ['OLS', 'NIW']:
+		x = model.fit(method)
+		responses, lower, upper = model.irf(h=6, intervals=True, nsims=200)
+		assert(lower.shape == (7, 2, 2))
+		assert(upper.shape == (7, 2, 2))
+		assert(np.all(lower <= upper))
+
+def test_select_lags():
+	"""
+	Tests that the lag selection criteria agree with the AIC of a VAR fitted to the same
+	observations, and that subsets give a row per subset and lag order
+	"""
+	model = pf.VAR(data=data, lags=4)
+	criteria = model.select_lags()
+	assert(list(criteria.index) == [1, 2, 3, 4])
+	for lags in [1, 4]:
+		fitted = pf.VAR(data=data.iloc[4-lags:], lags=lags)
+		x = fitted.fit()
+		Y = np.array([reg[lags:] for reg in fitted.data])
+		residuals = fitted.residuals(Y)
+		cov = np.dot(residuals, residuals.T)/Y.shape[1]
+		loglik = np.sum(ss.multivariate_normal.logpdf(residuals.T, mean=np.zeros(2), cov=cov))
+		assert(abs(criteria.loc[lags, 'AIC'] - (2*fitted.z_no - 2*loglik)) < 1e-6)
+	subsets = model.select_lags(subsets=[['test1'], ['test1', 'test2']])
+	assert(subsets.shape == (8, 3))
+	assert(np.allclose(subsets.loc['test1, test2'].values, criteria.values))
+
+def test_select_lags_processes():
+	"""
+	Tests that fitting the lag orders in parallel processes gives the same criteria as
+	fitting them in this process
+	"""
+	model = pf.VAR(data=data, lags=3)
+	serial = model.select_lags(method='MLE')
+	parallel = model.select_lags(method='MLE', processes=2)
+	assert(list(parallel.index) == [1, 2, 3])
+	assert(np.allclose(parallel.values, serial.values))
+
+def test_lasso():
+	"""
+	Tests that a negligible penalty gives the OLS coefficients, and that the penalty path gives
+	non-nan latent variables, some zero coefficients and a sparse coefficient path
+	"""
+	ols = pf.VAR(data=data, lags=2)
+	x = ols.fit()
+	model = pf.VAR(data=data, lags=2)
+	x = model.fit('Lasso', alpha=1e-10)
+	assert(np.allclose(model.latent_variables.get_z_values()[:10], ols.latent_variables.get_z_values()[:10], atol=1e-5))
+	x = model.fit('Lasso', alpha=0.05)
+	lvs = np.array([i.value for i in model.latent_variables.z_list])
+	assert(len(lvs[np.isnan(lvs)]) == 0)
+	B = model._coefficients(model.transform_z())
+	assert(np.any(B == 0))
+	assert(model.z_no == np.count_nonzero(B) + 3)
+	x = model.fit('Lasso', l1_ratio=0.5)
+	assert(np.all(np.diff(model._lasso_path['Alpha']) < 0))
+	assert(model._lasso_path['Coefficients'][0].nnz == 0)
+
+def test_lasso_latent_variables():
+	"""
+	Tests that a lasso fit only keeps latent variables for the nonzero coefficients, with the
+	names and likelihood of the full model, and that other methods get the full set back
+	"""
+	model = pf.VAR(data=data, lags=2)
+	names = model.latent_variables.get_z_names()
+	x = model.fit('Lasso', alpha=0.05)
+	B = model._coefficients(model.transform_z())
+	full = np.append(B.flatten(), model.latent_variables.get_z_values()[-3:])
+	assert(model.latent_variables.get_z_names() == [names[i] for i in np.flatnonzero(B)] + names[-3:])
+	ols = pf.VAR(data=data, lags=2)
+	assert(abs(model.neg_loglik(model.latent_variables.get_z_values()) - ols.neg_loglik(full)) < 1e-8)
+	x = model.fit()
+	assert(model.latent_variables.get_z_names() == names)
+	assert(model.z_no == len(names))
+
+def test_lasso_kkt():
+	"""
+	Tests that the coordinate descent solution satisfies the elastic net optimality conditions
+	"""
+	from pyflux.var.var_recursions import coordinate_descent
+	X = np.random.normal(0,1,(8,100))
+	Y = np.dot(np.random.normal(0,1,(3,8))*(np.random.uniform(0,1,(3,8)) > 0.5), X) + np.random.normal(0,1,(3,100))
+	G, C = np.dot(X, X.T)/100, np.dot(Y, X.T)/100
+	B = np.zeros((3,8))
+	coordinate_descent(G, C.copy(), B, 0.1, 0.05, 1e-12, 10000)
+	gradient = C - np.dot(B, G) - 0.05*B
+	assert(np.allclose(gradient[B != 0], 0.1*np.sign(B[B != 0])))
+	assert(np.all(np.abs(gradient[B == 0]) <= 0.1 + 1e-10))
+
+def test_sparse_forecast():
+	"""
+	Tests that forecasts with the sparse companion matrix agree with the dense companion form
+	"""
+	model = pf.VAR(data=data, lags=2)
+	x = model.fit('Lasso', alpha=0.05)
+	t_params = model.transform_z()
+	mu, Y = model._model(model.latent_variables.get_z_values())
+	c, F = model._companion(model._coefficients(t_params))
+	x = model._companion_state()
+	for t in range(4):
+		x = c + np.dot(F, x)
+	assert(np.allclose(model._forecast_mean(4, t_params, Y)[:,-1], x[:2]))
@@ -4,9 +4,13 @@ if sys.version_info < (3,):
 
 import numpy as np
 import pandas as pd
+import scipy.linalg as la
+import scipy.sparse as sp
 import scipy.stats as ss
 import seaborn as sns
 import datetime
+import multiprocessing
+from scipy import optimize
 
 from .. import inference as ifr
 from .. import distributions as dst
@@ -14,8 +18,34 @@ from .. import output as op
 from .. import tests as tst
 from .. import tsm as tsm
 from .. import data_check as dc
+from ..latent_variables import LatentVariables
+from ..results import MCMCResults, MLEResults
 
-from .var_recursions import create_design_matrix, custom_covariance_matrix, var_likelihood
+from .var_recursions import create_design_matrix, custom_covariance_matrix, coordinate_descent
+
+def _information_criteria(neg_loglik, parameters, T):
+    """ AIC, BIC and HQ on the same scale as the Results objects """
+    return [2*neg_loglik + 2*parameters, 2*neg_loglik + parameters*np.log(T),
+        2*neg_loglik + 2*parameters*np.log(np.log(T))]
+
+def _fit_criteria(job):
+    """ Fits one VAR for VAR.select_lags - at module level so it can be sent to a process pool
+
+    Parameters
+    ----------
+    job : tuple
+        data, lags, integ, use_ols_covariance, method and keyword arguments for fit
+
+    Returns
+    ----------
+    - list of AIC, BIC and HQ
+    """
+
+    data, lags, integ, use_ols_covariance, method, kwargs = job
+    model = VAR(data=data, lags=lags, integ=integ, use_ols_covariance=use_ols_covariance)
+    model.fit(method, **kwargs)
+    return _information_criteria(model.neg_loglik(model.latent_variables.get_z_values()),
+        model.z_no, model.data.shape[1] - lags)
 
 
 class VAR(tsm.TSM):
@@ -54,10 +84,14 @@ class VAR(tsm.TSM):
         self.integ = integ
         self.max_lag = lags
         self.model_name = "VAR(" + str(self.lags) + ")"
-        self.supported_methods = ["OLS","MLE","PML","Laplace","M-H","BBVI"]
+        self.supported_methods = ["OLS","MLE","PML","Laplace","M-H","AM","BBVI","NIW","Lasso"]
         self.default_method = "OLS"
         self.multivariate_model = True
         self.use_ols_covariance = use_ols_covariance
+        self._ols_cholesky = None
+        self._niw_posterior = None
+        self._lasso_path = None
+        self._lasso_support = None
 
         # Format the data
         self.data_original = data.copy()
@@ -74,9 +108,26 @@ class VAR(tsm.TSM):
         self._create_latent_variables()
 
         # Other attributes
-        self._z_hide = np.power(self.data.shape[0],2) - (np.power(self.data.shape[0],2) - self.data.shape[0])/2 # Whether to cutoff variance latent variables from results        
+        self._z_hide = np.power(self.data.shape[0],2) - (np.power(self.data.shape[0],2) - self.data.shape[0])//2 # Whether to cutoff variance latent variables from results        
         self.z_no = len(self.latent_variables.z_list)
 
+    def _ar_variances(self):
+        """ Residual variances of univariate AR models, with the VAR's lags, for each series
+
+        Returns
+        ----------
+        np.array of residual variances
+        """
+
+        Y = np.array([reg[self.lags:reg.shape[0]] for reg in self.data])
+        Z = self._create_Z(Y)
+        variances = np.zeros(self.ylen)
+        for variable in range(self.ylen):
+            X = Z[np.append(0, 1 + variable + self.ylen*np.arange(self.lags))].T
+            residuals = Y[variable] - np.dot(X, np.linalg.lstsq(X, Y[variable], rcond=None)[0])
+            variances[variable] = np.dot(residuals, residuals)/residuals.shape[0]
+        return variances
+
     def _create_B(self,Y):
         """ Creates OLS coefficient matrix
 
@@ -105,6 +156,30 @@ class VAR(tsm.TSM):
         Z = self._create_Z(Y)
         return np.dot(np.dot(Y,np.transpose(Z)),np.linalg.inv(np.dot(Z,np.transpose(Z))))
 
+    def _coefficient_name(self, variable, column):
+        """ Name of the latent variable for a coefficient
+
+        Parameters
+        ----------
+        variable : int
+            Equation of the coefficient (row of the coefficient matrix)
+
+        column : int
+            Column of the coefficient matrix, in the order of the rows of the design matrix
+            (see _create_Z)
+
+        Returns
+        ----------
+        str
+        """
+
+        if column == 0:
+            return self.data_name[variable] + ' Constant'
+        lag_no, other = divmod(column - 1, self.ylen)
+        if other == variable:
+            return str(self.data_name[variable]) + ' AR(' + str(lag_no+1) + ')'
+        return str(self.data_name[other]) + ' to ' + str(self.data_name[variable]) + ' AR(' + str(lag_no+1) + ')'
+
     def _create_latent_variables(self):
         """ Creates model latent variables
 
@@ -113,18 +188,14 @@ class VAR(tsm.TSM):
         None (changes model attributes)
         """
 
-        # TODO: There must be a cleaner way to do this below
-
-        # Create VAR latent variables
+        # Create VAR latent variables, in the same order as the coefficient matrix
         for variable in range(self.ylen):
-            self.latent_variables.add_z(self.data_name[variable] + ' Constant',ifr.Normal(0,3,transform=None),dst.q_Normal(0,3))
-            other_variables = np.delete(range(self.ylen), [variable])
-            for lag_no in range(self.lags):
-                self.latent_variables.add_z(str(self.data_name[variable]) + ' AR(' + str(lag_no+1) + ')',ifr.Normal(0,0.5,transform=None),dst.q_Normal(0,3))
-                for other in other_variables:
-                    self.latent_variables.add_z(str(self.data_name[other]) + ' to ' + str(self.data_name[variable]) + ' AR(' + str(lag_no+1) + ')',ifr.Normal(0,0.5,transform=None),dst.q_Normal(0,3))
+            for column in range(1 + self.ylen*self.lags):
+                self.latent_variables.add_z(self._coefficient_name(variable, column),
+                    ifr.Normal(0,3 if column == 0 else 0.5,transform=None),dst.q_Normal(0,3))
 
         starting_params_temp = self._create_B_direct().flatten()
+        chol_starting_params = []
 
         # Variance latent variables
         for i in range(self.ylen):
@@ -137,11 +208,11 @@ class VAR(tsm.TSM):
         for i in range(0,self.ylen):
             for k in range(0,self.ylen):
                 if i == k:
-                    starting_params_temp = np.append(starting_params_temp,np.array([0.5]))
+                    chol_starting_params.append(0.5)
                 elif i > k:
-                    starting_params_temp = np.append(starting_params_temp,np.array([0.0]))
+                    chol_starting_params.append(0.0)
 
-        self.latent_variables.set_z_starting_values(starting_params_temp)
+        self.latent_variables.set_z_starting_values(np.append(starting_params_temp,chol_starting_params))
 
     def _create_Z(self,Y):
         """ Creates design matrix holding the lagged variables
@@ -159,8 +230,143 @@ class VAR(tsm.TSM):
         Z = np.ones(((self.ylen*self.lags +1),Y[0].shape[0]))
         return create_design_matrix(Z, self.data, Y.shape[0], self.lags)
 
-    def _forecast_mean(self,h,t_params,Y,shock_type=None,shock_index=0,shock_value=None,shock_dir='positive',irf_intervals=False):
-        """ Function allows for mean prediction; also allows shock specification for simulations or impulse response effects
+    def _bootstrap_draws(self, nsims):
+        """ Residual bootstrap of the coefficient matrices and the Cholesky factor of the covariance
+
+        Notes
+        ----------
+        Each replication resamples the centred residuals, rebuilds the series from its first
+        lags with the estimated coefficients and re-estimates the VAR by OLS; all replications
+        are simulated together, and estimated in chunks of stacked normal equations
+
+        Parameters
+        ----------
+        nsims : int
+            How many replications
+
+        Returns
+        ----------
+        - np.array (nsims x ylen x (1 + ylen*lags)) of coefficient matrices B
+        - np.array (nsims x ylen x ylen) of lower Cholesky factors of the covariance matrix
+        """
+
+        mu, Y = self._model(self.latent_variables.get_z_values())
+        residuals = (Y - mu).T
+        residuals = residuals - np.mean(residuals, axis=0)
+        T = Y.shape[1]
+
+        c, F = self._companion(self._coefficients(self.transform_z()))
+        start = np.array([reg[:self.lags][::-1] for reg in self.data]).T.flatten()
+        paths = self._simulate(c, F, start, T, nsims, shocks=residuals[np.random.randint(T, size=(nsims, T))])
+
+        # Design matrices of the replications: a constant, then each lag of every series
+        series = np.append(np.tile(self.data[:, :self.lags].T, (nsims, 1, 1)), paths, axis=1)
+        k = 1 + self.ylen*self.lags
+        B = np.zeros((nsims, self.ylen, k))
+        chol = np.zeros((nsims, self.ylen, self.ylen))
+        chunk = max(1, int(10**7/(T*k)))
+
+        for i in range(0, nsims, chunk):
+            X = np.ones((min(chunk, nsims - i), T, k))
+            for lag in range(1, self.lags+1):
+                X[:, :, 1+(lag-1)*self.ylen:1+lag*self.ylen] = series[i:i+chunk, self.lags-lag:self.lags-lag+T]
+            coefficients = np.linalg.solve(np.matmul(X.transpose(0,2,1), X), np.matmul(X.transpose(0,2,1), paths[i:i+chunk]))
+            errors = paths[i:i+chunk] - np.matmul(X, coefficients)
+            B[i:i+chunk] = coefficients.transpose(0,2,1)
+            chol[i:i+chunk] = np.linalg.cholesky(np.matmul(errors.transpose(0,2,1), errors)/T)
+
+        return B, chol
+
+    def _coefficients(self, t_params):
+        """ Coefficient matrix of the VAR
+
+        Parameters
+        ----------
+        t_params : np.array
+            Transformed latent variables vector
+
+        Returns
+        ----------
+        np.array (ylen x (1 + ylen*lags)), with columns ordered as the rows of the design matrix
+        """
+
+        t_params = self._expand_z(t_params)
+        return t_params[:self.ylen*(1 + self.ylen*self.lags)].reshape(self.ylen, 1 + self.ylen*self.lags)
+
+    def _companion(self, B, sparse=False):
+        """ Companion form of the VAR
+
+        Notes
+        ----------
+        Stacking x_t = [y_t', y_t-1', ..., y_t-p+1']' gives the VAR(1) x_t = c + Fx_t-1 + (e_t', 0')',
+        where the first ylen rows of F hold the lag coefficient matrices [A1 ... Ap] and the rest
+        shift the lags down. Stacks of coefficient matrices give stacks of companion matrices.
+
+        Parameters
+        ----------
+        B : np.array
+            Coefficient matrix (ylen x (1 + ylen*lags)), or a stack of them
+
+        sparse : boolean (default : False)
+            Whether to return F as a scipy.sparse matrix, which only stores the nonzero
+            coefficients and the shift (a single B only)
+
+        Returns
+        ----------
+        - np.array of constants c
+        - np.array of companion matrices F
+        """
+
+        m = self.ylen*self.lags
+        c = np.zeros(B.shape[:-2] + (m,))
+        c[..., :self.ylen] = B[..., 0]
+        if sparse is True:
+            return c, sp.vstack([sp.csr_matrix(B[:, 1:]), sp.eye(m - self.ylen, m, format='csr')], format='csr')
+        F = np.zeros(B.shape[:-2] + (m, m))
+        F[..., :self.ylen, :] = B[..., 1:]
+        F[..., self.ylen:, :-self.ylen] = np.identity(m - self.ylen)
+        return c, F
+
+    def _companion_state(self):
+        """ Companion state [y_T', y_T-1', ..., y_T-p+1']' at the end of the data
+
+        Returns
+        ----------
+        np.array of length ylen*lags
+        """
+
+        return np.array([reg[-self.lags:][::-1] for reg in self.data]).T.flatten()
+
+    def _expand_z(self, z):
+        """ Latent variable vector in the layout of the full model
+
+        Notes
+        ----------
+        After a lasso fit the model only has latent variables for the nonzero coefficients,
+        followed by the covariance latent variables (see _lasso_fit); the other coefficients
+        are zero. Otherwise z is returned as it is.
+
+        Parameters
+        ----------
+        z : np.array
+            Latent variables vector (the transformed and untransformed coefficients agree)
+
+        Returns
+        ----------
+        np.array with every coefficient, followed by the covariance latent variables
+        """
+
+        if self._lasso_support is None:
+            return z
+        k = self.ylen*(1 + self.ylen*self.lags)
+        nonzero = self._lasso_support.shape[0]
+        full = np.zeros(k + z.shape[0] - nonzero)
+        full[self._lasso_support] = z[:nonzero]
+        full[k:] = z[nonzero:]
+        return full
+
+    def _forecast_mean(self,h,t_params,Y):
+        """ Mean forecasts, propagating the companion state with F
 
         Parameters
         ----------
@@ -173,51 +379,157 @@ class VAR(tsm.TSM):
         Y : np.array
             Data for series that is being forecast
 
-        shock_type : None or str
-            Type of shock; options include None, 'Cov' (simulate from covariance matrix), 'IRF' (impulse response shock)
+        Returns
+        ----------
+        The data followed by the h forecasts (ylen x (T + h))
+        """         
+
+        c, F = self._companion(self._coefficients(t_params), sparse=True)
+        x = self._companion_state()
+        forecasts = np.zeros((h, self.ylen))
+
+        for t in range(0,h):
+            x = c + F.dot(x)
+            forecasts[t] = x[:self.ylen]
+
+        return np.append(Y, forecasts.T, axis=1)
+
+    def _lasso_fit(self, alpha=None, l1_ratio=1.0, nalphas=50, alpha_min_ratio=None, tol=1e-7,
+        max_iter=10000, **kwargs):
+        """ Estimates the VAR coefficients with a lasso or elastic net penalty
 
-        shock_index : int
-            Which latent variable to apply the shock to if using an IRF.
+        Notes
+        ----------
+        The series and the columns of the design matrix are standardised, and each equation
+        minimises ||y - Xb||^2/2T + alpha*(l1_ratio*|b| + (1 - l1_ratio)*b'b/2) by coordinate
+        descent, with the constants left unpenalised (see Friedman, Hastie and Tibshirani, 2010).
+        All the equations share the Gram matrix X'X/T, so the cost does not grow with the number of
+        coefficients that are zero. If alpha is None, a path of nalphas penalties is fitted from
+        the smallest that sets every coefficient to zero down to alpha_min_ratio times it, each
+        warm started from the last, and the one with the lowest BIC (counting the nonzero
+        coefficients, with a diagonal covariance) is kept. As in glmnet, the path stops early
+        once the equations explain 99.9% of the variance of the series, or once an equation has
+        more nonzero coefficients than half the observations, since the BIC is unreliable as
+        the fit saturates. The covariance latent variables are set from the residual
+        covariance, or its diagonal if that is singular.
 
-        shock_value : None or float
-            If specified, applies a custom-sized impulse response shock.
+        Parameters
+        ----------
+        alpha : float (default : None)
+            Penalty; by default it is chosen by BIC along a path
 
-        shock_dir : str
-            Direction of the IRF shock. One of 'positive' or 'negative'.
+        l1_ratio : float (default : 1.0)
+            Share of the penalty on the absolute coefficients: 1 is the lasso and values
+            below 1 the elastic net
 
-        irf_intervals : Boolean
-            Whether to have intervals for the IRF plot or not
+        nalphas : int (default : 50)
+            Length of the path of penalties
+
+        alpha_min_ratio : float (default : None)
+            Smallest penalty on the path, relative to the largest; by default 1e-4, or 1e-2 if
+            there are fewer observations than columns in the design matrix
+
+        tol : float (default : 1e-7)
+            Coordinate descent stops when no standardised coefficient changes by more than this
+
+        max_iter : int (default : 10000)
+            Largest number of sweeps of coordinate descent for each penalty
 
         Returns
         ----------
-        A vector of forecasted data
-        """         
+        - MLEResults object with method 'Lasso'
+        """
 
-        random = self._shock_create(h, shock_type, shock_index, shock_value, shock_dir,irf_intervals)
-        exp = [Y[variable] for variable in range(0,self.ylen)]
-        
-        # Each forward projection
-        for t in range(0,h):
-            new_values = np.zeros(self.ylen)
+        Y = np.array([reg[self.lags:reg.shape[0]] for reg in self.data])
+        X = self._create_Z(Y)[1:]
+        T = Y.shape[1]
+
+        x_mean, x_sd = np.mean(X, axis=1), np.std(X, axis=1)
+        x_sd[x_sd == 0.0] = 1.0
+        y_mean, y_sd = np.mean(Y, axis=1), np.std(Y, axis=1)
+        y_sd[y_sd == 0.0] = 1.0
+        X = (X - x_mean[:, np.newaxis])/x_sd[:, np.newaxis]
+        Ys = (Y - y_mean[:, np.newaxis])/y_sd[:, np.newaxis]
 
-            # Each variable
-            for variable in range(0,self.ylen):
-                index_ref = variable*(1+self.ylen*self.lags)
-                new_values[variable] = t_params[index_ref] # constant
+        G = np.dot(X, X.T)/T
+        C = np.dot(Ys, X.T)/T
+
+        if alpha_min_ratio is None:
+            alpha_min_ratio = 1e-2 if T < X.shape[0] else 1e-4
+
+        if alpha is None:
+            alpha_max = np.max(np.abs(C))/max(l1_ratio, 1e-3)
+            alphas = alpha_max*np.logspace(0, np.log10(alpha_min_ratio), nalphas)
+        else:
+            alphas = np.array([alpha])
+
+        # Coefficients for the standardised data; R tracks C - BG for coordinate_descent
+        B = np.zeros(C.shape)
+        R = C.copy()
+        bics, nonzero, coefficients = [], [], []
+
+        for i in range(alphas.shape[0]):
+            coordinate_descent(G, R, B, alphas[i]*l1_ratio, alphas[i]*(1.0-l1_ratio), tol, max_iter)
+            if i > 0 and np.max(np.count_nonzero(B, axis=1)) > T/2.0:
+                break
+            rss = np.sum(np.power(Ys - np.dot(B, X),2),axis=1)
+            nonzero.append(np.count_nonzero(B))
+            bics.append(T*np.sum(np.log(rss/T)) + nonzero[-1]*np.log(T))
+            coefficients.append(sp.csr_matrix(B))
+            if np.sum(rss) < 1e-3*T*self.ylen:
+                break
+
+        alphas = alphas[:len(bics)]
+        best = np.argmin(bics)
+        A = coefficients[best].multiply(y_sd[:, np.newaxis]).multiply(1.0/x_sd[np.newaxis, :]).tocsr()
+        B = sp.hstack([(y_mean - A.dot(x_mean))[:, np.newaxis], A], format='csr')
+        self._lasso_path = pd.DataFrame({'Alpha': alphas, 'BIC': bics, 'Nonzero': nonzero})
+        self._lasso_path['Coefficients'] = coefficients
+
+        residuals = Y - B.dot(self._create_Z(Y))
+        cov = np.dot(residuals, residuals.T)/T
+        try:
+            chol = np.linalg.cholesky(cov)
+        except np.linalg.LinAlgError:
+            chol = np.diag(np.sqrt(np.diag(cov)))
+
+        # Only the nonzero coefficients get latent variables, in the order of the coefficient
+        # matrix (see _expand_z); the covariance latent variables, the lower triangle of its
+        # Cholesky factor, are carried over
+        B.eliminate_zeros()
+        B.sort_indices()
+        support = np.repeat(np.arange(self.ylen), np.diff(B.indptr))*B.shape[1] + B.indices
+        rows, cols = np.tril_indices(self.ylen)
+        covariance = self.latent_variables.z_list[-rows.shape[0]:]
+
+        latent_variables = LatentVariables(self.model_type)
+        for index in support:
+            variable, column = divmod(index, B.shape[1])
+            latent_variables.add_z(self._coefficient_name(variable, column),
+                ifr.Normal(0,3 if column == 0 else 0.5,transform=None),dst.q_Normal(0,3))
+        for z in covariance:
+            latent_variables.add_z(z.name, z.prior, z.q)
+        z = np.append(B.data, [covariance[index].prior.itransform(chol[rows[index],cols[index]])
+            for index in range(rows.shape[0])])
+
+        self.latent_variables = latent_variables
+        self._lasso_support = support
+        self.z_no = len(self.latent_variables.z_list)
+        self.use_ols_covariance = False
+        self.latent_variables.set_z_values(z,'Lasso',None,None)
 
-                # VAR(p) terms
-                for lag in range(0,self.lags):
-                    for lagged_var in range(0,self.ylen):
-                        new_values[variable] += t_params[index_ref+lagged_var+(lag*self.ylen)+1]*exp[lagged_var][-1-lag]
-                
-                # Random shock
-                new_values[variable] += random[t][variable]
+        theta, Y, scores, states, states_var, X_names = self._categorize_model_output(z)
 
-            # Add new values
-            for variable in range(0,self.ylen):
-                exp[variable] = np.append(exp[variable],new_values[variable])
+        try:
+            latent_variables_store = self.latent_variables.copy()
+        except:
+            latent_variables_store = self.latent_variables
 
-        return np.array(exp)
+        return MLEResults(data_name=self.data_name,X_names=X_names,model_name=self.model_name,
+            model_type=self.model_type, latent_variables=latent_variables_store,results=optimize.OptimizeResult(x=z,success=True),
+            data=Y, index=self.index,multivariate_model=self.multivariate_model,objective_object=self.neg_loglik,
+            method='Lasso',ihessian=None,signal=theta,scores=scores,
+            z_hide=self._z_hide,max_lag=self.max_lag,states=states,states_var=states_var)
 
     def _model(self,beta):
         """ Creates the structure of the model
@@ -239,7 +551,7 @@ class VAR(tsm.TSM):
         Y = np.array([reg[self.lags:reg.shape[0]] for reg in self.data])
 
         # Transform latent variables
-        beta = np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
+        beta = self._expand_z(np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])]))
 
         params = []
         col_length = 1 + self.ylen*self.lags
@@ -249,74 +561,316 @@ class VAR(tsm.TSM):
         mu = np.dot(np.array(params),self._create_Z(Y))
         return mu, Y
 
-    def _shock_create(self, h, shock_type, shock_index, shock_value, shock_dir, irf_intervals):
-        """ Function creates shocks based on desired specification
+    def _niw_draws(self, nsims):
+        """ Draws from the Normal-Inverse-Wishart posterior of a model fitted with method 'NIW'
+
+        Notes
+        ----------
+        Sigma^-1 is drawn from its Wishart posterior by the Bartlett decomposition, and B' from
+        the matrix normal An + PEQ', where PP' = Vn, QQ' = Sigma and E is standard normal; all
+        draws are formed at once as stacked arrays
+
+        Parameters
+        ----------
+        nsims : int
+            How many draws to take
+
+        Returns
+        ----------
+        - np.array (nsims x ylen x (1 + ylen*lags)) of coefficient matrices B
+        - np.array (nsims x ylen x ylen) of lower Cholesky factors of the covariance matrix
+        """
+
+        An, P, Sn, vn = self._niw_posterior
+        k = An.shape[0]
+
+        # Bartlett decomposition: Sigma^-1 = (CA)(CA)' with CC' = Sn^-1
+        C = np.linalg.cholesky(np.linalg.inv(Sn))
+        A = np.zeros((nsims, self.ylen, self.ylen))
+        A[:, np.arange(self.ylen), np.arange(self.ylen)] = np.sqrt(np.random.chisquare(vn - np.arange(self.ylen), (nsims, self.ylen)))
+        rows, cols = np.tril_indices(self.ylen, -1)
+        A[:, rows, cols] = np.random.normal(0, 1, (nsims, rows.shape[0]))
+        M_inv = np.linalg.inv(np.matmul(C, A))
+        chol = np.linalg.cholesky(np.matmul(M_inv.transpose(0,2,1), M_inv))
+
+        E = np.random.normal(0, 1, (nsims, k, self.ylen))
+        B = An + np.matmul(np.matmul(P, E), chol.transpose(0,2,1))
+        return B.transpose(0,2,1), chol
+
+    def _niw_fit(self, nsims=10000, B0=None, V0=None, minnesota=False, tightness=0.2, decay=1.0,
+        own_lag=1.0, **kwargs):
+        """ Computes the Normal-Inverse-Wishart (conjugate) posterior of the VAR in closed form
+
+        Notes
+        ----------
+        With X = Z' and A = B', the prior is vec(A)|Sigma ~ N(vec(A0), Sigma x V0) and Sigma ~
+        IW(v0, S0); the posterior is of the same form with Vn = (V0^-1 + ZZ')^-1,
+        An = Vn(V0^-1 A0 + ZY'), vn = v0 + T and Sn = S0 + (Y' - XAn)'(Y' - XAn) +
+        (An - A0)'V0^-1(An - A0) (see Kadiyala and Karlsson, 1997). The prior on Sigma is the
+        InverseWishart set by construct_wishart, if any; otherwise v0 = ylen + 2 and S0 holds the
+        residual variances of univariate AR models, so its prior mean is diag(S0).
+
+        The Minnesota prior (Litterman, 1986) centres each series' own first lag on own_lag and
+        the other coefficients on zero, with prior variance Sigma_ii*tightness^2/(l^(2decay)s_j^2)
+        for lag l of series j, where s_j^2 is its univariate AR residual variance; the constants
+        are left diffuse.
+
+        Parameters
+        ----------
+        nsims : int
+            How many posterior draws to summarize the latent variables with
+
+        B0 : np.array
+            Prior mean of the coefficient matrix (ylen x (1 + ylen*lags)); defaults to zero
+
+        V0 : np.array
+            Prior covariance across the columns of the coefficient matrix; defaults to a diffuse
+            10^6 times the identity
+
+        minnesota : boolean
+            Whether to use the Minnesota prior for B0 and V0 instead
+
+        tightness, decay, own_lag : float
+            Minnesota prior hyperparameters (own_lag is 1 for series in levels, 0 for differenced
+            or stationary series)
+
+        Returns
+        ----------
+        MCMCResults object
+        """
+
+        Y = np.array([reg[self.lags:reg.shape[0]] for reg in self.data])
+        Z = self._create_Z(Y)
+        k = Z.shape[0]
+        ar_variances = self._ar_variances()
+
+        if minnesota is True:
+            B0 = np.zeros((self.ylen, k))
+            B0[np.arange(self.ylen), 1 + np.arange(self.ylen)] = own_lag
+            lags = np.repeat(np.arange(1, self.lags+1), self.ylen)
+            V0 = np.diag(np.append(10**6, np.power(tightness, 2)/(np.power(lags, 2*decay)*np.tile(ar_variances, self.lags))))
+        else:
+            B0 = np.zeros((self.ylen, k)) if B0 is None else B0
+            V0 = np.identity(k)*10**6 if V0 is None else V0
+
+        wishart = [z.prior for z in self.latent_variables.z_list if z.prior.covariance_prior is True]
+        if len(wishart) > 0:
+            v0, S0 = wishart[0].v, wishart[0].Psi
+        else:
+            v0, S0 = self.ylen + 2, np.diag(ar_variances)
+
+        V0_inv = np.linalg.inv(V0)
+        R = np.linalg.cholesky(V0_inv + np.dot(Z, Z.T))
+        An = la.cho_solve((R, True), np.dot(V0_inv, B0.T) + np.dot(Z, Y.T))
+        residuals = Y.T - np.dot(Z.T, An)
+        Sn = S0 + np.dot(residuals.T, residuals) + np.dot(np.dot((An - B0.T).T, V0_inv), An - B0.T)
+        P = la.solve_triangular(R, np.identity(k), lower=True).T
+        self._niw_posterior = (An, P, 0.5*(Sn + Sn.T), v0 + Y.shape[1])
+
+        # Latent variables: the coefficients, then the lower triangle of the Cholesky factor
+        B, chol = self._niw_draws(nsims)
+        rows, cols = np.tril_indices(self.ylen)
+        chain = np.append(B.reshape(nsims, -1), chol[:, rows, cols], axis=1).T
+        for i in range(self.z_no):
+            chain[i] = self.latent_variables.z_list[i].prior.itransform(chain[i])
+        mean_est = np.mean(chain, axis=1)
+        mean_est[:self.ylen*k] = An.T.flatten()
+
+        self.use_ols_covariance = False
+        for i in range(self.z_no):
+            chain[i] = self.latent_variables.z_list[i].prior.transform(chain[i])
+        self.latent_variables.set_z_values(mean_est, 'NIW', None, chain)
+
+        median_est = np.median(chain, axis=1)
+        upper_95_est = np.percentile(chain, 97.5, axis=1)
+        lower_95_est = np.percentile(chain, 2.5, axis=1)
+        mean_est = np.array([self.latent_variables.z_list[i].prior.transform(mean_est[i]) for i in range(self.z_no)])
+
+        theta, Y, scores, states, states_var, X_names = self._categorize_model_output(self.latent_variables.get_z_values())
+
+        # Change this in future
+        try:
+            latent_variables_store = self.latent_variables.copy()
+        except:
+            latent_variables_store = self.latent_variables
+
+        return MCMCResults(data_name=self.data_name,X_names=X_names,model_name=self.model_name,
+            model_type=self.model_type, latent_variables=latent_variables_store,data=Y,index=self.index,
+            multivariate_model=self.multivariate_model,objective_object=self.neg_loglik, 
+            method='NIW',samples=chain,mean_est=mean_est,median_est=median_est,lower_95_est=lower_95_est,
+            upper_95_est=upper_95_est,signal=theta,scores=scores, z_hide=self._z_hide,max_lag=self.max_lag,
+            states=states,states_var=states_var)
+
+    def _niw_predictive(self, h, nsims):
+        """ Simulates h-step ahead paths from the posterior predictive distribution of a model
+        fitted with method 'NIW'; each path uses its own posterior draw of B and Sigma
 
         Parameters
         ----------
         h : int
-            How many steps ahead to forecast
+            How many steps ahead to simulate
 
-        shock_type : None or str
-            Type of shock; options include None, 'Cov' (simulate from covariance matrix), 'IRF' (impulse response shock)
+        nsims : int
+            How many paths to simulate
 
-        shock_index : int
-            Which latent variables to apply the shock to if using an IRF.
+        Returns
+        ----------
+        np.array (nsims x h x ylen) of simulated paths
+        """
 
-        shock_value : None or float
-            If specified, applies a custom-sized impulse response shock.
+        B, chol = self._niw_draws(nsims)
+        c, F = self._companion(B)
+        return self._simulate(c, F, self._companion_state(), h, nsims, chol)
 
-        shock_dir : str
-            Direction of the IRF shock. One of 'positive' or 'negative'.
+    def _impulse_responses(self, B, chol, h, kind='orthogonal'):
+        """ Impulse responses from the companion form
 
-        irf_intervals : Boolean
-            Whether to have intervals for the IRF plot or not
+        Notes
+        ----------
+        The responses at horizon j are the first ylen rows of F^j G, where the first ylen rows
+        of G hold the impact of each shock: the Cholesky factor of the covariance for
+        orthogonalised shocks, or Sigma e_s/sqrt(Sigma_ss) for generalised shocks (Pesaran and
+        Shin, 1998). Stacks of parameters give stacks of responses.
+
+        Parameters
+        ----------
+        B : np.array
+            Coefficient matrix, or a stack of them
+
+        chol : np.array
+            Lower Cholesky factor of the covariance matrix, or a stack of them
+
+        h : int
+            How many steps after the shock
+
+        kind : str
+            'orthogonal' or 'generalized'
 
         Returns
         ----------
-        A h-length list which contains np.arrays containing shocks for each variable
-        """     
+        np.array ((stack x) h+1 x ylen x ylen) of the response of each variable (middle axis)
+        to a one standard deviation shock in each variable (last axis)
+        """
 
-        if shock_type is None:
+        _, F = self._companion(B)
+        if kind == 'orthogonal':
+            impact = chol
+        elif kind == 'generalized':
+            cov = np.matmul(chol, np.swapaxes(chol, -1, -2))
+            impact = cov/np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))[..., np.newaxis, :]
+        else:
+            raise ValueError("kind must be one of 'orthogonal' or 'generalized'")
 
-            random = [np.zeros(self.ylen) for i in range(0,h)]
+        G = np.zeros(F.shape[:-1] + (self.ylen,))
+        G[..., :self.ylen, :] = impact
+        responses = np.zeros(F.shape[:-2] + (h+1, self.ylen, self.ylen))
 
-        elif shock_type == 'IRF':
+        for j in range(h+1):
+            responses[..., j, :, :] = G[..., :self.ylen, :]
+            G = np.matmul(F, G)
 
-            if self.use_ols_covariance is False:
-                cov = self.custom_covariance(self.latent_variables.get_z_values())
-            else:
-                cov = self.ols_covariance()
+        return responses
 
-            post = ss.multivariate_normal(np.zeros(self.ylen),cov)
-            
-            if irf_intervals is False:
-                random = [np.zeros(self.ylen) for i in range(0,h)]
-            else:
-                random = [post.rvs() for i in range(0,h)]
-                random[0] = np.zeros(self.ylen)
-
-            if shock_value is None:
-                if shock_dir=='positive':
-                    random[0][shock_index] = cov[shock_index,shock_index]**0.5
-                elif shock_dir=='negative':
-                    random[0][shock_index] = -cov[shock_index,shock_index]**0.5
-                else:
-                    raise ValueError("Unknown shock direction!")    
-            else:
-                random[0][shock_index] = shock_value        
+    def _parameter_draws(self, nsims):
+        """ Draws of the coefficient matrices and Cholesky factors of the covariance: from the
+        stored posterior sample for Metropolis-Hastings or NIW fits, otherwise by a residual
+        bootstrap
+
+        Parameters
+        ----------
+        nsims : int
+            How many draws
+
+        Returns
+        ----------
+        - np.array (nsims x ylen x (1 + ylen*lags)) of coefficient matrices B
+        - np.array (nsims x ylen x ylen) of lower Cholesky factors of the covariance matrix
+        """
+
+        z_list = self.latent_variables.z_list
+        if z_list[0].method in ['M-H', 'AM', 'NIW'] and hasattr(z_list[0], 'sample'):
+            samples = np.array([z.sample for z in z_list])
+            draws = samples[:, np.random.randint(samples.shape[1], size=nsims)].T
+            k = 1 + self.ylen*self.lags
+            rows, cols = np.tril_indices(self.ylen)
+            chol = np.zeros((nsims, self.ylen, self.ylen))
+            chol[:, rows, cols] = draws[:, self.ylen*k:]
+            return draws[:, :self.ylen*k].reshape(nsims, self.ylen, k), chol
+        return self._bootstrap_draws(nsims)
+
+    def _sim_prediction(self, h, t_params, nsims):
+        """ Simulates h-step ahead paths with shocks drawn from the estimated covariance matrix
+
+        Parameters
+        ----------
+        h : int
+            How many steps ahead to simulate
+
+        t_params : np.array
+            Transformed latent variables vector
+
+        nsims : int
+            How many paths to simulate
+
+        Returns
+        ----------
+        np.array (nsims x h x ylen) of simulated paths
+        """
 
-        elif shock_type == 'Cov':
-            
-            if self.use_ols_covariance is False:
-                cov = self.custom_covariance(self.latent_variables.get_z_values())
+        c, F = self._companion(self._coefficients(t_params), sparse=True)
+        chol = self._covariance_cholesky(t_params, transformed=True)
+        return self._simulate(c, F, self._companion_state(), h, nsims, chol)
+
+    def _simulate(self, c, F, start, h, nsims, chol=None, shocks=None):
+        """ Simulates paths of the companion form (see _companion), all paths at once
+
+        Parameters
+        ----------
+        c, F : np.array
+            Companion constants and matrix, shared by the paths (F may be sparse) or one per path
+
+        start : np.array
+            Companion state the paths start from
+
+        h : int
+            How many steps to simulate
+
+        nsims : int
+            How many paths to simulate
+
+        chol : np.array
+            Lower Cholesky factor of the covariance of the shocks, shared by the paths or one
+            per path
+
+        shocks : np.array
+            The shocks themselves (nsims x h x ylen), instead of drawing them with chol
+
+        Returns
+        ----------
+        np.array (nsims x h x ylen) of simulated paths
+        """
+
+        if shocks is None:
+            shocks = np.random.normal(0, 1, (nsims, h, self.ylen))
+            if chol.ndim == 2:
+                shocks = np.dot(shocks, chol.T)
             else:
-                cov = self.ols_covariance()
+                shocks = np.matmul(shocks, chol.transpose(0,2,1))
+
+        x = np.tile(start, (nsims, 1))
+        paths = np.zeros((nsims, h, self.ylen))
 
-            post = ss.multivariate_normal(np.zeros(self.ylen),cov)
-            random = [post.rvs() for i in range(0,h)]
+        for t in range(h):
+            if sp.issparse(F):
+                x = c + F.dot(x.T).T
+            elif F.ndim == 2:
+                x = c + np.dot(x, F.T)
+            else:
+                x = c + np.matmul(F, x[:, :, np.newaxis])[:, :, 0]
+            x[:, :self.ylen] += shocks[:, t]
+            paths[:, t] = x[:, :self.ylen]
 
-        return random
+        return paths
 
     def _summarize_simulations(self,mean_values,sim_vector,date_index,h,past_values):
         """ Summarizes a simulation vector and a mean vector of predictions
@@ -350,6 +904,40 @@ class VAR(tsm.TSM):
         plot_index = date_index[-h-past_values:]
         return error_bars, forecasted_values, plot_values, plot_index
 
+    def _covariance_cholesky(self,beta,transformed=False):
+        """ Lower Cholesky factor of the covariance matrix for a given Beta Vector
+
+        Notes
+        ----------
+        The covariance latent variables are the lower triangle of the Cholesky factor (row by
+        row), so the factor is read off directly; the OLS covariance is factorised once
+
+        Parameters
+        ----------
+        beta : np.array
+            Contains untransformed starting values for latent variables
+
+        transformed : boolean (default : False)
+            Whether beta holds transformed latent variables instead
+
+        Returns
+        ----------
+        A lower triangular matrix L with LL' the covariance matrix
+        """
+
+        if self.use_ols_covariance is True:
+            if self._ols_cholesky is None:
+                self._ols_cholesky = np.linalg.cholesky(self.ols_covariance())
+            return self._ols_cholesky
+
+        index = beta.shape[0] - (self.ylen*(self.ylen+1))//2
+        chol = np.zeros((self.ylen,self.ylen))
+        if transformed is True:
+            chol[np.tril_indices(self.ylen)] = beta[index:]
+        else:
+            chol[np.tril_indices(self.ylen)] = [self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(index,beta.shape[0])]
+        return chol
+
     def custom_covariance(self,beta):
         """ Creates Covariance Matrix for a given Beta Vector
         (Not necessarily the OLS covariance)
@@ -365,7 +953,7 @@ class VAR(tsm.TSM):
         """         
 
         cov_matrix = np.zeros((self.ylen,self.ylen))
-        parm = np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])])
+        parm = self._expand_z(np.array([self.latent_variables.z_list[k].prior.transform(beta[k]) for k in range(beta.shape[0])]))
         return custom_covariance_matrix(cov_matrix, self.ylen, self.lags, parm)
 
     def estimator_cov(self,method):
@@ -389,6 +977,74 @@ class VAR(tsm.TSM):
             sigma = self.custom_covariance(self.latent_variables.get_z_values())
         return np.kron(np.linalg.inv(np.dot(Z,np.transpose(Z))), sigma)
 
+    def fit(self, method=None, **kwargs):
+        """ Fits the model
+
+        Notes
+        ----------
+        A lasso fit leaves latent variables for the nonzero coefficients only (see _lasso_fit);
+        fitting with any other method first creates the full set again, with default priors for
+        the coefficients.
+
+        Parameters
+        ----------
+        method : str
+            A fitting method (e.g 'OLS'). Defaults to model specific default method.
+
+        Returns
+        ----------
+        Results object for the fit
+        """
+
+        if self._lasso_support is not None and method != 'Lasso':
+            covariance = [z.prior for z in self.latent_variables.z_list[self._lasso_support.shape[0]:]]
+            self._lasso_support = None
+            self.latent_variables = LatentVariables(self.model_type)
+            self._create_latent_variables()
+            self.z_no = len(self.latent_variables.z_list)
+            for index, prior in enumerate(covariance):
+                self.latent_variables.z_list[self.z_no - len(covariance) + index].prior = prior
+        return super(VAR, self).fit(method, **kwargs)
+
+    def irf(self, h=10, kind='orthogonal', intervals=False, nsims=1000):
+        """ Impulse response functions of the estimated model
+
+        Parameters
+        ----------
+        h : int (default : 10)
+            How many steps after the shock
+
+        kind : str (default : 'orthogonal')
+            'orthogonal' for shocks orthogonalised by the Cholesky factor of the covariance (so
+            the ordering of the series matters), or 'generalized' for generalised impulse
+            responses, which do not depend on the ordering
+
+        intervals : Boolean (default : False)
+            Whether to also return 90% bands, from the posterior sample for Metropolis-Hastings or
+            NIW fits and from a residual bootstrap otherwise
+
+        nsims : int (default : 1000)
+            How many draws to form the bands with
+
+        Returns
+        ----------
+        - np.array (h+1 x ylen x ylen) of the response of each variable (middle axis) to a one
+        standard deviation shock in each variable (last axis)
+        - if intervals, the 5% and 95% quantiles of the responses
+        """
+
+        if self.latent_variables.estimated is False:
+            raise Exception("No latent variables estimated!")
+
+        responses = self._impulse_responses(self._coefficients(self.transform_z()),
+            self._covariance_cholesky(self.latent_variables.get_z_values()), h, kind)
+
+        if intervals is False:
+            return responses
+
+        draws = self._impulse_responses(*self._parameter_draws(nsims), h=h, kind=kind)
+        return responses, np.percentile(draws, 5, axis=0), np.percentile(draws, 95, axis=0)
+
     def neg_loglik(self,beta):
         """ Creates the negative log-likelihood of the model
 
@@ -403,17 +1059,13 @@ class VAR(tsm.TSM):
         """     
 
         mu, Y = self._model(beta)
+        chol = self._covariance_cholesky(beta)
 
-        if self.use_ols_covariance is False:
-            cm = self.custom_covariance(beta)
-        else:
-            cm = self.ols_covariance()
-
-        diff = Y.T - mu.T
-        ll1 =  -(mu.T.shape[0]*mu.T.shape[1]/2.0)*np.log(2.0*np.pi) - (mu.T.shape[0]/2.0)*np.linalg.slogdet(cm)[1]
-        inverse = np.linalg.pinv(cm)
-
-        return var_likelihood(ll1, mu.T.shape[0], diff, inverse)
+        # With covariance LL', the quadratic form of each residual is the squared norm of its
+        # solve against L, and the log determinant is twice the sum of log diag(L)
+        scaled = la.solve_triangular(chol, Y - mu, lower=True, check_finite=False)
+        return (0.5*Y.shape[0]*Y.shape[1]*np.log(2.0*np.pi) + Y.shape[1]*np.sum(np.log(np.abs(np.diag(chol))))
+            + 0.5*np.einsum('ij,ij->', scaled, scaled))
 
     def ols_covariance(self):
         """ Creates OLS estimate of the covariance matrix
@@ -450,6 +1102,49 @@ class VAR(tsm.TSM):
                 plt.legend(loc=2)   
             plt.show()              
 
+    def plot_irf(self, h=10, shock_index=0, kind='orthogonal', intervals=True, nsims=1000, **kwargs):
+        """ Plots the impulse responses of every series to a shock
+
+        Parameters
+        ----------
+        h : int (default : 10)
+            How many steps after the shock
+
+        shock_index : int (default : 0)
+            Which series is shocked
+
+        kind : str (default : 'orthogonal')
+            'orthogonal' or 'generalized' (see irf)
+
+        intervals : Boolean (default : True)
+            Whether to plot 90% bands
+
+        nsims : int (default : 1000)
+            How many draws to form the bands with
+
+        Returns
+        ----------
+        - Plot of the impulse responses
+        """
+        import matplotlib.pyplot as plt
+
+        figsize = kwargs.get('figsize',(10,7))
+
+        if intervals is True:
+            responses, lower, upper = self.irf(h, kind, True, nsims)
+        else:
+            responses = self.irf(h, kind)
+
+        for variable in range(self.ylen):
+            plt.figure(figsize=figsize)
+            if intervals is True:
+                plt.fill_between(range(h+1), lower[:,variable,shock_index], upper[:,variable,shock_index], alpha=0.2)
+            plt.plot(range(h+1), responses[:,variable,shock_index])
+            plt.axhline(0, c='black', linewidth=0.5)
+            plt.title("Response of " + str(self.data_name[variable]) + " to a shock in " + str(self.data_name[shock_index]))
+            plt.xlabel("Steps after the shock")
+            plt.show()
+
     def plot_predict(self,h=5,past_values=20,intervals=True,**kwargs):
 
         """ Makes forecast with the estimated model
@@ -483,14 +1178,13 @@ class VAR(tsm.TSM):
             t_params = self.transform_z()
 
             # Expectation
-            exps = self._forecast_mean(h,t_params,Y,None,None)
+            exps = self._forecast_mean(h,t_params,Y)
 
-            # Simulation
-            sim_vector = np.array([np.zeros([15000,h]) for i in range(self.ylen)])
-            for it in range(0,15000):
-                exps_sim = self._forecast_mean(h,t_params,Y,"Cov",None)
-                for variable in range(self.ylen):
-                    sim_vector[variable][it,:] = exps_sim[variable][-h:]
+            # Simulation (from the posterior predictive for the conjugate posterior)
+            if self.latent_variables.z_list[0].method == 'NIW':
+                sim_vector = self._niw_predictive(h,15000).transpose(2,0,1)
+            else:
+                sim_vector = self._sim_prediction(h,t_params,15000).transpose(2,0,1)
 
             for variable in range(0,exps.shape[0]):
                 test = np.transpose(sim_vector[variable])
@@ -558,7 +1252,7 @@ class VAR(tsm.TSM):
             t_params = self.transform_z()
 
             # Expectation
-            exps = self._forecast_mean(h,t_params,Y,None,None)
+            exps = self._forecast_mean(h,t_params,Y)
 
             for variable in range(0,exps.shape[0]):
                 forecasted_values = exps[variable][-h:]
@@ -615,6 +1309,91 @@ class VAR(tsm.TSM):
 
         return (Y-np.dot(self._create_B(Y),self._create_Z(Y)))
 
+    def select_lags(self, method='OLS', subsets=None, processes=None, **kwargs):
+        """ Information criteria for every lag order up to the lags of the model
+
+        Parameters
+        ----------
+        method : str (default : 'OLS')
+            'OLS' takes every lag order from one QR factorisation of the design matrix of the
+            model; 'MLE' or 'PML' fit a model for each lag order, with the use_ols_covariance
+            setting of this model
+
+        subsets : list (default : None)
+            Lists of the series (column names for pd.DataFrame data, positions for np.array
+            data) to select lags for; by default all the series are used
+
+        processes : int (default : None)
+            Number of processes to fit the 'MLE' or 'PML' models with; by default they are fitted
+            in this process
+
+        **kwargs
+            Passed on to fit for the 'MLE' and 'PML' methods
+
+        Returns
+        ----------
+        - pd.DataFrame of the AIC, BIC and HQ for each lag order (and subset). All the lag orders
+        are fitted to the same observations, those after the first self.lags, so the criteria
+        are comparable within a subset
+        """
+
+        if method not in ['OLS', 'MLE', 'PML']:
+            raise ValueError("Lag selection supports the 'OLS', 'MLE' and 'PML' methods")
+
+        if subsets is None:
+            subsets = [list(range(self.ylen))]
+        elif self.is_pandas is True:
+            subsets = [[list(self.data_original.columns).index(name) for name in subset] for subset in subsets]
+
+        Y = np.array([reg[self.lags:reg.shape[0]] for reg in self.data])
+        T = Y.shape[1]
+        criteria = []
+
+        if method == 'OLS':
+            Z = self._create_Z(Y)
+            for subset in subsets:
+                ylen = len(subset)
+
+                # Columns of the constant and of the subset for each lag, in lag order, so the
+                # first 1 + ylen*p columns of Q span the design of the VAR(p)
+                columns = np.append(0, (1 + np.add.outer(self.ylen*np.arange(self.lags), subset)).flatten())
+                Q = np.linalg.qr(Z[columns].T)[0]
+                residuals = Y[subset].T - np.outer(Q[:,0], np.dot(Q[:,0], Y[subset].T))
+
+                for lags in range(1, self.lags+1):
+                    block = Q[:,1+ylen*(lags-1):1+ylen*lags]
+                    residuals -= np.dot(block, np.dot(block.T, residuals))
+                    cov = np.dot(residuals.T, residuals)/T
+                    neg_loglik = 0.5*T*(ylen*np.log(2.0*np.pi) + np.linalg.slogdet(cov)[1] + ylen)
+                    criteria.append(_information_criteria(neg_loglik, ylen*(1 + ylen*lags) + ylen*(ylen+1)//2, T))
+        else:
+            jobs = []
+            for subset in subsets:
+                if self.is_pandas is True:
+                    data = self.data_original.iloc[:, subset]
+                else:
+                    data = self.data_original[:, subset]
+                for lags in range(1, self.lags+1):
+                    jobs.append((data[self.lags-lags:], lags, self.integ, self.use_ols_covariance, method, kwargs))
+
+            if processes is None:
+                criteria = [_fit_criteria(job) for job in jobs]
+            else:
+                pool = multiprocessing.Pool(processes)
+                try:
+                    criteria = pool.map(_fit_criteria, jobs)
+                finally:
+                    pool.close()
+                    pool.join()
+
+        results = pd.DataFrame(criteria, columns=['AIC', 'BIC', 'HQ'])
+        results['Lags'] = np.tile(np.arange(1, self.lags+1), len(subsets))
+        if len(subsets) == 1:
+            return results.set_index('Lags')
+        names = self.data_original.columns.values if self.is_pandas is True else np.arange(self.ylen)
+        results['Variables'] = np.repeat([', '.join(str(names[i]) for i in subset) for subset in subsets], self.lags)
+        return results.set_index(['Variables', 'Lags'])
+
     def construct_wishart(self,v,X):
         """
         Constructs a Wishart prior for the covariance matrix